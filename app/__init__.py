@@ -7,4 +7,8 @@ def create_app():
     from app.routes.game_routes import game_bp
     app.register_blueprint(game_bp, url_prefix="")
 
+    # Construire le catalogue des parties PGN dès le démarrage (en-têtes seulement)
+    from app.utils.pgn_utils import get_pgn_games
+    get_pgn_games()
+
     return app
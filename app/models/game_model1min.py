@@ -1,33 +1,22 @@
 import chess
 import chess.pgn
-import os
 import time
-from app.utils.engine_utils import evaluate_move_strength, get_best_moves_from_fen, evaluate_played_move
+from app.utils.engine_utils import evaluate_played_move
+from app.services.analysis_service import complete_analysis
 from app.utils.utils import convertir_notation_francais_en_anglais
-from app.utils.fen_utils import save_board_fen
+from app.utils.fen_utils import snapshot_board, discard_snapshot
+from app.services.move_analysis_service import dispatch_move_analysis
+from app.models.game_template import GameTemplateMixin
 
-class ChessGame1Min:
-    def __init__(self, game, user_side, game_id=None, use_timer=False):
-        self.board = game.board()
-        self.game = game  # Garder une référence au jeu PGN complet
-        self.all_moves = list(game.mainline_moves())
+class ChessGame1Min(GameTemplateMixin):
+    # Budget de latence des analyses Stockfish du mode (voir `app.utils.analysis_budget`)
+    analysis_mode = "1min"
+
+    def __init__(self, game, user_side, game_id=None, use_timer=False, analyse=True):
         self.user_side = user_side
         self.game_id = game_id
-        
-        # Récupérer les commentaires du PGN
-        self.comments = []
-        node = game
-        while node.variations:
-            next_node = node.variation(0)
-            comment = next_node.comment.strip() if next_node.comment else ""
-            self.comments.append(comment)
-            node = next_node
-        
-        self.white_moves = self.all_moves[::2]
-        self.black_moves = self.all_moves[1::2]
-        
-        self.moves = self.white_moves if user_side == 'white' else self.black_moves
-        self.opponent_moves = self.black_moves if user_side == 'white' else self.white_moves
+        # Coups, SAN, FEN et commentaires partagés par toutes les sessions de cette partie
+        self._init_template(game, user_side)
         
         self.current_move_index = 0
         self.score = 0
@@ -40,21 +29,17 @@ class ChessGame1Min:
         self.move_start_time = time.time()
         
         if user_side == 'black' and len(self.white_moves) > 0:
-            first_move = self.white_moves[0]
-            self.last_opponent_move = self.board.san(first_move)
-            self.board.push(first_move)
+            # Le premier coup des blancs est déjà joué : l'échiquier se déduit du curseur
+            self.last_opponent_move = self.template.sans[0]
         else:
             self.last_opponent_move = None
         
-        # Sauvegarde l'état du plateau dans un fichier FEN propre à cette partie
-        fen_filename = f"{game_id}.fen" if game_id else "fichierFenAjour.fen"
-        app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin du dossier app
-        fen_dir = os.path.join(app_dir, "fen_saves")
-        # S'assurer que le répertoire existe
-        os.makedirs(fen_dir, exist_ok=True)
-        fen_path = os.path.join(fen_dir, fen_filename)
-        save_board_fen(self.board, filename=fen_path)
-        self.best_moves = get_best_moves_from_fen(fen_path)
+        # Instantané FEN optionnel (écriture asynchrone, FEN_SNAPSHOTS=1)
+        snapshot_board(self.game_id, self.board)
+        self.analysis = None
+        self.best_moves = []
+        if analyse:  # False lors de la restauration d'une session : l'état est rechargé ensuite
+            self.analyse_current_position()
 
     def get_game_state(self):
         # Calcul du pourcentage de score avec limitation à 100%
@@ -74,9 +59,12 @@ class ChessGame1Min:
             'move_start_time': self.move_start_time
         }
 
-    def submit_move(self, move):
+    def submit_move(self, move, defer_analysis=False):
         """
         Handles a move submitted by the player and updates the game state accordingly.
+
+        Avec `defer_analysis=True`, les points, l'évaluation et les meilleurs coups sont calculés
+        en arrière-plan (voir `ChessGame.submit_move`).
         """
         if self.current_move_index >= len(self.moves):
             return {'error': 'La partie est terminée'}
@@ -94,12 +82,6 @@ class ChessGame1Min:
         # Afficher immédiatement le coup soumis (avant validation)
         print(f"Coup soumis : {move.strip()}", flush=True)
 
-        # Stocker les meilleurs coups avant que le joueur ne joue
-        current_position_best_moves = self.best_moves.copy()
-
-         # Stocker la position FEN actuelle avant de jouer le coup
-        position_fen_before_move = self.board.fen()
-
         is_valid, validated_move, error_message = self.validate_input(
             convertir_notation_francais_en_anglais(move.strip()).lower()
         )
@@ -117,38 +99,22 @@ class ChessGame1Min:
             }
 
         # Afficher immédiatement le coup soumis
-        submitted_move_san = self.board.san(self.board.parse_uci(validated_move))
+        submitted_move = validated_move
+        submitted_chess_move = self.board.parse_uci(submitted_move)
+        submitted_move_san = self.board.san(submitted_chess_move)
         print(f"Coup soumis : {submitted_move_san}")
 
-        # Récupérer le coup correct pour la position actuelle
         correct_move = self.moves[self.current_move_index]
         correct_move_san = self.board.san(correct_move)
         current_comment = self.get_comment_for_current_move()
         
         is_pawn = self.is_pawn_move(correct_move_san)
-        submitted_move = validated_move
-
-        # Évaluer le coup joué par le joueur avec Stockfish
-        move_evaluation = evaluate_played_move(position_fen_before_move, validated_move)
-        
-
-        # Utiliser la nouvelle méthode de calcul des points
-        points, move_quality_message, checkmate_bonus = self.calculate_points(submitted_move, correct_move)
-        is_checkmate = checkmate_bonus > 0
 
         # Vérifier si le coup soumis est le même que le coup historique
-        submitted_chess_move = self.board.parse_uci(submitted_move)
         is_correct = (submitted_chess_move == correct_move)
-        
-        # Pour l'affichage
-        submitted_move_san = self.board.san(submitted_chess_move)
-
-        # Appliquer la pénalité de temps si nécessaire
-        if time_penalty:
-            points += time_penalty
-            move_quality_message += time_message
 
-        self.score = round(self.score + points)
+        # Position avant le coup, utilisée par l'analyse (éventuellement différée) du coup joué
+        board_before = self.board.copy(stack=False)
         
         # Jouer le coup correct (historique) sur l'échiquier
         self.board.push(correct_move)
@@ -165,14 +131,8 @@ class ChessGame1Min:
                 opponent_move_san = self.board.san(opponent_move)
                 opponent_comment = self.get_comment_for_opponent_move()
                 self.board.push(opponent_move)
-                fen_filename = f"{self.game_id}.fen"
-                app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin du dossier app
-                fen_dir = os.path.join(app_dir, "fen_saves")
-                # S'assurer que le répertoire existe
-                os.makedirs(fen_dir, exist_ok=True)
-                fen_path = os.path.join(fen_dir, fen_filename)
-                save_board_fen(self.board, filename=fen_path)
-                self.best_moves = get_best_moves_from_fen(fen_path)
+                # Instantané FEN optionnel (écriture asynchrone, FEN_SNAPSHOTS=1)
+                snapshot_board(self.game_id, self.board)
                 self.last_opponent_move = opponent_move_san
         else:  # user_side == 'black'
             # Joueur est noir, on doit jouer le coup blanc suivant
@@ -181,16 +141,13 @@ class ChessGame1Min:
                 opponent_move_san = self.board.san(opponent_move)
                 opponent_comment = self.get_comment_for_opponent_move()
                 self.board.push(opponent_move)
-                fen_filename = f"{self.game_id}.fen"
-                save_board_fen(self.board, filename=fen_filename)
-                fen_path = os.path.join(os.getcwd(), "fen_saves", fen_filename)
-                self.best_moves = get_best_moves_from_fen(fen_path)
+                # Instantané FEN optionnel (écriture asynchrone, FEN_SNAPSHOTS=1)
+                snapshot_board(self.game_id, self.board)
                 self.last_opponent_move = opponent_move_san
 
         self.current_move_index += 1
-        
-        # Réinitialiser le minuteur pour le prochain coup
-        self.move_start_time = time.time()
+        next_move_index = self.current_move_index
+        board_after = self.board.copy(stack=False)
 
         hint_message = ""
         if not is_correct:
@@ -198,17 +155,52 @@ class ChessGame1Min:
                 hint_message = "Pour les pions, entrez simplement la case d'arrivée (ex: e4)"
             else:
                 hint_message = "Pour les pièces, entrez la pièce et la case d'arrivée (ex: Nf3)"
-                
-        # Calcul du pourcentage de score avec limitation à 100%
-        score_percentage = min(100, round((self.score / self.max_score) * 100, 1)) if self.max_score > 0 else 0
 
-        return {
+        def analyse_move():
+            # Stocker les meilleurs coups avant que le joueur ne joue
+            current_position_best_moves = self.best_moves.copy()
+            # Profondeur atteinte par l'analyse qui note le coup
+            analysis_depth = self.analysis.depth if self.analysis is not None else None
+
+            # Utiliser la nouvelle méthode de calcul des points
+            points, move_quality_message, checkmate_bonus = self.calculate_points(submitted_move, correct_move, board=board_before)
+
+            # Évaluer le coup joué par le joueur (réutilise l'analyse de la position)
+            move_evaluation = evaluate_played_move(board_before, submitted_move, analysis=self.analysis)
+
+            # Appliquer la pénalité de temps si nécessaire
+            if time_penalty:
+                points += time_penalty
+                move_quality_message += time_message
+
+            self.score = round(self.score + points)
+            if opponent_move is not None:
+                self.analyse_current_position(next_move_index, board=board_after)
+
+            # Calcul du pourcentage de score avec limitation à 100%
+            score_percentage = min(100, round((self.score / self.max_score) * 100, 1)) if self.max_score > 0 else 0
+            return {
+                'score': self.score,
+                'score_percentage': score_percentage,  # Pourcentage limité à 100%
+                'move_quality': move_quality_message,
+                'points_earned': points,
+                'is_checkmate': checkmate_bonus > 0,
+                'checkmate_bonus': checkmate_bonus,
+                'move_evaluation': move_evaluation,  # Nouvelle clé avec l'évaluation du coup
+                'best_moves': self.best_moves,  # Coups pour la position actuelle (après le coup)
+                'previous_position_best_moves': current_position_best_moves,  # Coups alternatifs pour la position précédente
+                'analysis_depth': analysis_depth,  # Profondeur atteinte par l'analyse de la position précédente
+            }
+
+        if self.current_move_index >= len(self.moves):
+            discard_snapshot(self.game_id)  # Partie terminée : plus besoin de l'instantané
+
+        result = {
             'is_correct': is_correct,
             'correct_move': correct_move_san,
             'opponent_move': opponent_move_san,
             'board_fen': self.board.fen(),
             'score': self.score,
-            'score_percentage': score_percentage,  # Pourcentage limité à 100%
             'max_score': self.max_score,  # Ajout du score maximal
             'game_over': self.current_move_index >= len(self.moves),
             'is_player_turn': True,
@@ -219,31 +211,29 @@ class ChessGame1Min:
             'comment': current_comment,
             'opponent_comment': opponent_comment,
             'submitted_move': submitted_move_san,
-            'move_quality': move_quality_message,
-            'points_earned': points,
-            'is_checkmate': is_checkmate,
-            'checkmate_bonus': checkmate_bonus,
-            'move_evaluation': move_evaluation,  # Nouvelle clé avec l'évaluation du coup
-            'best_moves': self.best_moves,  # Coups pour la position actuelle (après le coup)
-            'previous_position_best_moves': current_position_best_moves,  # Coups alternatifs pour la position précédente
             'time_limit': self.time_limit,
-            'move_start_time': self.move_start_time,
             'is_last_chance': True
         }
+        # Points, évaluation et meilleurs coups : calculés tout de suite ou en arrière-plan
+        result.update(dispatch_move_analysis(self.game_id, analyse_move, defer=defer_analysis))
+        result['move_start_time'] = self.restart_move_timer()
+        return result
 
-    def calculate_points(self, submitted_move, correct_move):
+    def calculate_points(self, submitted_move, correct_move, board=None):
         """
         Calcule les points selon la qualité du coup soumis par rapport au coup correct
         en utilisant Stockfish pour l'évaluation directe, en tenant compte de la couleur du joueur.
         """
-        # Évaluer le coup correct
-        correct_eval = evaluate_move_strength(self.board, correct_move)
-        print("Évaluation du coup correct:", correct_eval)
+        if board is None:
+            board = self.board
 
-        
-        # Évaluer le coup soumis
-        submitted_chess_move = self.board.parse_uci(submitted_move)
-        submitted_eval = evaluate_move_strength(self.board, submitted_chess_move)
+        # Les deux coups sont évalués à partir de la même analyse multi-PV de la position
+        submitted_chess_move = board.parse_uci(submitted_move)
+        complete_analysis(self.analysis, board, [correct_move, submitted_chess_move])
+
+        # Évaluer le coup correct et le coup soumis (à part s'ils manquent à l'analyse)
+        correct_eval, submitted_eval = self.evaluate_moves(board, [correct_move, submitted_chess_move])
+        print("Évaluation du coup correct:", correct_eval)
         print("Évaluation du coup soumis:", submitted_eval,flush=True)
         
         # Inversion des évaluations pour les noirs car Stockfish donne toujours 
@@ -309,8 +299,8 @@ class ChessGame1Min:
             move_quality_message += f" (C'est le coup historique !)"
         
         # Vérifier si le coup est un échec et mat immédiat
-        temp_board = chess.Board(self.board.fen())
-        temp_board.push(self.board.parse_uci(submitted_move))
+        temp_board = chess.Board(board.fen())
+        temp_board.push(board.parse_uci(submitted_move))
         if temp_board.is_checkmate():
             checkmate_bonus = 20
             points += checkmate_bonus
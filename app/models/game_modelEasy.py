@@ -1,35 +1,35 @@
 import chess
 import chess.pgn
-import os
 from typing import Dict, List, Tuple, Optional, Any, Union
-from app.utils.engine_utils import evaluate_move_strength, get_best_moves_from_fen, evaluate_played_move
+from app.utils.engine_utils import evaluate_played_move
+from app.services.analysis_service import complete_analysis
 from app.utils.utils import convertir_notation_francais_en_anglais
-from app.utils.fen_utils import save_board_fen
+from app.utils.fen_utils import snapshot_board, discard_snapshot
+from app.services.move_analysis_service import dispatch_move_analysis
 from app.models.game_model import ChessGame
 class ChessGameEasy(ChessGame):
     """Version à difficulté moyenne : le joueur a 5 essais pour deviner le coup correct."""
+
+    # Budget de latence des analyses Stockfish du mode (voir `app.utils.analysis_budget`)
+    analysis_mode = "easy"
     
-    def __init__(self, game: chess.pgn.Game, user_side: str, game_id: Optional[str] = None, use_timer: bool = False) -> None:
-        super().__init__(game, user_side, game_id=game_id, use_timer=use_timer)
+    def __init__(self, game: chess.pgn.Game, user_side: str, game_id: Optional[str] = None, use_timer: bool = False, analyse: bool = True) -> None:
+        super().__init__(game, user_side, game_id=game_id, use_timer=use_timer, analyse=analyse)
         self.attempts: int = 0
         self.max_attempts: int = 5
         self.last_submitted_move: Optional[str] = None
         
-    def submit_move(self, move: str) -> Dict[str, Any]:
+    def submit_move(self, move: str, defer_analysis: bool = False) -> Dict[str, Any]:
         """
         Gère la soumission d'un coup avec plusieurs tentatives.
         On calcule et renvoie score_percentage seulement si le coup est correct
         ou si c'est le dernier essai.
+        Avec `defer_analysis=True`, l'évaluation du coup et les points sont calculés en
+        arrière-plan (voir `ChessGame.submit_move`).
         """
         if self.current_move_index >= len(self.moves):
             return {'error': 'La partie est terminée'} 
 
-        # Stocker l’état des meilleurs coups avant la soumission
-        current_position_best_moves: List[Dict[str, Any]] = self.best_moves.copy()
-
-        # Stocker la position FEN actuelle avant de jouer le coup
-        position_fen_before_move: str = self.board.fen()
-
         # Valider le format du coup
         is_valid: bool
         validated_move: str
@@ -59,8 +59,15 @@ class ChessGameEasy(ChessGame):
         is_correct: bool = (submitted_move_obj == correct_move)
         is_pawn: bool = self.is_pawn_move(correct_move_san)
 
-       # Évaluer le coup joué par le joueur avec Stockfish
-        move_evaluation: Dict[str, Any] = evaluate_played_move(position_fen_before_move, validated_move)
+        # Position avant le coup, utilisée par l'analyse (éventuellement différée) du coup joué
+        board_before: chess.Board = self.board.copy(stack=False)
+
+        def evaluate_submitted_move() -> Dict[str, Any]:
+            # Évaluer le coup joué par le joueur : au premier coup absent de l'analyse, une seule
+            # recherche note tous les coups légaux ; les essais suivants et calculate_points au
+            # dernier essai sont alors lus dans la table de l'analyse
+            complete_analysis(self.analysis, board_before, [submitted_move_obj], all_moves=True)
+            return evaluate_played_move(board_before, validated_move, analysis=self.analysis)
         
         
         # Incrémenter le compteur d'essais
@@ -71,23 +78,7 @@ class ChessGameEasy(ChessGame):
         if is_correct or self.attempts >= self.max_attempts:
             # Choix du coup à évaluer
             move_to_eval: str = validated_move if is_correct else self.last_submitted_move
-
-            # Calcul des points et bonus
-            points: int
-            move_quality_msg: str
-            checkmate_bonus: int
-            points, move_quality_msg, checkmate_bonus = self.calculate_points(
-                move_to_eval, correct_move
-            )
-            is_checkmate: bool = (checkmate_bonus > 0)
-            # Multiplicateur si coup correct en moins d’essais
-            if is_correct:
-                mult: float = (self.max_attempts - self.attempts + 1) / self.max_attempts
-                points = round(points * mult)
-                move_quality_msg += f" (x{mult:.1f} pour l'avoir trouvé en {self.attempts} essai{'s' if self.attempts>1 else ''})"
-
-            # Mise à jour du score
-            self.score = round(self.score + points)
+            attempts_used: int = self.attempts
 
             # Appliquer le coup correct pour faire avancer la partie
             self.board.push(correct_move)
@@ -108,55 +99,84 @@ class ChessGameEasy(ChessGame):
                     opponent_comment = self.get_comment_for_opponent_move()
                     self.board.push(op)
 
-            # Sauvegarde l'état du plateau dans un fichier FEN propre à cette partie
-            fen_filename: str = f"{self.game_id}.fen" if self.game_id else "fichierFenAjour.fen"
-            app_dir: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Chemin du dossier app
-            fen_dir: str = os.path.join(app_dir, "fen_saves")
-            # S'assurer que le répertoire existe
-            os.makedirs(fen_dir, exist_ok=True)
-            fen_path: str = os.path.join(fen_dir, fen_filename)
-            save_board_fen(self.board, filename=fen_path)
-            self.best_moves = get_best_moves_from_fen(fen_path)
+            # Instantané FEN optionnel (écriture asynchrone, FEN_SNAPSHOTS=1)
+            snapshot_board(self.game_id, self.board)
             self.last_opponent_move = opponent_move_san
 
             # Passer au coup suivant
             self.current_move_index += 1
             self.attempts = 0
+            next_move_index: int = self.current_move_index
+            board_after: chess.Board = self.board.copy(stack=False)
 
-            # Calcul du pourcentage de score **uniquement ici**
-            self.score_percentage = round((self.score / self.max_score) * 100, 2)
-            score_pct: float = self.score_percentage
+            def analyse_move() -> Dict[str, Any]:
+                # Stocker l’état des meilleurs coups avant la soumission
+                current_position_best_moves: List[Dict[str, Any]] = self.best_moves.copy()
+                # Profondeur atteinte par l'analyse qui note le coup
+                analysis_depth = self.analysis.depth if self.analysis is not None else None
+                move_evaluation: Dict[str, Any] = evaluate_submitted_move()
 
-            return {
+                # Calcul des points et bonus
+                points: int
+                move_quality_msg: str
+                checkmate_bonus: int
+                points, move_quality_msg, checkmate_bonus = self.calculate_points(
+                    move_to_eval, correct_move, board=board_before
+                )
+                is_checkmate: bool = (checkmate_bonus > 0)
+                # Multiplicateur si coup correct en moins d’essais
+                if is_correct:
+                    mult: float = (self.max_attempts - attempts_used + 1) / self.max_attempts
+                    points = round(points * mult)
+                    move_quality_msg += f" (x{mult:.1f} pour l'avoir trouvé en {attempts_used} essai{'s' if attempts_used>1 else ''})"
+
+                # Mise à jour du score
+                self.score = round(self.score + points)
+                self.analyse_current_position(next_move_index, board=board_after)
+
+                # Calcul du pourcentage de score **uniquement ici**
+                self.score_percentage = round((self.score / self.max_score) * 100, 2)
+                score_pct: float = self.score_percentage
+                return {
+                    'move_quality': move_quality_msg,
+                    'points_earned': points,
+                    'is_checkmate': is_checkmate,
+                    'checkmate_bonus': checkmate_bonus,
+                    'score': self.score,
+                    'score_percentage': score_pct,
+                    'best_moves': self.best_moves,
+                    'previous_position_best_moves': current_position_best_moves,
+                    'analysis_depth': analysis_depth,  # Profondeur atteinte par l'analyse de la position précédente
+                    'move_evaluation': move_evaluation,
+                }
+
+            if self.current_move_index >= len(self.moves):
+                discard_snapshot(self.game_id)  # Partie terminée : plus besoin de l'instantané
+
+            result: Dict[str, Any] = {
                 'is_correct': is_correct,
                 'correct_move': correct_move_san,
                 'opponent_move': opponent_move_san,
                 'comment': current_comment,
                 'opponent_comment': opponent_comment,
                 'submitted_move': submitted_move_san,
-                'move_quality': move_quality_msg,
-                'points_earned': points,
-                'is_checkmate': is_checkmate,
-                'checkmate_bonus': checkmate_bonus,
                 'score': self.score,
-                'score_percentage': score_pct,
                 'max_score': self.max_score,
                 'board_fen': self.board.fen(),
                 'game_over': self.current_move_index >= len(self.moves),
                 'is_player_turn': True,
                 'last_opponent_move': self.last_opponent_move,
                 'is_pawn_move': is_pawn,
-                'best_moves': self.best_moves,
-                'previous_position_best_moves': current_position_best_moves,
                 'attempts_used': self.attempts,
                 'attempts_left': 0,
-                'move_evaluation': move_evaluation,
                 'is_last_chance': self.attempts == 0
             }
+            result.update(dispatch_move_analysis(self.game_id, analyse_move, defer=defer_analysis))
+            return result
 
         # Branche "mauvais coup + essais restants" : on n'envoie PAS score_percentage
         else:
-            return {
+            result = {
                 'is_correct': False,
                 'submitted_move': submitted_move_san,
                 'move_quality': (
@@ -172,6 +192,9 @@ class ChessGameEasy(ChessGame):
                 'game_over': False,
                 'is_player_turn': True,
                 'last_opponent_move': self.last_opponent_move,
-                'move_evaluation': move_evaluation,
                 'is_last_chance': self.attempts == 0
             }
+            result.update(dispatch_move_analysis(
+                self.game_id, lambda: {'move_evaluation': evaluate_submitted_move()}, defer=defer_analysis
+            ))
+            return result
@@ -0,0 +1,229 @@
+import time
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import chess
+import chess.pgn
+from app.services.analysis_service import analyse_position
+from app.services.lookahead_service import prefetch_position, schedule_lookahead, wait_for_lookahead
+from app.utils.analysis_budget import AnalysisBudget, get_analysis_budget
+from app.utils.engine_utils import evaluate_move_strength
+
+
+class GameTemplate:
+    """
+        Données en lecture seule d'une partie PGN, partagées par toutes les sessions qui la rejouent.
+
+        La ligne principale est parcourue une seule fois : coups, notation SAN et FEN de chaque
+        demi-coup, commentaires. Une session ne garde ensuite que son curseur (`current_move_index`),
+        son score et ses essais ; l'échiquier se déduit du curseur (`board_at`).
+    """
+
+    __slots__ = ("headers", "moves", "white_moves", "black_moves", "sans", "fens", "comments", "__weakref__")
+
+    def __init__(self, game: chess.pgn.Game) -> None:
+        board = game.board()
+        moves, sans, fens, comments = [], [], [board.fen()], []
+        for node in game.mainline():
+            moves.append(node.move)
+            sans.append(board.san(node.move))
+            board.push(node.move)
+            fens.append(board.fen())
+            comments.append(node.comment.strip() if node.comment else "")
+        self.headers: dict = dict(game.headers)
+        self.moves: Tuple[chess.Move, ...] = tuple(moves)
+        self.white_moves: Tuple[chess.Move, ...] = self.moves[::2]
+        self.black_moves: Tuple[chess.Move, ...] = self.moves[1::2]
+        # Notation SAN de chaque demi-coup
+        self.sans: Tuple[str, ...] = tuple(sans)
+        # FEN avant chaque demi-coup, puis position finale
+        self.fens: Tuple[str, ...] = tuple(fens)
+        self.comments: Tuple[str, ...] = tuple(comments)
+
+    def fen_at(self, ply: int) -> str:
+        """FEN de la position après `ply` demi-coups (position finale au-delà)."""
+        return self.fens[min(ply, len(self.moves))]
+
+    def board_at(self, ply: int) -> chess.Board:
+        """Nouvel échiquier (sans historique) de la position après `ply` demi-coups."""
+        return chess.Board(self.fen_at(ply))
+
+
+# Modèles déjà construits, par partie PGN (libérés avec la partie)
+_templates: "weakref.WeakKeyDictionary[chess.pgn.Game, GameTemplate]" = weakref.WeakKeyDictionary()
+_templates_lock = threading.Lock()
+
+
+def get_game_template(game: Union[chess.pgn.Game, GameTemplate]) -> GameTemplate:
+    """
+        Retourne le modèle partagé d'une partie PGN, construit au premier appel.
+
+        Les parties lues par `get_cached_pgn_game` étant elles-mêmes partagées, toutes les sessions
+        d'une même partie reçoivent le même modèle.
+    """
+    if isinstance(game, GameTemplate):
+        return game
+    with _templates_lock:
+        template = _templates.get(game)
+    if template is None:
+        template = GameTemplate(game)
+        with _templates_lock:
+            template = _templates.setdefault(game, template)
+    return template
+
+
+class GameTemplateMixin:
+    """
+        État de partie adossé à un `GameTemplate` : listes de coups et commentaires partagées,
+        échiquier reconstruit à la demande à partir du curseur.
+
+        L'analyse de la position (`analysis`, `best_moves`) peut aussi être différée
+        (`prefetch_analysis`) : elle est lancée en arrière-plan et n'est attendue que
+        lorsqu'elle est lue pour la première fois.
+    """
+
+    # Définis par la classe de partie (`ChessGame` et ses variantes)
+    user_side: str
+    current_move_index: int
+
+    def _init_template(self, game: Union[chess.pgn.Game, GameTemplate], user_side: str) -> None:
+        """Référence les données partagées de la partie (aucune copie par session)."""
+        self.template = get_game_template(game)
+        self.all_moves = self.template.moves  # Liste tous les mouvements du jeu
+        self.comments = self.template.comments  # Commentaires de chaque demi-coup
+        self.white_moves = self.template.white_moves
+        self.black_moves = self.template.black_moves
+        # Mouvements de l'utilisateur et de son adversaire en fonction de la couleur choisie
+        self.moves = self.white_moves if user_side == 'white' else self.black_moves
+        self.opponent_moves = self.black_moves if user_side == 'white' else self.white_moves
+        self._board: Optional[chess.Board] = None
+        self._analysis: Any = None
+        self._best_moves: List[Dict[str, Any]] = []
+        # Indice du coup dont l'analyse a été différée (None : analyse à jour)
+        self._pending_analysis: Optional[int] = None
+
+    @property
+    def analysis_budget(self) -> AnalysisBudget:
+        """Budget de latence des analyses de la partie, selon son mode (`analysis_mode`)."""
+        return get_analysis_budget(getattr(self, "analysis_mode", None))
+
+    def _ply_of(self, move_index: int) -> int:
+        return 2 * move_index + (0 if self.user_side == 'white' else 1)
+
+    @property
+    def ply(self) -> int:
+        """Nombre de demi-coups joués : la position du joueur au coup `current_move_index`."""
+        return self._ply_of(self.current_move_index)
+
+    @property
+    def board(self) -> chess.Board:
+        """Échiquier courant, reconstruit à partir du curseur s'il a été libéré (`compact`)."""
+        if self._board is None:
+            self._board = self.template.board_at(self.ply)
+        return self._board
+
+    @board.setter
+    def board(self, board: chess.Board) -> None:
+        self._board = board
+
+    def compact(self) -> None:
+        """Libère l'échiquier matérialisé (et son historique) d'une session au repos."""
+        self._board = None
+
+    def analyse_current_position(self, move_index: Optional[int] = None, board: Optional[chess.Board] = None) -> None:
+        """
+            Analyse la position courante en une seule recherche multi-PV.
+
+            Le coup du maître attendu dans cette position est inclus dans l'analyse : le calcul
+            des points et l'évaluation du coup joué n'auront ainsi qu'à compléter l'analyse
+            pour le coup soumis s'il ne figure pas dans les lignes principales.
+
+            Les une ou deux positions suivantes du joueur, connues d'avance grâce au PGN, sont
+            ensuite analysées en arrière-plan (`app.services.lookahead_service`).
+
+            ###Arguments :
+
+                move_index (int) : Indice du coup du joueur attendu dans cette position
+                (par défaut `current_move_index`).
+                board (chess.Board) : Position à analyser (par défaut l'échiquier courant) ;
+                utilisé lorsque l'analyse est différée et que la partie a déjà avancé.
+        """
+        if move_index is None:
+            move_index = self.current_move_index
+        if board is None:
+            board = self.board
+        master_moves = [self.moves[move_index]] if move_index < len(self.moves) else []
+        # Position peut-être déjà en cours d'analyse anticipée : attendre plutôt que relancer
+        wait_for_lookahead(board)
+        self.analysis = analyse_position(board, moves=master_moves, budget=self.analysis_budget)
+        self.best_moves = self.analysis.best_moves
+        # Analyser en arrière-plan les prochaines positions du joueur pendant qu'il réfléchit
+        schedule_lookahead(board, self.all_moves, self._ply_of(move_index), budget=self.analysis_budget)
+
+    def restart_move_timer(self) -> float:
+        """
+            Redémarre le chronomètre du coup suivant et retourne son heure de départ.
+
+            Appelé après `dispatch_move_analysis` : le temps d'une analyse synchrone n'est pas
+            décompté au joueur.
+        """
+        self.move_start_time = time.time()
+        return self.move_start_time
+
+    def evaluate_moves(self, board: chess.Board, moves: Sequence[chess.Move]) -> List[Dict[str, Any]]:
+        """
+            Évaluations (point de vue des blancs) des positions après `moves`, lues dans l'analyse.
+
+            Un coup absent de l'analyse (recherche restreinte bornée ou dégradée, analyse relue du
+            cache ou de l'index sans ce coup) est évalué à part par `evaluate_move_strength`.
+        """
+        return [evaluation if evaluation is not None else evaluate_move_strength(board, move)
+                for move, evaluation in zip(moves, self.analysis.get_evaluations(moves))]
+
+    def prefetch_analysis(self) -> None:
+        """
+            Diffère l'analyse de la position courante jusqu'à sa première lecture.
+
+            L'analyse est lancée en arrière-plan (avec celle des positions suivantes) : la page de
+            la partie peut être rendue sans attendre le moteur, et le premier coup soumis trouve
+            le plus souvent l'analyse déjà prête.
+        """
+        move_index = self.current_move_index
+        board = self.template.board_at(self.ply)
+        master_moves = [self.moves[move_index]] if move_index < len(self.moves) else []
+        prefetch_position(board, master_moves, budget=self.analysis_budget)
+        schedule_lookahead(board, self.all_moves, self.ply, budget=self.analysis_budget)
+        self._pending_analysis = move_index
+
+    def _resolve_analysis(self) -> None:
+        """Effectue l'analyse différée, pour la position où elle a été demandée."""
+        move_index = self._pending_analysis
+        if move_index is not None:
+            self.analyse_current_position(move_index, board=self.template.board_at(self._ply_of(move_index)))
+            self._pending_analysis = None
+
+    @property
+    def analysis_ready(self) -> bool:
+        """Indique si l'analyse de la position est disponible sans attendre le moteur."""
+        return self._pending_analysis is None
+
+    @property
+    def analysis(self) -> Any:
+        """Analyse de la position (`PositionAnalysis`), calculée à la première lecture si elle a été différée."""
+        self._resolve_analysis()
+        return self._analysis
+
+    @analysis.setter
+    def analysis(self, analysis: Any) -> None:
+        self._analysis = analysis
+        self._pending_analysis = None
+
+    @property
+    def best_moves(self) -> List[Dict[str, Any]]:
+        """Meilleurs coups de la position, calculés à la première lecture si l'analyse a été différée."""
+        self._resolve_analysis()
+        return self._best_moves
+
+    @best_moves.setter
+    def best_moves(self, best_moves: List[Dict[str, Any]]) -> None:
+        self._best_moves = best_moves
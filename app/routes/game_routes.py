@@ -1,19 +1,109 @@
 import os
+import json
 import uuid
-from flask import Blueprint, render_template, request, jsonify, make_response
-from app.controllers.game_controller import GameController
-from app.utils.pgn_utils import get_pgn_games, load_pgn_file
+import functools
+from flask import Blueprint, render_template, request, jsonify, make_response, Response, stream_with_context
+from app.utils.pgn_utils import get_pgn_games, get_cached_pgn_game, resolve_pgn_file
 from app.models.game_model import ChessGame
 from app.models.game_modelNormal import ChessGameNormal
 from app.models.game_modelEasy import ChessGameEasy
 from app.models.game_model1min import ChessGame1Min
 from app.models.game_model3min import ChessGame3Min  
 from app.models.game_model_30sec import ChessGame30sec
+from app.services.move_analysis_service import get_move_analysis_queue
+from app.services.session_store import create_session_store, current_rss
+from app.utils.analysis_scheduler import AnalysisOverloaded, analysis_context, get_analysis_scheduler
+from app.utils.compact_response import (
+    RESPONSE_BYTES, SUPPORTED_VERSIONS, compact_response, encode_body, get_response_states
+)
+from app.utils.metrics import PROMETHEUS_CONTENT_TYPE, get_metrics, span, trace_request
 
 game_bp = Blueprint("game", __name__)
 
-# Stockage des parties en cours
-games = {}
+# Stockage des parties en cours (mémoire du processus ou SQLite partagé, voir SESSION_STORE)
+games = create_session_store()
+
+# Durée maximale d'attente d'un résultat par le flux SSE avant un message de maintien (secondes)
+SSE_KEEPALIVE_SECONDS = 15
+
+get_metrics().collect("chess_active_sessions", "Parties en cours dans le magasin de sessions.", lambda: len(games))
+get_metrics().collect("chess_sessions_evicted_total", "Parties supprimées, par motif (`idle`, `lru`).",
+                      lambda: {(reason,): count for reason, count in games.evicted.items()},
+                      kind="counter", labels=("reason",))
+get_metrics().collect("chess_process_resident_memory_bytes", "Mémoire résidente du worker.", current_rss)
+
+
+def traced(route):
+    """
+    Trace une route : durée de chaque étape (`span`) de la requête, renvoyée dans l'en-tête
+    `Server-Timing`, et histogrammes de `/metrics` (voir `app.utils.metrics`).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with trace_request(route) as trace:
+                response = make_response(view(*args, **kwargs))
+                trace.status = response.status_code
+            response.headers["Server-Timing"] = trace.server_timing()
+            return response
+        return wrapper
+    return decorator
+
+
+@game_bp.errorhandler(AnalysisOverloaded)
+def analysis_overloaded(error):
+    """
+    Répond 503 lorsque l'ordonnanceur des recherches refuse une requête (file saturée) :
+    le client peut rejouer la requête après `Retry-After` secondes, la partie n'ayant pas été modifiée.
+    """
+    return (jsonify({'error': str(error), 'retry_after': error.retry_after}), 503,
+            {'Retry-After': str(error.retry_after)})
+
+
+def is_async_requested(value, shared_store=False):
+    """
+    Indique si l'analyse différée est demandée (`async=1`), par défaut selon ASYNC_MOVE_ANALYSIS.
+
+    Les résultats des analyses différées restent dans le worker qui a traité le coup : avec un
+    magasin de sessions partagé (SESSION_STORE=sqlite), ASYNC_MOVE_ANALYSIS est ignorée et une
+    demande explicite lève `ValueError`.
+    """
+    if value is None:
+        return not shared_store and os.environ.get("ASYNC_MOVE_ANALYSIS", "0").lower() in ("1", "true", "yes", "on")
+    requested = str(value).lower() in ("1", "true", "yes", "on")
+    if requested and shared_store:
+        raise ValueError("L'analyse différée (async=1) n'est pas disponible avec un magasin de sessions partagé")
+    return requested
+
+# Classe de partie et template, par mode (`game_mode`) puis difficulté
+GAME_MODE_CLASSES = {
+    "lives": {
+        "easy": (ChessGameEasy, "deviner_prochain_coup_easy.html"),
+        "normal": (ChessGameNormal, "deviner_prochain_coup.html"),  # Use the "hard" template for normal difficulty
+        "hard": (ChessGame, "deviner_prochain_coup.html"),
+    },
+    "timer": {
+        "easy": (ChessGame3Min, "game_timer_3min.html"),  # Nouveau mode 3 minutes
+        "normal": (ChessGame1Min, "game_timer_1min.html"),  # Classe de jeu avec timer de 1 minute
+        "hard": (ChessGame30sec, "game_timer_hard.html"),  # Classe de jeu avec timer de 30 secondes
+    },
+}
+
+
+def select_game_mode(form):
+    """
+    Retourne la classe de partie et le template correspondant au formulaire de démarrage.
+
+    Le mode vies (`lives`) utilise le champ `difficulty`, le mode timer le champ `timer_difficulty`
+    (`normal` par défaut, `hard` pour une valeur inconnue). Un mode inconnu correspond au mode vies
+    en difficulté normale, avec le template `game_lives.html`.
+    """
+    game_mode = form.get("game_mode", "lives")  # Mode par défaut: vies
+    if game_mode not in GAME_MODE_CLASSES:
+        return ChessGameNormal, "game_lives.html"
+    difficulty_field = "difficulty" if game_mode == "lives" else "timer_difficulty"
+    difficulty = form.get(difficulty_field, "normal")
+    return GAME_MODE_CLASSES[game_mode].get(difficulty, GAME_MODE_CLASSES[game_mode]["hard"])
 
 # Définir le dossier contenant les fichiers PGN
 pgn_dir = os.path.join(os.path.dirname(__file__), "..", "dossierPgn")  # 📂 Adapte ce chemin si nécessaire
@@ -32,7 +122,7 @@ def home():
 
     ###Étapes effectuées par la fonction :
 
-    1. **Appel à `get_pgn_games()`** : Cette fonction récupère tous les fichiers PGN disponibles dans un répertoire.
+    1. **Appel à `get_pgn_games()`** : Cette fonction retourne le catalogue (gardé en mémoire) de toutes les parties des fichiers PGN.
     2. **Affichage du menu** : La fonction utilise `render_template()` pour afficher la page `menu.html`
        en lui passant la variable `pgn_games`.
 
@@ -70,6 +160,7 @@ def rules():
 
 
 @game_bp.route("/start-game", methods=["POST"])
+@traced("start_game")
 def start_game():
     """
     Démarre une nouvelle partie d'échecs à partir d'un fichier PGN et des préférences de l'utilisateur.
@@ -77,8 +168,8 @@ def start_game():
     Cette route est appelée lorsqu'un utilisateur soumet le formulaire de sélection de partie et de couleur
     via la méthode POST (depuis la page d'accueil, par exemple).
 
-    Elle permet d'initialiser une nouvelle instance de partie, de configurer le contrôleur de jeu, et
-    de charger l'état initial sur l'interface `deviner_prochain_coup.html`.
+    Elle permet d'initialiser une nouvelle instance de partie et de charger l'état initial sur
+    l'interface `deviner_prochain_coup.html`.
 
     ###Étapes effectuées par la fonction :
 
@@ -86,18 +177,21 @@ def start_game():
 
         - `game_file` : Le fichier PGN choisi par l'utilisateur.
         - `user_side` : La couleur sélectionnée (`white` ou `black`).
+        - `game_index` : Le rang de la partie dans le fichier PGN (0 par défaut).
     2. **Création d'un identifiant unique de partie** : Basé sur la taille actuelle du dictionnaire `games`.
-    3. **Chargement du fichier PGN** : Le fichier PGN est lu et transformé en objet jeu.
-    4. **Initialisation du contrôleur de jeu** : Une instance `GameController` est créée pour gérer la logique.
-    5. **Démarrage de la partie** : La méthode `start_game()` du contrôleur est appelée.
-    6. **Stockage de l'instance du jeu** : Une instance de `ChessGame` est enregistrée dans le dictionnaire global `games`.
-    7. **Rendu HTML** : La vue `deviner_prochain_coup.html` est rendue avec l'état initial du jeu.
+    3. **Chargement du fichier PGN** : Le nom est vérifié (`resolve_pgn_file` : un fichier `.pgn` du dossier, sinon 404),
+       puis la partie est lue une fois par processus et partagée (`get_cached_pgn_game`).
+    4. **Création de la partie** : Une seule instance de la classe du mode choisi (`select_game_mode`) est créée ;
+       l'analyse Stockfish de la position initiale est lancée en arrière-plan (`prefetch_analysis`).
+    5. **Stockage de l'instance du jeu** : L'instance est enregistrée dans le magasin de sessions `games`.
+    6. **Rendu HTML** : La vue `deviner_prochain_coup.html` est rendue avec l'état initial du jeu, sans attendre le moteur.
 
     ###Paramètres :
 
         Aucun en paramètre direct Python, mais récupère deux champs via `request.form` :
         - **game_file** (str) : Nom du fichier PGN sélectionné.
         - **user_side** (str) : Couleur choisie par l'utilisateur (`white` ou `black`).
+        - **game_index** (int) : Rang de la partie dans le fichier (un fichier PGN peut en contenir plusieurs).
 
     ###Retourne :
 
@@ -110,57 +204,42 @@ def start_game():
         - Point de départ interactif du jeu où le joueur va commencer à deviner les coups.
     """
     game_file = request.form.get("game_file")
+    game_index = request.form.get("game_index", 0, type=int)
     user_side = request.form.get("user_side")
-    game_mode = request.form.get("game_mode", "lives")  # Mode par défaut: vies
     display_mode = request.form.get("display_mode", "2D")
     # Création d'un identifiant unique pour la partie
     # game_id = str(len(games) + 1)
     game_id = str(uuid.uuid4())
 
 
-    game = load_pgn_file(os.path.join(pgn_dir, game_file))
+    # Partie PGN partagée (lecture seule) par toutes les sessions qui la rejouent
+    # Seuls les fichiers `.pgn` du dossier sont lus (et indexés) : pas de chemin fourni par le client
+    file_path = resolve_pgn_file(game_file, pgn_dir)
+    game = get_cached_pgn_game(file_path, game_index) if file_path is not None else None
+    if game is None:
+        return "Partie introuvable", 404
     
-    # Initialiser le contrôleur de jeu
-    game_controller = GameController(game, user_side)
-    game_controller.start_game()
-    print(user_side)
-    
-    # Sélectionner la classe de jeu et le template en fonction du mode et de la difficulté
-    if game_mode == "lives":
-        difficulty = request.form.get("difficulty", "normal")  # Difficulté pour le mode vies
-        if difficulty == "easy":
-            games[game_id] = ChessGameEasy(game, user_side, game_id=game_id)
-            template = "deviner_prochain_coup_easy.html"
-        elif difficulty == "normal":
-            games[game_id] = ChessGameNormal(game, user_side, game_id=game_id)
-            template = "deviner_prochain_coup.html"  # Use the "hard" template for normal difficulty
-        else:  # "hard" by default
-            games[game_id] = ChessGame(game, user_side, game_id=game_id)
-            template = "deviner_prochain_coup.html"
-    elif game_mode == "timer":
-        timer_difficulty = request.form.get("timer_difficulty", "normal")  # Difficulté pour le mode timer
-        if timer_difficulty == "easy":
-            games[game_id] = ChessGame3Min(game, user_side, game_id=game_id)  # Nouveau mode 3 minutes
-            template = "game_timer_3min.html"
-        elif timer_difficulty == "normal":
-            games[game_id] = ChessGame1Min(game, user_side, game_id=game_id)  # Classe de jeu avec timer de 1 minute
-            template = "game_timer_1min.html"
-        else:  # "hard" par défaut (30 secondes)
-            games[game_id] = ChessGame30sec(game, user_side, game_id=game_id)  # Classe de jeu avec timer de 30 secondes
-            template = "game_timer_hard.html"
-    # Si le mode n'est pas reconnu, utilisez le mode vies par défaut
-    else:
-        games[game_id] = ChessGameNormal(game, user_side, game_id=game_id)
-        template = "game_lives.html"
+    # Une seule instance de partie, sans attendre le moteur : l'analyse de la position initiale
+    # est lancée en arrière-plan et ne sera attendue qu'au premier coup soumis
+    game_class, template = select_game_mode(request.form)
+    # Serveur saturé : refuser la partie (503) plutôt que d'ajouter une analyse à la file
+    get_analysis_scheduler().admit()
+    with span("session_build", mode=game_class.analysis_mode):
+        chess_game = game_class(game, user_side, game_id=game_id, analyse=False)
+        chess_game.prefetch_analysis()
     
+    games.add(game_id, chess_game, game_file, game_index)
+
     # À la fin, utilisez cette approche simplifiée
-    rendered_template = render_template(template, game_id=game_id, game_state=games[game_id].get_game_state(),display_mode=display_mode )
+    with span("render"):
+        rendered_template = render_template(template, game_id=game_id, game_state=chess_game.get_game_state(),display_mode=display_mode )
     resp = make_response(rendered_template)
     resp.set_cookie('current_game_id', game_id, max_age=3600)
     return resp
 
 
 @game_bp.route("/submit-move", methods=["POST"])
+@traced("submit_move")
 def submit_move():
 
     """
@@ -189,6 +268,30 @@ def submit_move():
         - Si le résultat contient la clé `attempts_left`, elle est renommée en `remaining_attempts` 
           pour s'adapter au nom utilisé côté JavaScript.
 
+    ###Mode asynchrone :
+
+        Avec le champ `async=1` (ou ASYNC_MOVE_ANALYSIS=1), la réponse ne contient que la partie
+        déterministe (validité, coup correct, réponse de l'adversaire, nouvelle FEN) ainsi que
+        `analysis_pending` et `analysis_seq`. Les points, `move_evaluation` et `best_moves` sont
+        calculés en arrière-plan et récupérés via `/move-analysis/<game_id>` (polling) ou
+        `/move-analysis/<game_id>/stream` (Server-Sent Events). Ce mode est réservé au magasin de
+        sessions en mémoire : avec SESSION_STORE=sqlite (workers multiples), `async=1` répond 400
+        et ASYNC_MOVE_ANALYSIS est ignorée.
+
+    ###Serveur saturé :
+
+        Lorsque la file des recherches moteur est pleine (ou que la partie a trop d'analyses en
+        cours), la route répond 503 avec un en-tête `Retry-After`, sans jouer le coup. Avant ce
+        seuil, les analyses se dégradent : recherche moins profonde ou analyse en cache moins précise.
+
+    ###Format compact :
+
+        Avec le champ `format=compact` (version `v`, 1 par défaut), la réponse utilise le format
+        de `app.utils.compact_response` : clés courtes, évaluations entières, sans chaînes
+        d'affichage. Si le client renvoie dans `ack` l'identifiant `i` de la dernière réponse
+        reçue, seuls les champs modifiés depuis cet état sont envoyés. La réponse est compressée
+        en gzip si l'en-tête `Accept-Encoding` le permet. Une version inconnue répond 400.
+
     ###Retourne :
 
         `jsonify(result)` : Un objet JSON contenant :
@@ -206,19 +309,146 @@ def submit_move():
 
     game_id = request.form.get('game_id')
     move = request.form.get('move')
+    compact = request.form.get('format') == 'compact'
+    version = request.form.get('v', SUPPORTED_VERSIONS[-1], type=int)
+    if compact and version not in SUPPORTED_VERSIONS:
+        return jsonify({'error': f'Version du format compact non prise en charge : {version}',
+                        'versions': list(SUPPORTED_VERSIONS)}), 400
     
     # Récupérer le jeu depuis la session
     game = games.get(game_id)
     if not game:
         return jsonify({'error': 'Jeu non trouvé'})
     
+    # Refuser (503) avant de jouer le coup si l'analyse ne peut pas être servie : la partie reste intacte
+    get_analysis_scheduler().admit(game_id)
+
     # Soumettre le coup
-    result = game.submit_move(move)
+    try:
+        defer = is_async_requested(request.form.get('async'), shared_store=games.shared)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with analysis_context(session=game_id):
+        result = game.submit_move(move, defer_analysis=defer)
+    games.save(game_id, game)
+    if defer:
+        # L'analyse différée modifie encore la partie : l'enregistrer une fois terminée
+        get_move_analysis_queue().after(game_id, lambda: games.save(game_id, game))
     
     # Transformer attempts_left en remaining_attempts pour la cohérence avec le frontend
     if 'attempts_left' in result:
         result['remaining_attempts'] = result['attempts_left']
         del result['attempts_left']
     
-    return jsonify(result)
+    with span("json_serialize"):
+        if compact:
+            # Seuls les champs modifiés depuis l'état accusé par le client (`ack`) sont envoyés
+            payload = compact_response(get_response_states(), game_id, result, game.user_side == 'white',
+                                       ack=request.form.get('ack'))
+            if result.get('game_over'):
+                # Partie terminée : plus aucune réponse ne sera calculée par différence
+                get_response_states().discard(game_id)
+            body, headers = encode_body(payload, accept_gzip=request.accept_encodings['gzip'] > 0)
+            return Response(body, content_type='application/json', headers=headers)
+        response = jsonify(result)
+        RESPONSE_BYTES.observe(response.content_length or 0, format="json")
+        return response
+
+
+
+@game_bp.route("/move-analysis/<game_id>", methods=["GET"])
+def move_analysis(game_id):
+    """
+    Retourne les analyses de coups terminées pour une partie (mode asynchrone, polling).
+
+    ###Paramètres :
+
+        - **game_id** (str) : Identifiant de la partie.
+        - **since** (int, query string) : Numéro de séquence du dernier résultat déjà reçu (0 par défaut).
+
+    ###Retourne :
 
+        `jsonify` : `results` (analyses de numéro `seq` supérieur à `since` : points, `move_evaluation`,
+        `best_moves`...) et `pending` (nombre d'analyses encore en cours).
+    """
+    if game_id not in games:
+        return jsonify({'error': 'Jeu non trouvé'})
+
+    queue = get_move_analysis_queue()
+    since = request.args.get('since', 0, type=int)
+    return jsonify({
+        'game_id': game_id,
+        'results': queue.results(game_id, since=since),
+        'pending': queue.pending(game_id),
+    })
+
+
+@game_bp.route("/move-analysis/<game_id>/stream", methods=["GET"])
+def move_analysis_stream(game_id):
+    """
+    Diffuse les analyses de coups d'une partie en Server-Sent Events (mode asynchrone).
+
+    Chaque analyse est envoyée dans un événement `analysis` dont l'`id` est son numéro de séquence ;
+    un client qui se reconnecte reprend grâce à l'en-tête `Last-Event-ID` (ou au paramètre `since`).
+    Le flux se ferme lorsqu'il ne reste plus d'analyse en cours, pour ne pas occuper un worker.
+
+    ###Retourne :
+
+        flask.Response : Flux `text/event-stream`.
+    """
+    if game_id not in games:
+        return jsonify({'error': 'Jeu non trouvé'})
+
+    queue = get_move_analysis_queue()
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', 0, type=int)
+
+    def events(since):
+        while True:
+            results = queue.wait_for_results(game_id, since=since, timeout=SSE_KEEPALIVE_SECONDS)
+            for result in results:
+                since = result['seq']
+                yield f"id: {since}\nevent: analysis\ndata: {json.dumps(result)}\n\n"
+            if not results:
+                if not queue.pending(game_id):
+                    return
+                yield ": keep-alive\n\n"
+            elif not queue.pending(game_id):
+                return
+
+    return Response(stream_with_context(events(since)), mimetype="text/event-stream",
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@game_bp.route("/sessions/stats", methods=["GET"])
+def sessions_stats():
+    """
+    Retourne l'occupation mémoire des parties en cours pour ce worker.
+
+    Les parties inactives sont d'abord supprimées (voir SESSION_IDLE_TIMEOUT et SESSION_MAX),
+    puis le magasin de sessions rend ses compteurs.
+
+    ###Retourne :
+
+        `jsonify` : `sessions` (parties conservées), `max_sessions`, `idle_timeout`, `evicted`
+        (parties supprimées pour inactivité `idle` ou par dépassement du plafond `lru`),
+        `session_bytes` (mémoire estimée des parties) et `rss_bytes` (mémoire résidente du worker).
+    """
+    games.sweep()
+    stats = games.stats()
+    stats['rss_bytes'] = current_rss()
+    return jsonify(stats)
+
+
+@game_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Expose les mesures de ce worker au format texte Prometheus.
+
+    ###Retourne :
+
+        flask.Response : Histogrammes des durées de requêtes (`chess_request_duration_seconds`) et
+        d'étapes (`chess_span_duration_seconds` : lecture PGN, construction de session, appels
+        moteur, sérialisation JSON, entrées/sorties), profondeur et nœuds des recherches, parties
+        en cours, utilisation du pool de moteurs et taux de succès des caches.
+    """
+    return Response(get_metrics().render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,389 @@
+import chess
+import chess.polyglot
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+from app.utils.engine_utils import (
+    ANALYSIS_DEPTH, analyse_board, lines_from_analysis, format_move_info, to_board
+)
+from app.utils.analysis_budget import AnalysisBudget
+from app.utils.analysis_scheduler import get_analysis_scheduler
+from app.utils.analysis_index import get_analysis_index, encode_lines, decode_lines
+from app.utils.eval_cache import get_evaluation_cache
+from app.utils.metrics import get_metrics
+from app.utils.move_scores import MoveScoreTable, display_score
+from app.utils.opening_book import get_opening_book
+from app.utils.single_flight import SingleFlight
+from app.utils.tablebase import get_tablebase
+
+# Nombre de coups proposés au joueur comme meilleures alternatives
+NUM_TOP_MOVES = 3
+
+# Analyses de positions par provenance : tables de finales, cache d'évaluations, index précalculé,
+# livre d'ouvertures, analyse connue moins profonde (serveur chargé) ou moteur (`/metrics`)
+ANALYSES = get_metrics().counter("chess_position_analyses_total", "Analyses de positions, par provenance.",
+                                 labels=("source",))
+# Recherches multi-PV en cours, par (position, nombre de lignes, limites du budget)
+_analysis_flights = SingleFlight("analysis")
+
+MoveLike = Union[chess.Move, str]
+
+
+def _to_uci(move: MoveLike) -> str:
+    return move.uci() if isinstance(move, chess.Move) else move
+
+
+class PositionAnalysis:
+    """
+        Résultat structuré de l'analyse d'une position avant le coup du joueur.
+
+        Une seule recherche multi-PV de la position fournit à la fois :
+
+        - les meilleurs coups proposés au joueur (`best_moves`) ;
+        - l'évaluation de chaque coup analysé (`get_evaluation`), utilisée par
+          `calculate_points` (coup du maître et coup soumis) et par `evaluate_played_move`.
+
+        Les coups absents des lignes principales sont ajoutés par une recherche restreinte
+        (`searchmoves`) via `complete_analysis`, qui peut aussi évaluer d'un coup tous les
+        coups légaux restants (`all_moves`) : les essais suivants du joueur sont alors notés
+        sans moteur.
+
+        Les évaluations sont rangées dans une table indexée par coup légal (`MoveScoreTable`) ;
+        elles sont exprimées du point de vue des blancs, comme celles de `evaluate_move_strength`.
+        Les coups de théorie du livre d'ouvertures (`book_moves`) sont étiquetés `"book": True`
+        dans `best_moves`.
+
+        `depth` est la profondeur effectivement atteinte par la recherche ; `budget`
+        (`AnalysisBudget`) borne aussi les recherches restreintes ajoutées ensuite.
+    """
+
+    def __init__(self, fen: str, lines: List[Dict[str, Any]], depth: int = ANALYSIS_DEPTH,
+                 num_top_moves: int = NUM_TOP_MOVES, budget: Optional[AnalysisBudget] = None,
+                 board: Optional[chess.Board] = None) -> None:
+        self.fen: str = fen
+        self.depth: int = depth
+        self.num_top_moves: int = num_top_moves
+        self.budget: AnalysisBudget = budget if budget is not None else AnalysisBudget(depth=depth)
+        # Lignes principales du moteur, dans l'ordre de la recherche multi-PV
+        self.lines: List[Dict[str, Any]] = lines
+        # Évaluation de chaque coup légal analysé (lignes principales + recherches restreintes)
+        board = board if board is not None else chess.Board(fen)
+        self.table: MoveScoreTable = MoveScoreTable(board)
+        self.table.update(lines)
+        # Coups de théorie de la position (livre d'ouvertures), en UCI
+        self.book_moves: FrozenSet[str] = get_opening_book().book_moves(board)
+        self.best_moves: List[Dict[str, Any]] = [dict(line) for line in lines[:num_top_moves]]
+        if self.best_moves:
+            ucis = [line["uci"] for line in self.best_moves]
+            for move, strength in zip(self.best_moves, self.table.relative_strengths(ucis, base=ucis[0])):
+                move["relative_strength"] = strength
+                if move["uci"] in self.book_moves:
+                    move["book"] = True
+
+    @property
+    def move_infos(self) -> Dict[str, Dict[str, Any]]:
+        """Description (`format_move_info`) de chaque coup analysé, par UCI."""
+        infos = {line["uci"]: line for line in self.lines}
+        for line in self.extra_lines():
+            infos.setdefault(line["uci"], line)
+        return infos
+
+    def is_book_move(self, move: MoveLike) -> bool:
+        """Indique si le coup est un coup de théorie du livre d'ouvertures."""
+        return _to_uci(move) in self.book_moves
+
+    def has_move(self, move: MoveLike) -> bool:
+        """Indique si le coup a déjà été évalué par l'analyse."""
+        return _to_uci(move) in self.table
+
+    def missing_moves(self, moves: Iterable[MoveLike]) -> List[str]:
+        """Retourne (sans doublons) les coups qui n'ont pas encore été évalués."""
+        missing: List[str] = []
+        for move in moves:
+            uci = _to_uci(move)
+            if uci not in self.table and uci not in missing:
+                missing.append(uci)
+        return missing
+
+    def get_evaluation(self, move: MoveLike) -> Optional[Dict[str, Any]]:
+        """
+            Retourne l'évaluation {"type", "value", "display_score"} de la position après `move`,
+            ou None si le coup n'a pas été analysé. Une copie est renvoyée pour que l'appelant
+            puisse l'ajuster (inversion pour les noirs) sans modifier l'analyse.
+        """
+        return self.get_evaluations([move])[0]
+
+    def get_evaluations(self, moves: Iterable[MoveLike]) -> List[Optional[Dict[str, Any]]]:
+        """Comme `get_evaluation`, pour plusieurs coups en une lecture de la table."""
+        return [None if evaluation is None else dict(evaluation, display_score=display_score(evaluation))
+                for evaluation in self.table.evaluations(moves)]
+
+    def add_lines(self, lines: List[Dict[str, Any]]) -> None:
+        """Ajoute les évaluations issues d'une recherche restreinte."""
+        self.table.update(lines)
+
+    def extra_lines(self) -> List[Dict[str, Any]]:
+        """Coups évalués par des recherches restreintes (hors lignes principales)."""
+        top_moves = {line["uci"] for line in self.lines}
+        extra = [uci for uci in self.table.scored() if uci not in top_moves]
+        if not extra:
+            return []
+        board = chess.Board(self.fen)
+        return [format_move_info(board, chess.Move.from_uci(uci), evaluation)
+                for uci, evaluation in zip(extra, self.table.evaluations(extra))]
+
+    def to_record(self) -> Dict[str, Any]:
+        """Forme compacte (sérialisable en JSON) utilisée par le cache d'évaluations."""
+        return {"n": self.num_top_moves, "d": self.depth, "lines": encode_lines(self.lines),
+                "extra": encode_lines(self.extra_lines())}
+
+
+def reached_depth(infos: Any, default: int) -> int:
+    """Profondeur atteinte par une recherche : la plus faible des lignes retenues (`default` si inconnue)."""
+    if isinstance(infos, dict):
+        infos = [infos]
+    depths = [info["depth"] for info in infos if "depth" in info]
+    return min(depths) if depths else default
+
+
+def build_analysis(board: chess.Board, lines: List[Dict[str, Any]], extra: List[Dict[str, Any]],
+                   depth: int, num_top_moves: int, budget: Optional[AnalysisBudget] = None) -> PositionAnalysis:
+    """Reconstruit une analyse à partir de coups décodés ({"uci", "evaluation"}) sans appeler le moteur."""
+    def to_lines(decoded: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [format_move_info(board, chess.Move.from_uci(line["uci"]), line["evaluation"]) for line in decoded]
+
+    analysis = PositionAnalysis(board.fen(), to_lines(lines), depth=depth, num_top_moves=num_top_moves, budget=budget,
+                                board=board)
+    analysis.add_lines(to_lines(extra))
+    return analysis
+
+
+def store_analysis(analysis: PositionAnalysis, board: chess.Board) -> None:
+    """
+        Enregistre l'analyse dans le cache d'évaluations partagé.
+
+        La clé est la profondeur maximale du budget (et non la profondeur atteinte) : tous les
+        modes de jeu partagent ainsi les mêmes entrées, chacun vérifiant la profondeur
+        atteinte (`"d"`) lors de la lecture.
+    """
+    if analysis.lines:
+        get_evaluation_cache().set(board, analysis.budget.depth, analysis.to_record(), kind="analysis")
+
+
+def analysis_from_cache(board: chess.Board, num_top_moves: int = NUM_TOP_MOVES,
+                        depth: int = ANALYSIS_DEPTH,
+                        budget: Optional[AnalysisBudget] = None) -> Optional[PositionAnalysis]:
+    """
+        Retourne l'analyse de la position si elle est en cache avec au moins `num_top_moves` lignes,
+        calculée au moins à la profondeur minimale du budget (`budget.min_depth`).
+    """
+    budget = budget if budget is not None else AnalysisBudget(depth=depth)
+    record = get_evaluation_cache().get(board, budget.depth, kind="analysis")
+    if record is None or record["n"] < num_top_moves:
+        return None
+    if record.get("d", budget.depth) < budget.min_depth:
+        return None
+    return build_analysis(board, decode_lines(record["lines"]), decode_lines(record["extra"]),
+                          depth=record.get("d", budget.depth), num_top_moves=num_top_moves, budget=budget)
+
+
+def analysis_from_record(board: chess.Board, record: Dict[str, Any], depth: int = ANALYSIS_DEPTH,
+                         budget: Optional[AnalysisBudget] = None) -> PositionAnalysis:
+    """Reconstruit une analyse à partir de sa forme compacte (`PositionAnalysis.to_record`), sans moteur."""
+    return build_analysis(board, decode_lines(record["lines"]), decode_lines(record["extra"]),
+                          depth=depth, num_top_moves=record["n"], budget=budget)
+
+
+def complete_analysis(analysis: PositionAnalysis, board: chess.Board,
+                      moves: Iterable[MoveLike], deadline_at: Optional[float] = None,
+                      all_moves: bool = False) -> PositionAnalysis:
+    """
+        Garantit que `moves` sont évalués dans `analysis`.
+
+        Les coups manquants (hors des lignes principales) sont évalués ensemble par une
+        unique recherche restreinte à ces coups (`searchmoves`), au lieu d'une recherche
+        complète par coup. La recherche est bornée par le budget de l'analyse
+        (et par l'échéance `deadline_at` si elle est donnée).
+
+        Avec `all_moves`, la recherche lancée pour un coup manquant évalue tous les coups légaux
+        pas encore notés : la table de l'analyse est alors complète et les coups suivants (essais
+        du joueur, `calculate_points`) sont lus sans moteur.
+    """
+    missing = [uci for uci in analysis.missing_moves(moves)
+               if chess.Move.from_uci(uci) in board.legal_moves]
+    if missing and all_moves:
+        missing = analysis.table.missing()
+    if missing:
+        if deadline_at is None:
+            deadline_at = analysis.budget.start()
+        infos = analyse_board(
+            board,
+            depth=analysis.budget.depth,
+            multipv=len(missing),
+            root_moves=[chess.Move.from_uci(uci) for uci in missing],
+            budget=analysis.budget,
+            deadline_at=deadline_at,
+        )
+        analysis.add_lines(lines_from_analysis(board, infos))
+        store_analysis(analysis, board)
+    return analysis
+
+
+def analysis_from_index(board: chess.Board, num_top_moves: int = NUM_TOP_MOVES,
+                        depth: int = ANALYSIS_DEPTH,
+                        budget: Optional[AnalysisBudget] = None) -> Optional[PositionAnalysis]:
+    """
+        Reconstruit l'analyse d'une position à partir de l'index précalculé
+        (voir `build_analysis_index.py`), sans appeler le moteur.
+
+        Retourne None si la position n'est pas indexée ou si l'index est moins précis
+        (profondeur minimale du budget ou nombre de lignes) que l'analyse demandée.
+    """
+    budget = budget if budget is not None else AnalysisBudget(depth=depth)
+    index = get_analysis_index()
+    if index.depth < budget.min_depth or index.num_top_moves < num_top_moves:
+        return None
+    entry = index.lookup(board)
+    if entry is None:
+        return None
+    return build_analysis(board, entry["lines"], entry["extra"], depth=index.depth,
+                          num_top_moves=num_top_moves, budget=budget)
+
+
+def analysis_from_book(board: chess.Board, num_top_moves: int = NUM_TOP_MOVES,
+                       depth: int = ANALYSIS_DEPTH,
+                       budget: Optional[AnalysisBudget] = None) -> Optional[PositionAnalysis]:
+    """
+        Reconstruit l'analyse d'une position d'ouverture à partir du livre d'ouvertures
+        (voir `build_opening_book.py`), sans appeler le moteur.
+
+        Retourne None si le livre ne contient pas au moins `num_top_moves` coups évalués à la
+        profondeur minimale du budget, dont un coup de théorie.
+    """
+    budget = budget if budget is not None else AnalysisBudget(depth=depth)
+    lines = get_opening_book().best_lines(board, num_top_moves, min_depth=budget.min_depth)
+    if lines is None:
+        return None
+    top = lines[:num_top_moves]
+    return build_analysis(board, top, lines[num_top_moves:], depth=min(line["depth"] for line in top),
+                          num_top_moves=num_top_moves, budget=budget)
+
+
+def analysis_from_tablebase(board: chess.Board, num_top_moves: int = NUM_TOP_MOVES,
+                            depth: int = ANALYSIS_DEPTH,
+                            budget: Optional[AnalysisBudget] = None) -> Optional[PositionAnalysis]:
+    """
+        Analyse exacte d'une position de finale à partir des tables Syzygy (voir
+        `app.utils.tablebase`), sans appeler le moteur : tous les coups légaux sont évalués.
+
+        Retourne None si les tables ne couvrent pas la position.
+    """
+    budget = budget if budget is not None else AnalysisBudget(depth=depth)
+    lines = get_tablebase().evaluate_moves(board)
+    if lines is None:
+        return None
+    return build_analysis(board, lines[:num_top_moves], lines[num_top_moves:], depth=budget.depth,
+                          num_top_moves=num_top_moves, budget=budget)
+
+
+def known_analysis(board: chess.Board, num_top_moves: int,
+                   budget: AnalysisBudget) -> Tuple[Optional[PositionAnalysis], str]:
+    """
+        Retourne l'analyse connue de la position (tables de finales, cache d'évaluations, index
+        puis livre) et sa provenance.
+    """
+    # Les tables de finales donnent le résultat exact : elles passent avant toute analyse du moteur
+    known = analysis_from_tablebase(board, num_top_moves=num_top_moves, budget=budget)
+    if known is not None:
+        return known, "tablebase"
+    # Le cache passe en premier : il contient aussi les coups joueurs évalués en plus de l'index
+    known = analysis_from_cache(board, num_top_moves=num_top_moves, budget=budget)
+    if known is not None:
+        return known, "cache"
+    known = analysis_from_index(board, num_top_moves=num_top_moves, budget=budget)
+    if known is not None:
+        return known, "index"
+    return analysis_from_book(board, num_top_moves=num_top_moves, budget=budget), "book"
+
+
+def search_position(board: chess.Board, num_top_moves: int, budget: AnalysisBudget,
+                    deadline_at: Optional[float] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """
+        Recherche multi-PV d'une position par le moteur.
+
+        ###Retourne :
+
+            tuple : (lignes principales au format `format_move_info`, profondeur atteinte), partagé
+            par les analyses simultanées de la même position : à copier avant modification.
+    """
+    ANALYSES.inc(source="engine")
+    infos = analyse_board(board, depth=budget.depth, multipv=num_top_moves, budget=budget, deadline_at=deadline_at)
+    return lines_from_analysis(board, infos), reached_depth(infos, budget.depth)
+
+
+def analyse_position(position: Union[chess.Board, str], moves: Iterable[MoveLike] = (),
+                     num_top_moves: int = NUM_TOP_MOVES,
+                     depth: int = ANALYSIS_DEPTH,
+                     use_index: bool = True,
+                     budget: Optional[AnalysisBudget] = None) -> PositionAnalysis:
+    """
+        Analyse une position en une seule recherche multi-PV.
+
+        ###Paramètres :
+
+            position (chess.Board | str) : La position à analyser, échiquier ou chaîne FEN
+                (le joueur est au trait).
+            moves : Coups dont l'évaluation est nécessaire (ex. le coup du maître) ; ceux qui
+                ne figurent pas dans les lignes principales sont évalués par `complete_analysis`.
+            num_top_moves (int) : Nombre de lignes principales demandées au moteur.
+            depth (int) : Profondeur de recherche (sans `budget`).
+            use_index (bool) : Consulter d'abord les tables de finales, le cache d'évaluations
+                partagé, l'index précalculé des parties puis le livre d'ouvertures ; le moteur n'est alors appelé
+                que pour les coups qu'ils ne couvrent pas. Lorsque l'ordonnanceur des recherches
+                est saturé, une analyse connue moins profonde que `budget.min_depth` est aussi acceptée.
+            budget (AnalysisBudget) : Budget de latence de l'analyse (voir
+                `app.utils.analysis_budget`) ; par défaut, recherche à profondeur fixe `depth`.
+
+        ###Retourne :
+
+            PositionAnalysis : Meilleurs coups et évaluations des coups demandés, avec la
+            profondeur effectivement atteinte (`depth`).
+    """
+    budget = budget if budget is not None else AnalysisBudget(depth=depth)
+    deadline_at = budget.start()
+    board = to_board(position)
+    if board.is_game_over():
+        return PositionAnalysis(board.fen(), [], depth=budget.depth, num_top_moves=num_top_moves, budget=budget,
+                                board=board)
+
+    moves = list(moves)
+    if use_index:
+        known, source = known_analysis(board, num_top_moves, budget)
+        if known is None and get_analysis_scheduler().saturated():
+            # Serveur chargé : une analyse connue moins profonde plutôt qu'une recherche de plus en file
+            known, _ = known_analysis(board, num_top_moves, budget.replace(min_depth=1))
+            source = "degraded"
+        if known is not None:
+            ANALYSES.inc(source=source)
+            try:
+                return complete_analysis(known, board, moves, deadline_at=deadline_at)
+            except Exception as e:
+                print(f"Erreur lors de l'analyse Stockfish : {e}")
+                return known
+
+    try:
+        # Des analyses simultanées de la même position (élèves d'une même classe) partagent une recherche
+        key = (chess.polyglot.zobrist_hash(board), num_top_moves, budget.limits)
+        lines, depth = _analysis_flights.do(key, lambda: search_position(board, num_top_moves, budget, deadline_at))
+        analysis = PositionAnalysis(board.fen(), [dict(line) for line in lines], depth=depth,
+                                    num_top_moves=num_top_moves, budget=budget, board=board)
+        complete_analysis(analysis, board, moves, deadline_at=deadline_at)
+        store_analysis(analysis, board)
+    except Exception as e:
+        print(f"Erreur lors de l'analyse Stockfish : {e}")
+        return PositionAnalysis(board.fen(), [], depth=budget.depth, num_top_moves=num_top_moves, budget=budget,
+                                board=board)
+
+    print(f"🔍 Meilleurs coups proposés par Stockfish (profondeur {analysis.depth}) :")
+    for move in analysis.best_moves:
+        print(f"➡ {move['uci']} ({move['san']}) : {move['display_score']}")
+
+    return analysis
@@ -0,0 +1,203 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import chess
+from app.services.analysis_service import analyse_position
+from app.utils.analysis_budget import AnalysisBudget
+from app.utils.analysis_index import position_key
+from app.utils.analysis_scheduler import analysis_context, get_analysis_scheduler
+from app.utils.engine_pool import get_engine_pool
+from app.utils.metrics import get_metrics, span
+from app.utils.shutdown import on_shutdown
+
+# Nombre de positions futures du joueur analysées à l'avance (surcharge via LOOKAHEAD_POSITIONS)
+DEFAULT_LOOKAHEAD_POSITIONS = 2
+# Attente maximale d'une analyse anticipée déjà en cours (secondes)
+LOOKAHEAD_WAIT_TIMEOUT = 30.0
+
+
+def upcoming_positions(board: chess.Board, all_moves: Sequence[chess.Move], ply: int,
+                       count: int) -> List[Tuple[chess.Board, chess.Move]]:
+    """
+        Calcule les prochaines positions où le joueur sera au trait.
+
+        La partie suit le PGN : après le coup du maître (demi-coup `ply`) et la réponse
+        historique de l'adversaire, la position suivante du joueur est connue d'avance.
+
+        ###Paramètres :
+
+            board (chess.Board) : Position courante, le joueur est au trait.
+            all_moves : Coups de la ligne principale du PGN.
+            ply (int) : Indice dans `all_moves` du coup attendu dans `board`.
+            count (int) : Nombre de positions futures à calculer.
+
+        ###Retourne :
+
+            list : Couples (position, coup du maître attendu dans cette position).
+    """
+    board = board.copy(stack=False)
+    positions: List[Tuple[chess.Board, chess.Move]] = []
+    while len(positions) < count and ply + 2 < len(all_moves):
+        board.push(all_moves[ply])
+        board.push(all_moves[ply + 1])
+        ply += 2
+        positions.append((board.copy(stack=False), all_moves[ply]))
+    return positions
+
+
+class LookaheadScheduler:
+    """
+        Analyse spéculative, en arrière-plan, des prochaines positions du joueur.
+
+        Pendant que le joueur réfléchit, les positions suivantes (coup du maître inclus) sont
+        analysées par `analyse_position`, qui les enregistre dans le cache d'évaluations partagé :
+        le prochain `submit_move` trouve `best_moves` et l'évaluation du coup du maître déjà prêts.
+
+        Une position déjà planifiée n'est pas analysée deux fois ; `wait()` permet d'attendre une
+        analyse anticipée en cours plutôt que de relancer la même recherche.
+
+        Les positions futures (`schedule`) sont analysées en arrière-plan : l'ordonnanceur des
+        recherches les sert après les coups des joueurs et les abandonne lorsqu'il est saturé.
+        `wait()` rend prioritaire l'analyse attendue.
+    """
+
+    def __init__(self, positions: int = DEFAULT_LOOKAHEAD_POSITIONS, max_workers: int = 1) -> None:
+        self.positions: int = positions
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lookahead")
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.scheduled: int = 0
+        self.waited: int = 0
+        self._closed: bool = False
+
+    def _analyse(self, key: str, board: chess.Board, master_moves: Sequence[chess.Move],
+                 budget: Optional[AnalysisBudget] = None, background: bool = False) -> None:
+        try:
+            if not self._closed:
+                with analysis_context(background=background, tag=key):
+                    analyse_position(board, moves=master_moves, budget=budget)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def prefetch(self, board: chess.Board, master_moves: Sequence[chess.Move] = (),
+                 budget: Optional[AnalysisBudget] = None, background: bool = False) -> bool:
+        """
+            Planifie l'analyse d'une position (coups du maître inclus), bornée par le budget du mode
+            de jeu ; retourne False si elle est déjà en cours. Une analyse `background` passe
+            après les recherches demandées par les joueurs.
+        """
+        board = board.copy(stack=False)
+        key = position_key(board)
+        with self._lock:
+            if key in self._inflight:
+                return False
+            self._inflight[key] = self._executor.submit(self._analyse, key, board, list(master_moves), budget,
+                                                         background)
+            self.scheduled += 1
+        return True
+
+    def schedule(self, board: chess.Board, all_moves: Sequence[chess.Move], ply: int,
+                 budget: Optional[AnalysisBudget] = None) -> int:
+        """Planifie l'analyse des prochaines positions du joueur ; retourne le nombre de positions ajoutées."""
+        added = 0
+        for position, master_move in upcoming_positions(board, all_moves, ply, self.positions):
+            if self.prefetch(position, [master_move], budget=budget, background=True):
+                added += 1
+        return added
+
+    def wait(self, board: chess.Board, timeout: Optional[float] = LOOKAHEAD_WAIT_TIMEOUT) -> bool:
+        """Attend la fin de l'analyse anticipée de `board` si elle est en cours ; retourne True si c'était le cas."""
+        key = position_key(board)
+        with self._lock:
+            future = self._inflight.get(key)
+        if future is None:
+            return False
+        self.waited += 1
+        # Un joueur attend désormais cette analyse : elle passe devant les autres tâches d'arrière-plan
+        get_analysis_scheduler().promote(key)
+        try:
+            with span("lookahead_wait"):
+                future.result(timeout=timeout)
+        except Exception as e:
+            print(f"Erreur lors de l'analyse anticipée : {e}")
+        return True
+
+    def close(self) -> None:
+        """Abandonne les analyses anticipées en attente et attend celle en cours (arrêt du processus)."""
+        self._closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs de l'analyse anticipée."""
+        with self._lock:
+            return {
+                'positions': self.positions,
+                'inflight': len(self._inflight),
+                'scheduled': self.scheduled,
+                'waited': self.waited,
+            }
+
+
+_scheduler: Optional[LookaheadScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_lookahead_scheduler() -> LookaheadScheduler:
+    """
+        Retourne le planificateur d'analyses anticipées du processus, créé au premier appel.
+
+        Configuration par variables d'environnement :
+        - LOOKAHEAD_POSITIONS : nombre de positions futures analysées (0 désactive) ;
+        - LOOKAHEAD_WORKERS : nombre de threads dédiés (1 par défaut, pour laisser le pool
+          Stockfish disponible aux analyses demandées par les joueurs).
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                # Créer le pool d'abord : les fonctions de fermeture s'exécutent en ordre inverse,
+                # le planificateur est ainsi arrêté avant la fermeture des moteurs
+                get_engine_pool()
+                _scheduler = LookaheadScheduler(
+                    positions=int(os.environ.get("LOOKAHEAD_POSITIONS", DEFAULT_LOOKAHEAD_POSITIONS)),
+                    max_workers=max(1, int(os.environ.get("LOOKAHEAD_WORKERS", 1))),
+                )
+                on_shutdown(_scheduler.close)
+    return _scheduler
+
+
+
+def _scheduler_stat(name: str) -> Optional[int]:
+    """Compteur du planificateur du processus pour `/metrics`, ou None s'il n'a pas encore été créé."""
+    return None if _scheduler is None else _scheduler.stats()[name]
+
+
+get_metrics().collect("chess_lookahead_inflight", "Analyses anticipées en cours ou en attente.",
+                      lambda: _scheduler_stat("inflight"))
+get_metrics().collect("chess_lookahead_scheduled_total", "Analyses anticipées planifiées.",
+                      lambda: _scheduler_stat("scheduled"), kind="counter")
+get_metrics().collect("chess_lookahead_waited_total", "Analyses attendues parce qu'encore en cours à la demande.",
+                      lambda: _scheduler_stat("waited"), kind="counter")
+
+def schedule_lookahead(board: chess.Board, all_moves: Sequence[chess.Move], ply: int,
+                       budget: Optional[AnalysisBudget] = None) -> int:
+    """Planifie l'analyse des prochaines positions du joueur (voir `LookaheadScheduler`)."""
+    scheduler = get_lookahead_scheduler()
+    if scheduler.positions <= 0:
+        return 0
+    return scheduler.schedule(board, all_moves, ply, budget=budget)
+
+
+def prefetch_position(board: chess.Board, master_moves: Sequence[chess.Move] = (),
+                      budget: Optional[AnalysisBudget] = None) -> bool:
+    """Lance en arrière-plan l'analyse d'une position dont le résultat sera demandé plus tard."""
+    return get_lookahead_scheduler().prefetch(board, master_moves, budget=budget)
+
+
+def wait_for_lookahead(board: chess.Board) -> bool:
+    """Attend l'analyse anticipée de `board` si elle est encore en cours."""
+    if _scheduler is None:
+        return False
+    return _scheduler.wait(board)
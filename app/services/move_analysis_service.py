@@ -0,0 +1,172 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from app.utils.analysis_scheduler import analysis_context
+
+# Nombre de résultats conservés par partie pour le polling / SSE
+MAX_RESULTS_PER_GAME = 50
+
+AnalysisJob = Callable[[], Dict[str, Any]]
+
+
+class MoveAnalysisQueue:
+    """
+        File des analyses de coups exécutées en arrière-plan.
+
+        En mode asynchrone, `/submit-move` répond immédiatement avec la partie déterministe
+        du résultat (validité, coup correct, réponse de l'adversaire, nouvelle FEN) ; le calcul
+        des points, `move_evaluation` et `best_moves` est confié à cette file.
+
+        - Les tâches d'une même partie s'exécutent dans l'ordre de soumission : l'analyse d'un
+          coup utilise l'analyse de la position produite par la tâche précédente.
+        - Chaque résultat reçoit un numéro de séquence (`seq`) croissant par partie ; il est
+          ensuite récupéré par `results()` (polling) ou `wait_for_results()` (SSE).
+    """
+
+    def __init__(self, max_workers: int = 2, max_results: int = MAX_RESULTS_PER_GAME) -> None:
+        self.max_results: int = max_results
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="move-analysis")
+        self._condition = threading.Condition()
+        self._tails: Dict[str, Future] = {}
+        self._sequences: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+        self._results: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _publish(self, game_id: str, seq: int, result: Dict[str, Any]) -> None:
+        with self._condition:
+            results = self._results.setdefault(game_id, [])
+            results.append(dict(result, seq=seq))
+            del results[:-self.max_results]
+            self._pending[game_id] -= 1
+            self._condition.notify_all()
+
+    def submit(self, game_id: str, job: AnalysisJob) -> int:
+        """
+            Planifie l'analyse d'un coup et retourne son numéro de séquence.
+
+            La tâche attend la fin de la tâche précédente de la même partie avant de s'exécuter.
+            Une erreur du moteur est publiée comme résultat (`error`) plutôt que perdue.
+        """
+        with self._condition:
+            seq = self._sequences.get(game_id, 0) + 1
+            self._sequences[game_id] = seq
+            self._pending[game_id] = self._pending.get(game_id, 0) + 1
+            previous = self._tails.get(game_id)
+
+            def run() -> None:
+                if previous is not None:
+                    previous.result()
+                try:
+                    # Les recherches de la tâche sont comptées pour la partie (équité entre sessions)
+                    with analysis_context(session=game_id):
+                        result = job()
+                except Exception as e:
+                    print(f"Erreur lors de l'analyse du coup : {e}")
+                    result = {'error': "Analyse indisponible"}
+                self._publish(game_id, seq, result)
+
+            # Le pool traite les tâches dans l'ordre : la précédente est déjà en cours ou terminée
+            self._tails[game_id] = self._executor.submit(run)
+        return seq
+
+    def after(self, game_id: str, callback: Callable[[], None]) -> None:
+        """Exécute `callback` après les tâches déjà planifiées pour la partie (sans publier de résultat)."""
+        with self._condition:
+            previous = self._tails.get(game_id)
+            if previous is not None:
+
+                def run() -> None:
+                    previous.result()
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"Erreur après l'analyse du coup : {e}")
+
+                self._tails[game_id] = self._executor.submit(run)
+                return
+        callback()
+
+    def run(self, game_id: Optional[str], job: AnalysisJob) -> Dict[str, Any]:
+        """Exécute l'analyse immédiatement, après les éventuelles tâches en attente de la partie."""
+        if game_id is not None:
+            self.wait_idle(game_id)
+        return job()
+
+    def wait_idle(self, game_id: str, timeout: Optional[float] = None) -> bool:
+        """Attend que toutes les tâches de la partie soient terminées."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending.get(game_id), timeout=timeout)
+
+    def pending(self, game_id: str) -> int:
+        """Nombre d'analyses encore en cours pour la partie."""
+        with self._condition:
+            return self._pending.get(game_id, 0)
+
+    def results(self, game_id: str, since: int = 0) -> List[Dict[str, Any]]:
+        """Résultats publiés pour la partie dont le numéro de séquence est supérieur à `since`."""
+        with self._condition:
+            return [result for result in self._results.get(game_id, []) if result['seq'] > since]
+
+    def wait_for_results(self, game_id: str, since: int = 0, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Attend (au plus `timeout` secondes) un résultat postérieur à `since` ; utilisé par le flux SSE."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: any(result['seq'] > since for result in self._results.get(game_id, [])),
+                timeout=timeout,
+            )
+            return [result for result in self._results.get(game_id, []) if result['seq'] > since]
+
+    def forget(self, game_id: str) -> None:
+        """Oublie les résultats d'une partie (les tâches déjà planifiées se terminent normalement)."""
+        with self._condition:
+            self._results.pop(game_id, None)
+            if not self._pending.get(game_id):
+                self._tails.pop(game_id, None)
+                self._sequences.pop(game_id, None)
+                self._pending.pop(game_id, None)
+
+
+_queue: Optional[MoveAnalysisQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_move_analysis_queue() -> MoveAnalysisQueue:
+    """
+        Retourne la file d'analyses du processus, créée au premier appel.
+
+        MOVE_ANALYSIS_WORKERS fixe le nombre de threads ; par défaut, autant que de processus
+        Stockfish dans le pool (STOCKFISH_POOL_SIZE).
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                from app.utils.engine_pool import get_pool_size
+                workers = int(os.environ.get("MOVE_ANALYSIS_WORKERS", get_pool_size()))
+                _queue = MoveAnalysisQueue(max_workers=max(1, workers))
+    return _queue
+
+
+def dispatch_move_analysis(game_id: Optional[str], job: AnalysisJob, defer: bool = False) -> Dict[str, Any]:
+    """
+        Exécute l'analyse d'un coup, immédiatement ou en arrière-plan.
+
+        ###Retourne :
+
+            dict : Le résultat de l'analyse (mode synchrone), ou `{'analysis_pending': True,
+            'analysis_seq': n}` lorsque l'analyse est différée : le résultat sera publié sous le
+            numéro `n` pour la partie `game_id`.
+    """
+    if defer and game_id is not None:
+        seq = get_move_analysis_queue().submit(game_id, job)
+        return {'analysis_pending': True, 'analysis_seq': seq}
+    if _queue is not None:
+        return _queue.run(game_id, job)
+    return job()
+
+
+def forget_move_analysis(game_id: str) -> None:
+    """Oublie les résultats d'analyse d'une partie supprimée (voir `MoveAnalysisQueue.forget`)."""
+    if _queue is not None:
+        _queue.forget(game_id)
@@ -0,0 +1,502 @@
+import os
+import sys
+import json
+import time
+import types
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol
+import chess
+from app.models.game_model import ChessGame
+from app.models.game_template import GameTemplate
+from app.models.game_modelEasy import ChessGameEasy
+from app.models.game_modelNormal import ChessGameNormal
+from app.models.game_model_30sec import ChessGame30sec
+from app.models.game_model1min import ChessGame1Min
+from app.models.game_model3min import ChessGame3Min
+from app.services.analysis_service import analysis_from_record
+from app.services.move_analysis_service import forget_move_analysis
+from app.utils.analysis_budget import AnalysisBudget
+from app.utils.compact_response import get_response_states
+from app.utils.fen_utils import discard_snapshot
+from app.utils.metrics import span
+from app.utils.pgn_utils import PGN_DIR, get_cached_pgn_game
+
+# Version du format sérialisé des sessions
+SESSION_FORMAT_VERSION = 1
+# Base SQLite par défaut du magasin de sessions (surcharge via SESSION_DB)
+DEFAULT_SESSION_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "sessions.db")
+# Durée d'inactivité avant suppression d'une partie, alignée sur le cookie `current_game_id` (secondes)
+DEFAULT_IDLE_TIMEOUT = 3600
+# Nombre maximal de parties conservées ; les moins récemment jouées sont supprimées au-delà
+DEFAULT_MAX_SESSIONS = 1000
+
+
+class SessionGame(Protocol):
+    """
+        État d'une partie lu et restauré par le magasin de sessions (classes de `GAME_MODES`).
+
+        Les modes à essais (`attempts`, `last_submitted_move`) et chronométrés (`move_start_time`)
+        ont en plus des attributs propres, lus et restaurés s'ils existent.
+    """
+
+    user_side: str
+    current_move_index: int
+    score: Any
+    last_opponent_move: Optional[str]
+    template: GameTemplate
+    analysis: Any
+    best_moves: List[Dict[str, Any]]
+
+    @property
+    def board(self) -> chess.Board: ...
+
+    @property
+    def ply(self) -> int: ...
+
+    @property
+    def analysis_ready(self) -> bool: ...
+
+    @property
+    def analysis_budget(self) -> AnalysisBudget: ...
+
+    def compact(self) -> None: ...
+
+    def prefetch_analysis(self) -> None: ...
+
+
+# Classes de partie sérialisables, par identifiant de mode
+GAME_MODES: Dict[str, Callable[..., SessionGame]] = {
+    "hard": ChessGame,
+    "easy": ChessGameEasy,
+    "normal": ChessGameNormal,
+    "30sec": ChessGame30sec,
+    "1min": ChessGame1Min,
+    "3min": ChessGame3Min,
+}
+_MODE_BY_CLASS: Dict[Any, str] = {cls: mode for mode, cls in GAME_MODES.items()}
+
+
+def serialize_game(game: SessionGame, pgn_file: str, game_index: int = 0) -> Dict[str, Any]:
+    """
+        Forme compacte (JSON) d'une partie en cours.
+
+        Seul l'état variable est conservé : fichier PGN, camp, indice du coup, score, essais,
+        minuteur et analyse de la position courante. Le reste (coups, commentaires, échiquier)
+        se déduit du PGN.
+
+        ###Retourne :
+
+            dict : L'état sérialisable de la partie.
+    """
+    state = {
+        "v": SESSION_FORMAT_VERSION,
+        "m": _MODE_BY_CLASS[type(game)],
+        "pgn": pgn_file,
+        "g": game_index,
+        "side": game.user_side,
+        "i": game.current_move_index,
+        "s": game.score,
+        "o": game.last_opponent_move,
+    }
+    if hasattr(game, "attempts"):
+        state["a"] = getattr(game, "attempts")
+        state["l"] = getattr(game, "last_submitted_move")
+    if hasattr(game, "move_start_time"):
+        state["t"] = getattr(game, "move_start_time")
+    # Analyse conservée seulement si elle est prête et porte sur la position courante (pas d'analyse différée en cours)
+    if game.analysis_ready and game.analysis is not None and game.analysis.fen == game.template.fen_at(game.ply):
+        state["an"] = game.analysis.to_record()
+        state["d"] = game.analysis.depth
+    return state
+
+
+def deserialize_game(state: Dict[str, Any], game_id: str) -> SessionGame:
+    """
+        Recrée une partie à partir de `serialize_game`, sans attendre le moteur.
+
+        Le PGN n'est lu qu'une fois par processus (`get_cached_pgn_game`) et ses données sont
+        partagées (`GameTemplate`) ; l'analyse de la position est reprise de l'état.
+    """
+    cls = GAME_MODES[state["m"]]
+    pgn_game = get_cached_pgn_game(os.path.join(PGN_DIR, state["pgn"]), state.get("g", 0))
+    if pgn_game is None:
+        raise ValueError(f"Partie {state.get('g', 0)} introuvable dans {state['pgn']}")
+    game = cls(pgn_game, state["side"], game_id=game_id, analyse=False)
+
+    game.current_move_index = state["i"]
+    game.score = state["s"]
+    game.last_opponent_move = state["o"]
+    if "a" in state:
+        setattr(game, "attempts", state["a"])
+        setattr(game, "last_submitted_move", state["l"])
+    if "t" in state:
+        setattr(game, "move_start_time", state["t"])
+    # Échiquier à reconstruire à partir du curseur restauré
+    game.compact()
+    if "an" in state:
+        # L'échiquier se déduit du curseur, à partir du modèle partagé de la partie
+        game.analysis = analysis_from_record(game.board, state["an"], depth=state["d"], budget=game.analysis_budget)
+        game.best_moves = game.analysis.best_moves
+    else:
+        game.prefetch_analysis()
+    return game
+
+
+def release_session(game_id: str) -> None:
+    """Libère les ressources annexes d'une partie supprimée (résultats d'analyse, instantané FEN, états compacts)."""
+    forget_move_analysis(game_id)
+    discard_snapshot(game_id)
+    get_response_states().discard(game_id)
+
+
+# Objets partagés par tout le processus, exclus du calcul de la taille des sessions
+_SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def approximate_size(objects: Iterable[Any]) -> int:
+    """
+        Estime la mémoire (octets) occupée par des objets et tout ce qu'ils référencent.
+
+        Parcours itératif (les arbres PGN sont profonds) : chaque objet n'est compté qu'une fois,
+        même s'il est partagé entre plusieurs parties. Les classes, modules et fonctions sont ignorés,
+        de même que les noms d'attributs des objets.
+    """
+    seen = set()
+    stack = list(objects)
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        attributes = getattr(obj, "__dict__", None)
+        if attributes is not None and id(attributes) not in seen:
+            # Les noms d'attributs sont partagés par toutes les instances : seules les valeurs comptent
+            seen.add(id(attributes))
+            total += sys.getsizeof(attributes)
+            stack.extend(attributes.values())
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                stack.append(getattr(obj, slot))
+    return total
+
+
+def current_rss() -> Optional[int]:
+    """Mémoire résidente actuelle du processus (octets), None si elle n'est pas disponible."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _compact(game: Any) -> None:
+    """Réduit une partie au repos à son état minimal (voir `GameTemplateMixin.compact`)."""
+    compact = getattr(game, "compact", None)
+    if compact is not None:
+        compact()
+
+
+class MemorySessionStore:
+    """
+        Sessions gardées en mémoire du processus (comportement historique).
+
+        Les parties ne survivent pas à un redémarrage et ne sont pas partagées entre
+        les workers gunicorn : à réserver au développement ou à un worker unique.
+
+        L'empreinte mémoire est bornée : une partie sans activité (création ou coup soumis)
+        depuis `idle_timeout` secondes est supprimée, et au-delà de `max_sessions` parties,
+        les moins récemment jouées le sont aussi (LRU).
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> None:
+        self.max_sessions: int = max_sessions
+        self.idle_timeout: float = idle_timeout
+        self._lock = threading.Lock()
+        # game_id -> (dernière activité, partie), de la moins récente à la plus récente
+        self._games: "OrderedDict[str, Any]" = OrderedDict()
+        # Parties propres au processus : les analyses différées peuvent y être enregistrées
+        self.shared: bool = False
+        self.evicted: Dict[str, int] = {"idle": 0, "lru": 0}
+
+    def _evict(self, now: float) -> List[str]:
+        """Retire les parties inactives puis les plus anciennes au-delà du plafond (verrou tenu)."""
+        removed = []
+        while self._games:
+            game_id, (last_active, _) = next(iter(self._games.items()))
+            if now - last_active < self.idle_timeout:
+                break
+            del self._games[game_id]
+            self.evicted["idle"] += 1
+            removed.append(game_id)
+        while len(self._games) > self.max_sessions:
+            game_id, _ = self._games.popitem(last=False)
+            self.evicted["lru"] += 1
+            removed.append(game_id)
+        return removed
+
+    def sweep(self) -> int:
+        """Supprime les parties inactives ; retourne le nombre de parties supprimées."""
+        with self._lock:
+            removed = self._evict(time.time())
+        for game_id in removed:
+            release_session(game_id)
+        return len(removed)
+
+    def add(self, game_id: str, game: Any, pgn_file: str, game_index: int = 0) -> None:
+        """Enregistre une nouvelle partie."""
+        _compact(game)
+        with self._lock:
+            self._games[game_id] = (time.time(), game)
+            removed = self._evict(time.time())
+        for evicted_id in removed:
+            release_session(evicted_id)
+
+    def get(self, game_id: str) -> Optional[Any]:
+        """Retourne la partie, ou None si elle n'existe pas (ou a expiré)."""
+        with self._lock:
+            entry = self._games.get(game_id)
+            if entry is None:
+                return None
+            if time.time() - entry[0] < self.idle_timeout:
+                return entry[1]
+            del self._games[game_id]
+            self.evicted["idle"] += 1
+        release_session(game_id)
+        return None
+
+    def save(self, game_id: str, game: Any) -> None:
+        """Enregistre l'activité de la partie après un coup (la partie elle-même est déjà en mémoire)."""
+        _compact(game)
+        with self._lock:
+            if game_id in self._games:
+                self._games[game_id] = (time.time(), game)
+                self._games.move_to_end(game_id)
+
+    def delete(self, game_id: str) -> None:
+        """Supprime la partie."""
+        with self._lock:
+            self._games.pop(game_id, None)
+        release_session(game_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs et mémoire estimée des parties en cours (voir `approximate_size`)."""
+        with self._lock:
+            games = [game for _, game in self._games.values()]
+            evicted = dict(self.evicted)
+        return {
+            "backend": "memory",
+            "sessions": len(games),
+            "max_sessions": self.max_sessions,
+            "idle_timeout": self.idle_timeout,
+            "evicted": evicted,
+            "session_bytes": approximate_size(games),
+        }
+
+    def __contains__(self, game_id: object) -> bool:
+        if not isinstance(game_id, str):
+            return False
+        with self._lock:
+            entry = self._games.get(game_id)
+            return entry is not None and time.time() - entry[0] < self.idle_timeout
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._games)
+
+
+class SQLiteSessionStore:
+    """
+        Sessions sérialisées dans une base SQLite partagée par les workers d'une machine.
+
+        Chaque partie est stockée sous forme compacte (`serialize_game`) avec un numéro de
+        version incrémenté à chaque sauvegarde. Un worker garde les parties qu'il a déjà
+        reconstruites et ne les recrée que si un autre worker les a modifiées entre-temps.
+
+        Comme pour `MemorySessionStore`, les parties inactives depuis `idle_timeout` secondes
+        et les moins récemment jouées au-delà de `max_sessions` sont supprimées ; le cache
+        local de chaque worker est lui aussi limité à `max_sessions` parties.
+    """
+
+    def __init__(self, db_path: str, max_sessions: int = DEFAULT_MAX_SESSIONS,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> None:
+        self.db_path: str = db_path
+        self.max_sessions: int = max_sessions
+        self.idle_timeout: float = idle_timeout
+        # Parties partagées entre workers : une analyse différée (résultats et `after()` en mémoire
+        # du worker) serait perdue ou écrasée par un coup traité par un autre worker
+        self.shared: bool = True
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " game_id TEXT PRIMARY KEY, pgn TEXT NOT NULL, state TEXT NOT NULL,"
+            " version INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        self._db.commit()
+        # Parties reconstruites par ce worker : game_id -> (version, partie), LRU
+        self._local: "OrderedDict[str, Any]" = OrderedDict()
+        self.evicted: Dict[str, int] = {"idle": 0, "lru": 0}
+
+    def _remember(self, game_id: str, version: int, game: Any) -> None:
+        """Garde la partie reconstruite dans le cache local borné (verrou tenu)."""
+        self._local[game_id] = (version, game)
+        self._local.move_to_end(game_id)
+        while len(self._local) > self.max_sessions:
+            self._local.popitem(last=False)
+
+    def _evict(self, now: float) -> List[str]:
+        """Supprime de la base les parties inactives puis les plus anciennes au-delà du plafond (verrou tenu)."""
+        idle = [row[0] for row in self._db.execute(
+            "SELECT game_id FROM sessions WHERE updated < ?", (now - self.idle_timeout,))]
+        lru = [row[0] for row in self._db.execute(
+            "SELECT game_id FROM sessions WHERE updated >= ? ORDER BY updated DESC LIMIT -1 OFFSET ?",
+            (now - self.idle_timeout, self.max_sessions))]
+        removed = idle + lru
+        if removed:
+            self._db.executemany("DELETE FROM sessions WHERE game_id = ?", [(game_id,) for game_id in removed])
+            self._db.commit()
+            for game_id in removed:
+                self._local.pop(game_id, None)
+            self.evicted["idle"] += len(idle)
+            self.evicted["lru"] += len(lru)
+        return removed
+
+    def sweep(self) -> int:
+        """Supprime les parties inactives ; retourne le nombre de parties supprimées."""
+        with self._lock:
+            removed = self._evict(time.time())
+        for game_id in removed:
+            release_session(game_id)
+        return len(removed)
+
+    def add(self, game_id: str, game: Any, pgn_file: str, game_index: int = 0) -> None:
+        """Enregistre une nouvelle partie."""
+        with span("json_serialize"):
+            state = json.dumps(serialize_game(game, pgn_file, game_index), separators=(",", ":"))
+        _compact(game)
+        with self._lock, span("session_io", op="insert", bytes=len(state)):
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (game_id, pgn, state, version, updated) VALUES (?, ?, ?, 1, ?)",
+                (game_id, pgn_file, state, time.time()),
+            )
+            self._db.commit()
+            self._remember(game_id, 1, game)
+            removed = self._evict(time.time())
+        for evicted_id in removed:
+            release_session(evicted_id)
+
+    def get(self, game_id: str) -> Optional[Any]:
+        """Retourne la partie, reconstruite depuis la base si ce worker n'en a pas la dernière version."""
+        with self._lock:
+            with span("session_io", op="select"):
+                row = self._db.execute(
+                    "SELECT state, version, updated FROM sessions WHERE game_id = ?", (game_id,)).fetchone()
+            if row is None:
+                self._local.pop(game_id, None)
+                return None
+            if time.time() - row[2] >= self.idle_timeout:
+                self._db.execute("DELETE FROM sessions WHERE game_id = ?", (game_id,))
+                self._db.commit()
+                self._local.pop(game_id, None)
+                self.evicted["idle"] += 1
+                expired = True
+            else:
+                expired = False
+                local = self._local.get(game_id)
+                if local is not None and local[0] == row[1]:
+                    self._local.move_to_end(game_id)
+                    return local[1]
+        if expired:
+            release_session(game_id)
+            return None
+        with span("session_restore", bytes=len(row[0])):
+            game = deserialize_game(json.loads(row[0]), game_id)
+        _compact(game)
+        with self._lock:
+            self._remember(game_id, row[1], game)
+        return game
+
+    def save(self, game_id: str, game: Any) -> None:
+        """Enregistre l'état de la partie après un coup."""
+        with self._lock, span("session_io", op="update"):
+            row = self._db.execute("SELECT pgn, state FROM sessions WHERE game_id = ?", (game_id,)).fetchone()
+            if row is None:
+                return
+            with span("json_serialize"):
+                game_index = json.loads(row[1]).get("g", 0)
+                state = json.dumps(serialize_game(game, row[0], game_index), separators=(",", ":"))
+            self._db.execute(
+                "UPDATE sessions SET state = ?, version = version + 1, updated = ? WHERE game_id = ?",
+                (state, time.time(), game_id),
+            )
+            self._db.commit()
+            version = self._db.execute("SELECT version FROM sessions WHERE game_id = ?", (game_id,)).fetchone()[0]
+            _compact(game)
+            self._remember(game_id, version, game)
+
+    def delete(self, game_id: str) -> None:
+        """Supprime la partie."""
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE game_id = ?", (game_id,))
+            self._db.commit()
+            self._local.pop(game_id, None)
+        release_session(game_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs, taille de la base et mémoire estimée des parties reconstruites par ce worker."""
+        with self._lock:
+            sessions = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            page_count = self._db.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._db.execute("PRAGMA page_size").fetchone()[0]
+            games = [game for _, game in self._local.values()]
+            evicted = dict(self.evicted)
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "cached_sessions": len(games),
+            "max_sessions": self.max_sessions,
+            "idle_timeout": self.idle_timeout,
+            "evicted": evicted,
+            "session_bytes": approximate_size(games),
+            "db_bytes": page_count * page_size,
+        }
+
+    def __contains__(self, game_id: object) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT updated FROM sessions WHERE game_id = ?", (game_id,)).fetchone()
+            return row is not None and time.time() - row[0] < self.idle_timeout
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store() -> Any:
+    """
+        Crée le magasin de sessions choisi par variables d'environnement :
+
+        - SESSION_STORE : `memory` (défaut) ou `sqlite` ;
+        - SESSION_DB : chemin de la base SQLite (défaut : `sessions.db` à la racine du projet) ;
+        - SESSION_IDLE_TIMEOUT : inactivité avant suppression d'une partie (secondes, 3600 par défaut) ;
+        - SESSION_MAX : nombre maximal de parties conservées (1000 par défaut).
+    """
+    backend = os.environ.get("SESSION_STORE", "memory").lower()
+    max_sessions = max(1, int(os.environ.get("SESSION_MAX", DEFAULT_MAX_SESSIONS)))
+    idle_timeout = float(os.environ.get("SESSION_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT))
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.environ.get("SESSION_DB", DEFAULT_SESSION_DB),
+                                  max_sessions=max_sessions, idle_timeout=idle_timeout)
+    if backend != "memory":
+        raise ValueError(f"SESSION_STORE inconnu : {backend}")
+    return MemorySessionStore(max_sessions=max_sessions, idle_timeout=idle_timeout)
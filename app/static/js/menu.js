@@ -104,6 +104,18 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   }
   
+  // Rang de la partie choisie dans son fichier PGN (un fichier peut contenir plusieurs parties)
+  const gameFileSelect = document.getElementById('game_file');
+  const gameIndexInput = document.getElementById('game_index');
+  if (gameFileSelect && gameIndexInput) {
+    const syncGameIndex = function() {
+      const option = gameFileSelect.options[gameFileSelect.selectedIndex];
+      gameIndexInput.value = option ? option.dataset.index : 0;
+    };
+    gameFileSelect.addEventListener('change', syncGameIndex);
+    syncGameIndex();
+  }
+  
   // Vérifier les paramètres d'URL pour définir les modes actifs
   const urlParams = new URLSearchParams(window.location.search);
   const modeParam = urlParams.get('mode');
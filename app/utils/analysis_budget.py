@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from typing import Any, Dict, Optional, Tuple
+import chess.engine
+
+# Profondeur de recherche maximale utilisée pour toutes les analyses
+ANALYSIS_DEPTH = 15
+# Temps de recherche minimal accordé au moteur lorsque l'échéance est (presque) atteinte (secondes)
+MIN_SEARCH_TIME = 0.05
+
+
+class AnalysisBudget:
+    """
+        Budget de latence d'une analyse Stockfish.
+
+        La recherche s'arrête à la première limite atteinte :
+
+        - `depth` : profondeur maximale (ANALYSIS_DEPTH) ;
+        - `movetime` : durée maximale d'une recherche (secondes) ;
+        - `nodes` : nombre maximal de nœuds explorés ;
+        - `deadline` : durée totale accordée à une analyse complète (recherche multi-PV puis
+          recherche restreinte des coups manquants, attente d'un moteur libre comprise).
+
+        Le moteur approfondit sa recherche itérativement : à l'expiration du budget, les
+        lignes de la dernière profondeur entièrement calculée sont retenues
+        (`search_iteratively`). `min_depth` est la profondeur en dessous de laquelle une
+        analyse en cache ou dans l'index n'est pas réutilisée pour ce budget.
+
+        Sans `movetime`, `nodes` ni `deadline`, la recherche se fait à profondeur fixe.
+    """
+
+    def __init__(self, depth: int = ANALYSIS_DEPTH, movetime: Optional[float] = None,
+                 nodes: Optional[int] = None, deadline: Optional[float] = None,
+                 min_depth: Optional[int] = None) -> None:
+        self.depth: int = depth
+        self.movetime: Optional[float] = movetime
+        self.nodes: Optional[int] = nodes
+        self.deadline: Optional[float] = deadline
+        self.min_depth: int = depth if min_depth is None else min(min_depth, depth)
+
+    @property
+    def is_bounded(self) -> bool:
+        """Indique si la recherche est limitée autrement que par la profondeur."""
+        return self.movetime is not None or self.nodes is not None or self.deadline is not None
+
+    @property
+    def limits(self) -> Tuple[int, Optional[float], Optional[int], Optional[float]]:
+        """Limites de la recherche (profondeur, durée, nœuds, échéance) : deux budgets égaux donnent la même recherche."""
+        return (self.depth, self.movetime, self.nodes, self.deadline)
+
+    def start(self) -> Optional[float]:
+        """Retourne l'échéance (horloge monotone) d'une analyse commençant maintenant, ou None."""
+        return time.monotonic() + self.deadline if self.deadline is not None else None
+
+    def limit(self, deadline_at: Optional[float] = None) -> chess.engine.Limit:
+        """
+            Limite python-chess d'une recherche.
+
+            ###Paramètres :
+
+                deadline_at (float) : Échéance de l'analyse (`start`) ; le temps restant
+                plafonne la durée de la recherche.
+        """
+        movetime = self.movetime
+        if deadline_at is not None:
+            remaining = max(MIN_SEARCH_TIME, deadline_at - time.monotonic())
+            movetime = remaining if movetime is None else min(movetime, remaining)
+        return chess.engine.Limit(depth=self.depth, time=movetime, nodes=self.nodes)
+
+    @classmethod
+    def parse(cls, spec: str, base: Optional["AnalysisBudget"] = None) -> "AnalysisBudget":
+        """
+            Lit un budget au format `movetime=0.3,nodes=200000,deadline=1,depth=15,min_depth=8`.
+
+            Les champs absents sont repris de `base`.
+        """
+        base = base or cls()
+        fields: Dict[str, Any] = {"depth": base.depth, "movetime": base.movetime, "nodes": base.nodes,
+                  "deadline": base.deadline, "min_depth": base.min_depth}
+        for item in spec.split(","):
+            if not item.strip():
+                continue
+            name, _, value = item.partition("=")
+            name = name.strip()
+            if name not in fields:
+                raise ValueError(f"Limite d'analyse inconnue : {name}")
+            value = value.strip()
+            if value in ("", "none"):
+                fields[name] = None
+            elif name in ("movetime", "deadline"):
+                fields[name] = float(value)
+            else:
+                fields[name] = int(value)
+        return cls(depth=fields["depth"] or ANALYSIS_DEPTH, movetime=fields["movetime"], nodes=fields["nodes"],
+                   deadline=fields["deadline"], min_depth=fields["min_depth"])
+
+    def replace(self, **fields: Any) -> "AnalysisBudget":
+        """Copie du budget dont les champs donnés sont remplacés (ex. `replace(depth=8)`)."""
+        values: Dict[str, Any] = {"depth": self.depth, "movetime": self.movetime, "nodes": self.nodes,
+                  "deadline": self.deadline, "min_depth": self.min_depth}
+        values.update(fields)
+        return AnalysisBudget(**values)
+
+    def __repr__(self) -> str:
+        return (f"AnalysisBudget(depth={self.depth}, movetime={self.movetime}, nodes={self.nodes}, "
+                f"deadline={self.deadline}, min_depth={self.min_depth})")
+
+
+# Budgets par mode de jeu (identifiants de `app.services.session_store.GAME_MODES`).
+# Les modes chronométrés bornent la recherche par une échéance pour ne pas consommer
+# la pendule du joueur ; les modes à vies privilégient la précision.
+ANALYSIS_BUDGETS: Dict[str, AnalysisBudget] = {
+    "hard": AnalysisBudget(movetime=1.0, min_depth=12),
+    "normal": AnalysisBudget(movetime=0.8, min_depth=12),
+    "easy": AnalysisBudget(movetime=0.5, min_depth=10),
+    "3min": AnalysisBudget(movetime=0.6, deadline=1.5, min_depth=10),
+    "1min": AnalysisBudget(movetime=0.3, deadline=0.8, min_depth=8),
+    "30sec": AnalysisBudget(movetime=0.15, deadline=0.4, min_depth=6),
+}
+
+_budgets: Dict[str, AnalysisBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def get_analysis_budget(mode: Optional[str] = None) -> AnalysisBudget:
+    """
+        Retourne le budget d'analyse d'un mode de jeu.
+
+        Un budget peut être redéfini par la variable d'environnement `ANALYSIS_BUDGET_<MODE>`
+        (ex. `ANALYSIS_BUDGET_30SEC="movetime=0.1,deadline=0.3"`). Sans mode (ou pour un mode
+        inconnu), la recherche se fait à profondeur fixe (ANALYSIS_DEPTH).
+    """
+    if mode is None or mode not in ANALYSIS_BUDGETS:
+        return AnalysisBudget()
+    budget = _budgets.get(mode)
+    if budget is None:
+        with _budgets_lock:
+            budget = ANALYSIS_BUDGETS[mode]
+            spec = os.environ.get(f"ANALYSIS_BUDGET_{mode.upper()}")
+            if spec:
+                budget = AnalysisBudget.parse(spec, base=budget)
+            _budgets[mode] = budget
+    return budget
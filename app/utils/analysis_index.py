@@ -0,0 +1,125 @@
+import os
+import json
+import threading
+import chess
+import chess.polyglot
+from typing import Any, Dict, List, Optional
+
+# Emplacement par défaut de l'index (surcharge via ANALYSIS_INDEX_PATH)
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analysis_index.json")
+INDEX_VERSION = 1
+
+
+def get_index_path() -> str:
+    """Retourne le chemin du fichier d'index d'analyse."""
+    return os.environ.get("ANALYSIS_INDEX_PATH", DEFAULT_INDEX_PATH)
+
+
+def position_key(board: chess.Board) -> str:
+    """Clé d'une position dans l'index : hachage Zobrist (Polyglot) en hexadécimal."""
+    return format(chess.polyglot.zobrist_hash(board), "016x")
+
+
+def encode_lines(lines: List[Dict[str, Any]]) -> List[List[Any]]:
+    """Forme compacte d'une liste de coups analysés : [uci, type, valeur]."""
+    return [[line["uci"], line["evaluation"]["type"], line["evaluation"]["value"]] for line in lines]
+
+
+def decode_lines(encoded: List[List[Any]]) -> List[Dict[str, Any]]:
+    """Inverse de `encode_lines` : retourne [{"uci", "evaluation"}, ...]."""
+    return [{"uci": uci, "evaluation": {"type": kind, "value": value}} for uci, kind, value in encoded]
+
+
+class AnalysisIndex:
+    """
+        Index des analyses précalculées des parties de `dossierPgn`.
+
+        Pour chaque position de la ligne principale (clé : hachage Zobrist), l'index conserve
+        les meilleurs coups (`lines`) et l'évaluation du coup du maître lorsqu'il n'en fait
+        pas partie (`extra`). Il est construit hors ligne par `build_analysis_index.py` et
+        entièrement chargé en mémoire : une consultation est une simple recherche dans un dict.
+
+        ###Format du fichier JSON :
+
+            {"version": 1, "depth": 15, "num_top_moves": 3,
+             "positions": {"<zobrist>": {"lines": [["e2e4", "cp", 35], ...], "extra": [...]}}}
+    """
+
+    def __init__(self, depth: int = 15, num_top_moves: int = 3,
+                 positions: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        self.depth: int = depth
+        self.num_top_moves: int = num_top_moves
+        self.positions: Dict[str, Dict[str, Any]] = positions if positions is not None else {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, board: chess.Board) -> bool:
+        return position_key(board) in self.positions
+
+    def lookup(self, board: chess.Board) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """Retourne {"lines": [...], "extra": [...]} pour la position, ou None si elle n'est pas indexée."""
+        entry = self.positions.get(position_key(board))
+        if entry is None:
+            return None
+        return {"lines": decode_lines(entry["lines"]), "extra": decode_lines(entry.get("extra", []))}
+
+    def add(self, board: chess.Board, lines: List[Dict[str, Any]], extra: List[Dict[str, Any]]) -> None:
+        """Enregistre l'analyse d'une position."""
+        entry: Dict[str, Any] = {"lines": encode_lines(lines)}
+        if extra:
+            entry["extra"] = encode_lines(extra)
+        self.positions[position_key(board)] = entry
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Écrit l'index sur disque (écriture atomique via un fichier temporaire)."""
+        path = path or get_index_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "depth": self.depth,
+                "num_top_moves": self.num_top_moves,
+                "positions": self.positions,
+            }, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "AnalysisIndex":
+        """Charge l'index depuis le disque ; retourne un index vide si le fichier est absent ou invalide."""
+        path = path or get_index_path()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                print(f"⚠️ Version d'index d'analyse non supportée : {path}")
+                return cls()
+            return cls(depth=data["depth"], num_top_moves=data["num_top_moves"], positions=data["positions"])
+        except FileNotFoundError:
+            return cls()
+        except (ValueError, KeyError) as e:
+            print(f"⚠️ Index d'analyse illisible ({path}) : {e}")
+            return cls()
+
+
+_index: Optional[AnalysisIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_analysis_index() -> AnalysisIndex:
+    """Retourne l'index d'analyse du processus, chargé au premier appel."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AnalysisIndex.load()
+                if len(_index):
+                    print(f"📚 Index d'analyse chargé : {len(_index)} positions")
+    return _index
+
+
+def reset_analysis_index() -> None:
+    """Oublie l'index chargé (il sera relu au prochain appel de `get_analysis_index`)."""
+    global _index
+    with _index_lock:
+        _index = None
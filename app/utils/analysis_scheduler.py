@@ -0,0 +1,278 @@
+import os
+import math
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Iterator, List, Optional
+from app.utils.engine_pool import get_pool_size
+from app.utils.metrics import get_metrics, span
+
+# Classes de priorité, de la plus urgente à la moins urgente
+PRIORITY_TIMED = 0  # Coup d'une partie chronométrée : la pendule du joueur tourne (échéance)
+PRIORITY_INTERACTIVE = 1  # Coup d'une partie à vies : le joueur attend, sans échéance
+PRIORITY_BACKGROUND = 2  # Analyse anticipée, annotation : peut attendre ou être abandonnée
+
+# Profondeur maximale d'une recherche dégradée (file d'attente chargée)
+DEFAULT_DEGRADED_DEPTH = 8
+# Durée estimée d'une recherche avant la première mesure (secondes)
+INITIAL_SEARCH_SECONDS = 0.5
+
+
+class AnalysisOverloaded(Exception):
+    """Levée lorsque le serveur refuse une analyse (file pleine) ; `retry_after` en secondes (réponse 503)."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: int = 1) -> None:
+        super().__init__(message)
+        self.retry_after: int = retry_after
+
+
+class AnalysisContext:
+    """Origine des analyses lancées dans le contexte courant : partie (`session`) et priorité."""
+
+    __slots__ = ("session", "background", "tag")
+
+    def __init__(self, session: Optional[str] = None, background: bool = False,
+                 tag: Optional[Hashable] = None) -> None:
+        self.session = session
+        self.background = background
+        # Identifiant des recherches d'une tâche d'arrière-plan, pour les rendre prioritaires (`promote`)
+        self.tag = tag
+
+
+_context: contextvars.ContextVar[AnalysisContext] = contextvars.ContextVar("analysis_context", default=AnalysisContext())
+
+
+@contextmanager
+def analysis_context(session: Optional[str] = None, background: bool = False,
+                     tag: Optional[Hashable] = None) -> Iterator[AnalysisContext]:
+    """Attribue les recherches lancées dans ce bloc (et ce thread) à une partie, ou à l'arrière-plan."""
+    token = _context.set(AnalysisContext(session, background, tag))
+    try:
+        yield _context.get()
+    finally:
+        _context.reset(token)
+
+
+class Slot:
+    """Droit d'utiliser un moteur ; `degraded` demande une recherche moins profonde (serveur chargé)."""
+
+    __slots__ = ("granted", "degraded", "priority", "session", "tag")
+
+    def __init__(self, priority: int, session: Optional[str], tag: Optional[Hashable]) -> None:
+        self.granted = False
+        self.degraded = False
+        self.priority = priority
+        self.session = session
+        self.tag = tag
+
+
+class AnalysisScheduler:
+    """
+        Ordonnanceur central des recherches moteur d'un processus (contrôle d'admission).
+
+        Au plus `slots` recherches s'exécutent à la fois (une par moteur) ; les autres attendent
+        dans une file bornée, servies par ordre de :
+
+        1. classe de priorité : partie chronométrée (`PRIORITY_TIMED`), puis partie à vies,
+           puis tâches d'arrière-plan (analyse anticipée, annotation) ;
+        2. échéance (la plus proche d'abord) ;
+        3. charge de la partie : une partie qui a déjà des recherches en cours ou en attente
+           passe après les autres (équité entre sessions) ;
+        4. ordre d'arrivée.
+
+        Lorsque le serveur est saturé, il se dégrade au lieu de s'effondrer :
+
+        - au-delà de `degrade_at` recherches en attente, les recherches accordées sont moins
+          profondes (`Slot.degraded`) et `saturated()` invite à se contenter d'une analyse en
+          cache ou de l'index, même moins profonde que le budget ;
+        - au-delà de `max_queue`, les tâches d'arrière-plan sont abandonnées et les nouvelles
+          requêtes refusées par `admit` (503 avec `Retry-After`), avant toute modification de
+          la partie ; une partie qui a déjà `max_per_session` recherches en cours est aussi refusée.
+    """
+
+    def __init__(self, slots: int, max_queue: Optional[int] = None, max_per_session: int = 4,
+                 degrade_at: Optional[int] = None, degraded_depth: int = DEFAULT_DEGRADED_DEPTH) -> None:
+        self.slots: int = max(1, slots)
+        self.max_queue: int = max_queue if max_queue is not None else 8 * self.slots
+        self.max_per_session: int = max_per_session
+        self.degrade_at: int = degrade_at if degrade_at is not None else 2 * self.slots
+        self.degraded_depth: int = degraded_depth
+        self._condition = threading.Condition()
+        self._waiting: List[Any] = []
+        self._sequence = itertools.count()
+        self._running: int = 0
+        self._outstanding: Dict[str, int] = {}
+        # Durée moyenne d'une recherche (moyenne mobile), pour estimer `Retry-After`
+        self.search_seconds: float = INITIAL_SEARCH_SECONDS
+        self.granted: int = 0
+        self.degraded: int = 0
+        self.rejected: Dict[str, int] = {"queue": 0, "session": 0, "background": 0}
+
+    def _retry_after(self) -> int:
+        """Délai estimé avant qu'une place se libère dans la file (verrou tenu)."""
+        return max(1, math.ceil((len(self._waiting) + 1) * self.search_seconds / self.slots))
+
+    def admit(self, session: Optional[str] = None) -> None:
+        """
+            Vérifie qu'une nouvelle requête peut être servie ; lève `AnalysisOverloaded` sinon.
+
+            À appeler avant de modifier la partie : la requête refusée pourra être rejouée.
+        """
+        with self._condition:
+            if len(self._waiting) >= self.max_queue:
+                self.rejected["queue"] += 1
+                raise AnalysisOverloaded("Serveur d'analyse saturé", self._retry_after())
+            if session is not None and self._outstanding.get(session, 0) >= self.max_per_session:
+                self.rejected["session"] += 1
+                raise AnalysisOverloaded("Trop d'analyses en cours pour cette partie", self._retry_after())
+
+    def saturated(self) -> bool:
+        """Indique si la file est assez chargée pour préférer une analyse en cache moins précise."""
+        with self._condition:
+            return len(self._waiting) >= self.degrade_at
+
+    def _priority(self, context: AnalysisContext, deadline_at: Optional[float]) -> int:
+        if context.background:
+            return PRIORITY_BACKGROUND
+        return PRIORITY_TIMED if deadline_at is not None else PRIORITY_INTERACTIVE
+
+    def _grant(self) -> None:
+        """Accorde les places libres aux recherches en tête de file (verrou tenu)."""
+        while self._running < self.slots and self._waiting:
+            slot = heapq.heappop(self._waiting)[-1]
+            slot.granted = True
+            self._running += 1
+            self.granted += 1
+        self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, deadline_at: Optional[float] = None) -> Iterator[Slot]:
+        """
+            Attend une place pour une recherche, selon la priorité du contexte (`analysis_context`)
+            et l'échéance `deadline_at` de l'analyse ; la place est rendue en fin de bloc.
+
+            Une tâche d'arrière-plan est abandonnée (`AnalysisOverloaded`) si la file est pleine.
+        """
+        context = _context.get()
+        priority = self._priority(context, deadline_at)
+        slot = Slot(priority, context.session, context.tag)
+        with self._condition:
+            queued = len(self._waiting)
+            if priority == PRIORITY_BACKGROUND and queued >= self.max_queue:
+                self.rejected["background"] += 1
+                raise AnalysisOverloaded("Analyse d'arrière-plan abandonnée : file saturée", self._retry_after())
+            load = 0
+            if slot.session is not None:
+                load = self._outstanding.get(slot.session, 0)
+                self._outstanding[slot.session] = load + 1
+            heapq.heappush(self._waiting, (priority, deadline_at if deadline_at is not None else math.inf, load,
+                                           next(self._sequence), slot))
+            self._grant()
+            with span("engine_queue", queued=queued):
+                while not slot.granted:
+                    self._condition.wait()
+            if queued >= self.degrade_at or (deadline_at is not None and time.monotonic() >= deadline_at):
+                slot.degraded = True
+                self.degraded += 1
+        started = time.monotonic()
+        try:
+            yield slot
+        finally:
+            with self._condition:
+                self._running -= 1
+                if slot.session is not None:
+                    remaining = self._outstanding.get(slot.session, 1) - 1
+                    if remaining > 0:
+                        self._outstanding[slot.session] = remaining
+                    else:
+                        self._outstanding.pop(slot.session, None)
+                self.search_seconds = 0.8 * self.search_seconds + 0.2 * (time.monotonic() - started)
+                self._grant()
+
+    def promote(self, tag: Hashable) -> int:
+        """
+            Rend prioritaires les recherches d'arrière-plan en attente portant l'étiquette `tag`
+            (un joueur attend désormais leur résultat) ; retourne le nombre de recherches promues.
+        """
+        with self._condition:
+            promoted = 0
+            for index, entry in enumerate(self._waiting):
+                slot = entry[-1]
+                if slot.tag == tag and slot.priority == PRIORITY_BACKGROUND:
+                    slot.priority = PRIORITY_INTERACTIVE
+                    self._waiting[index] = (PRIORITY_INTERACTIVE,) + entry[1:]
+                    promoted += 1
+            if promoted:
+                heapq.heapify(self._waiting)
+            return promoted
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne l'état de la file (places, recherches en cours et en attente, refus)."""
+        with self._condition:
+            return {
+                'slots': self.slots,
+                'running': self._running,
+                'waiting': len(self._waiting),
+                'granted': self.granted,
+                'degraded': self.degraded,
+                'rejected': dict(self.rejected),
+                'search_seconds': round(self.search_seconds, 4),
+            }
+
+
+_scheduler: Optional[AnalysisScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_analysis_scheduler() -> AnalysisScheduler:
+    """
+        Retourne l'ordonnanceur des recherches du processus, créé au premier appel.
+
+        Configuration par variables d'environnement :
+        - ANALYSIS_SLOTS : recherches simultanées (par défaut la taille du pool de moteurs) ;
+        - ANALYSIS_QUEUE_MAX : recherches en attente au-delà desquelles les requêtes sont refusées
+          (8 par place par défaut) ;
+        - ANALYSIS_SESSION_MAX : recherches en cours ou en attente par partie (4 par défaut) ;
+        - ANALYSIS_DEGRADE_QUEUE : recherches en attente à partir desquelles les analyses se
+          dégradent (2 par place par défaut) ;
+        - ANALYSIS_DEGRADED_DEPTH : profondeur maximale d'une recherche dégradée (8 par défaut).
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                slots = int(os.environ.get("ANALYSIS_SLOTS", get_pool_size()))
+                max_queue = os.environ.get("ANALYSIS_QUEUE_MAX")
+                degrade_at = os.environ.get("ANALYSIS_DEGRADE_QUEUE")
+                _scheduler = AnalysisScheduler(
+                    slots,
+                    max_queue=int(max_queue) if max_queue else None,
+                    max_per_session=int(os.environ.get("ANALYSIS_SESSION_MAX", 4)),
+                    degrade_at=int(degrade_at) if degrade_at else None,
+                    degraded_depth=int(os.environ.get("ANALYSIS_DEGRADED_DEPTH", DEFAULT_DEGRADED_DEPTH)),
+                )
+    return _scheduler
+
+
+def _scheduler_stat(name: str) -> Any:
+    """Compteur de l'ordonnanceur du processus pour `/metrics`, ou None s'il n'a pas encore été créé."""
+    if _scheduler is None:
+        return None
+    value = _scheduler.stats()[name]
+    if isinstance(value, dict):
+        return {(reason,): count for reason, count in value.items()}
+    return value
+
+
+get_metrics().collect("chess_analysis_queue_running", "Recherches moteur en cours.", lambda: _scheduler_stat("running"))
+get_metrics().collect("chess_analysis_queue_waiting", "Recherches moteur en attente d'une place.",
+                      lambda: _scheduler_stat("waiting"))
+get_metrics().collect("chess_analysis_degraded_total", "Recherches raccourcies parce que le serveur était chargé.",
+                      lambda: _scheduler_stat("degraded"), kind="counter")
+get_metrics().collect("chess_analysis_rejected_total", "Analyses refusées ou abandonnées, par motif.",
+                      lambda: _scheduler_stat("rejected"), kind="counter", labels=("reason",))
@@ -0,0 +1,299 @@
+import os
+import asyncio
+import threading
+import concurrent.futures
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+import chess
+import chess.engine
+from app.utils.engine_pool import ENGINE_COMMAND_TIMEOUT, engine_command, get_pool_size
+from app.utils.engine_utils import STOCKFISH_PATH, deepest_complete_iteration, expected_lines, record_iteration
+from app.utils.metrics import get_metrics
+from app.utils.shutdown import on_shutdown
+
+# Délai maximal d'attente d'un résultat par un appelant synchrone (secondes)
+DEFAULT_RESULT_TIMEOUT = 60.0
+
+# Demande d'analyse pour `AsyncEngineClient.analyse_many` : (échiquier, limite, options de `analyse`)
+AnalysisRequest = Tuple[chess.Board, chess.engine.Limit, Dict[str, Any]]
+
+
+class AsyncEnginePool:
+    """
+        Moteurs UCI persistants pilotés par le protocole asyncio de python-chess.
+
+        Toutes les méthodes s'exécutent dans une même boucle d'événements : les recherches
+        demandées sont des coroutines mises en file sur les `size` moteurs, qui calculent en
+        parallèle pendant que la boucle attend leurs réponses. Un seul thread suffit ainsi à
+        occuper tous les moteurs, quel que soit le nombre d'analyses en attente.
+
+        - Les moteurs sont lancés paresseusement, jusqu'à `size` processus.
+        - Un moteur est contrôlé (`isready`) avant d'être prêté ; un moteur qui ne répond plus, ou
+          rendu après une erreur, est fermé et sa place libérée pour un nouveau processus.
+    """
+
+    def __init__(self, engine_path: Any, size: int = 2) -> None:
+        self.engine_path = engine_path
+        self.size: int = max(1, int(size))
+        self._idle: List[Tuple[asyncio.SubprocessTransport, chess.engine.UciProtocol]] = []
+        self._available: Optional[asyncio.Condition] = None
+        self._spawned: int = 0
+        self._in_use: int = 0
+        self._waiting: int = 0
+        self._restarts: int = 0
+        self._checkouts: int = 0
+        self._closed: bool = False
+
+    def _condition(self) -> asyncio.Condition:
+        # Créée dans la boucle qui l'utilise
+        if self._available is None:
+            self._available = asyncio.Condition()
+        return self._available
+
+    async def _spawn(self) -> Tuple[asyncio.SubprocessTransport, chess.engine.UciProtocol]:
+        """Lance un nouveau processus et effectue la poignée de main UCI."""
+        return await asyncio.wait_for(chess.engine.popen_uci(engine_command(self.engine_path)), ENGINE_COMMAND_TIMEOUT)
+
+    async def _is_healthy(self, protocol: chess.engine.UciProtocol) -> bool:
+        try:
+            await asyncio.wait_for(protocol.ping(), ENGINE_COMMAND_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def _discard(self, transport: asyncio.SubprocessTransport, protocol: chess.engine.UciProtocol) -> None:
+        """Ferme un moteur sans propager d'erreur."""
+        try:
+            await asyncio.wait_for(protocol.quit(), ENGINE_COMMAND_TIMEOUT)
+        except Exception:
+            pass
+        transport.close()
+
+    async def checkout(self) -> Tuple[asyncio.SubprocessTransport, chess.engine.UciProtocol]:
+        """Emprunte un moteur : un moteur inactif, un nouveau processus si la taille le permet, sinon attend."""
+        available = self._condition()
+        while True:
+            if self._closed:
+                raise RuntimeError("Le pool de moteurs asynchrone est fermé")
+            async with available:
+                if not self._idle and self._spawned >= self.size:
+                    self._waiting += 1
+                    try:
+                        await available.wait_for(lambda: bool(self._idle) or self._spawned < self.size or self._closed)
+                    finally:
+                        self._waiting -= 1
+                    continue
+                engine = self._idle.pop() if self._idle else None
+                if engine is None:
+                    self._spawned += 1
+            if engine is None:
+                try:
+                    engine = await self._spawn()
+                except BaseException:
+                    await self._release_slot()
+                    raise
+            elif not await self._is_healthy(engine[1]):
+                print("♻️ Moteur Stockfish ne répondant plus, redémarrage")
+                await self._discard(*engine)
+                self._restarts += 1
+                await self._release_slot()
+                continue
+            self._in_use += 1
+            self._checkouts += 1
+            return engine
+
+    async def _release_slot(self) -> None:
+        available = self._condition()
+        async with available:
+            self._spawned -= 1
+            available.notify()
+
+    async def checkin(self, engine: Tuple[asyncio.SubprocessTransport, chess.engine.UciProtocol],
+                      healthy: bool = True) -> None:
+        """Rend un moteur ; un moteur rendu après une erreur (`healthy` faux) est remplacé."""
+        self._in_use -= 1
+        if healthy and not self._closed:
+            available = self._condition()
+            async with available:
+                self._idle.append(engine)
+                available.notify()
+            return
+        if not healthy:
+            self._restarts += 1
+        await self._discard(*engine)
+        await self._release_slot()
+
+    @asynccontextmanager
+    async def engine(self) -> AsyncIterator[chess.engine.UciProtocol]:
+        """Gestionnaire de contexte asynchrone : emprunte un moteur et le rend, même en cas d'erreur."""
+        engine = await self.checkout()
+        healthy = True
+        try:
+            yield engine[1]
+        except (chess.engine.EngineError, asyncio.TimeoutError, OSError):
+            healthy = False
+            raise
+        finally:
+            await self.checkin(engine, healthy=healthy)
+
+    async def analyse(self, board: chess.Board, limit: chess.engine.Limit, multipv: Optional[int] = None,
+                      root_moves: Optional[Sequence[chess.Move]] = None) -> Any:
+        """Équivalent asynchrone de `engine.analyse` sur un moteur du pool."""
+        async with self.engine() as protocol:
+            return await protocol.analyse(board, limit, multipv=multipv, root_moves=root_moves)
+
+    async def search_iteratively(self, board: chess.Board, limit: chess.engine.Limit, multipv: Optional[int] = None,
+                                 root_moves: Optional[Sequence[chess.Move]] = None) -> List[Dict[str, Any]]:
+        """Équivalent asynchrone de `search_iteratively` : lignes de la dernière profondeur complète."""
+        iterations: Dict[int, Dict[int, Any]] = {}
+        async with self.engine() as protocol:
+            with await protocol.analysis(board, limit, multipv=multipv, root_moves=root_moves) as search:
+                async for info in search:
+                    record_iteration(iterations, info)
+        return deepest_complete_iteration(iterations, expected_lines(board, multipv, root_moves))
+
+    def stats(self) -> Dict[str, int]:
+        """Retourne l'état du pool (lu sans verrou : valeurs indicatives hors de la boucle)."""
+        return {
+            'size': self.size,
+            'spawned': self._spawned,
+            'in_use': self._in_use,
+            'idle': len(self._idle),
+            'waiting': self._waiting,
+            'restarts': self._restarts,
+            'checkouts': self._checkouts,
+        }
+
+    async def close(self) -> None:
+        """Ferme les moteurs inactifs ; les moteurs empruntés seront fermés à leur retour."""
+        self._closed = True
+        engines, self._idle = self._idle, []
+        for engine in engines:
+            await self._discard(*engine)
+        self._spawned -= len(engines)
+        available = self._condition()
+        async with available:
+            available.notify_all()
+
+
+class AsyncEngineClient:
+    """
+        Client d'analyse asynchrone : un thread exécute la boucle d'événements et l'`AsyncEnginePool`.
+
+        Depuis n'importe quel thread (route Flask, worker d'analyse, processus annexe), `submit`
+        programme une coroutine et retourne un `concurrent.futures.Future` ; `analyse` attend
+        une recherche, `analyse_many` en lance plusieurs à la fois et attend qu'elles soient
+        toutes terminées, sans bloquer un thread par recherche.
+
+        Les analyses de l'application (`analyse_board` avec ENGINE_CLIENT=async) passent par
+        `analyse` : le thread de la requête attend sa recherche, comme avec le pool synchrone.
+
+        ###Utilisation :
+
+            client = get_async_engine_client()
+            infos = client.analyse_many([(board, chess.engine.Limit(depth=12), {"multipv": 3}) for board in boards])
+    """
+
+    def __init__(self, engine_path: Any, size: int = 2) -> None:
+        self.pool = AsyncEnginePool(engine_path, size=size)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-engines", daemon=True)
+        self._thread.start()
+
+    def submit(self, coroutine: Any) -> "concurrent.futures.Future[Any]":
+        """Programme une coroutine dans la boucle du client (thread-safe)."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def analyse(self, board: chess.Board, limit: chess.engine.Limit, multipv: Optional[int] = None,
+                root_moves: Optional[Sequence[chess.Move]] = None, iterative: bool = False,
+                timeout: Optional[float] = DEFAULT_RESULT_TIMEOUT) -> Any:
+        """
+            Analyse une position et attend le résultat.
+
+            ###Paramètres :
+
+                iterative (bool) : Retenir la dernière profondeur complète (`search_iteratively`),
+                    pour une recherche bornée par le temps ou les nœuds.
+        """
+        return self.submit(self._analyse(board.copy(), limit, multipv, root_moves, iterative)).result(timeout)
+
+    def analyse_many(self, requests: Iterable[AnalysisRequest],
+                     timeout: Optional[float] = DEFAULT_RESULT_TIMEOUT) -> List[Any]:
+        """
+            Lance toutes les analyses à la fois et attend qu'elles soient terminées.
+
+            ###Retourne :
+
+                list : Un résultat par demande, dans l'ordre des demandes (l'exception levée
+                pour une demande en échec, sans interrompre les autres).
+        """
+        coroutines = [self._analyse(board.copy(), limit, options.get("multipv"), options.get("root_moves"),
+                                    options.get("iterative", False))
+                      for board, limit, options in requests]
+
+        async def gather() -> List[Any]:
+            return await asyncio.gather(*coroutines, return_exceptions=True)
+
+        return self.submit(gather()).result(timeout)
+
+    async def _analyse(self, board: chess.Board, limit: chess.engine.Limit, multipv: Optional[int],
+                       root_moves: Optional[Sequence[chess.Move]], iterative: bool) -> Any:
+        if not iterative:
+            return await self.pool.analyse(board, limit, multipv=multipv, root_moves=root_moves)
+        infos = await self.pool.search_iteratively(board, limit, multipv=multipv, root_moves=root_moves)
+        if multipv is None:
+            return infos[0] if infos else {}
+        return infos
+
+    def stats(self) -> Dict[str, int]:
+        """Retourne l'état du pool de moteurs du client."""
+        return self.pool.stats()
+
+    def close(self, timeout: float = ENGINE_COMMAND_TIMEOUT) -> None:
+        """Ferme les moteurs puis arrête la boucle d'événements."""
+        if not self._loop.is_running():
+            return
+        try:
+            self.submit(self.pool.close()).result(timeout)
+        except Exception as e:
+            print(f"Erreur lors de la fermeture des moteurs : {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+
+_client: Optional[AsyncEngineClient] = None
+_client_lock = threading.Lock()
+
+
+def is_async_engine_enabled() -> bool:
+    """Indique si les analyses passent par le client asynchrone (ENGINE_CLIENT=async)."""
+    return os.environ.get("ENGINE_CLIENT", "sync").lower() == "async"
+
+
+def get_async_engine_client() -> AsyncEngineClient:
+    """
+        Retourne le client d'analyse asynchrone du processus, créé au premier appel.
+
+        Comme pour `get_engine_pool`, la création est paresseuse pour que chaque worker gunicorn
+        lance ses propres moteurs après le fork. La taille du pool est lue dans
+        ASYNC_ENGINE_POOL_SIZE (par défaut STOCKFISH_POOL_SIZE).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                size = int(os.environ.get("ASYNC_ENGINE_POOL_SIZE", get_pool_size()))
+                _client = AsyncEngineClient(STOCKFISH_PATH, size=size)
+                on_shutdown(_client.close)
+    return _client
+
+
+def _client_stat(name: str) -> Optional[int]:
+    """Compteur du client du processus pour `/metrics`, ou None s'il n'a pas encore été créé."""
+    return None if _client is None else _client.stats()[name]
+
+
+get_metrics().collect("chess_async_engine_in_use", "Moteurs du client asynchrone en cours de recherche.",
+                      lambda: _client_stat("in_use"))
+get_metrics().collect("chess_async_engine_waiting", "Analyses en file d'attente d'un moteur du client asynchrone.",
+                      lambda: _client_stat("waiting"))
@@ -0,0 +1,245 @@
+import gzip
+import json
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.utils.metrics import get_metrics
+from app.utils.move_scores import encode_score
+
+# Versions du format compact comprises par le serveur (paramètre `v` de la requête)
+COMPACT_FORMAT_VERSION = 1
+SUPPORTED_VERSIONS = (1,)
+# États envoyés gardés par partie (le client peut accuser réception d'une réponse un peu ancienne)
+DEFAULT_STATES_PER_GAME = 4
+# Parties dont les derniers états sont gardés en mémoire (LRU)
+DEFAULT_MAX_GAMES = 1000
+# En dessous de cette taille, la compression gzip coûte plus qu'elle ne rapporte
+GZIP_MIN_BYTES = 256
+
+# Clés courtes du format v1 (deux lettres au moins : les clés d'une lettre sont réservées à l'enveloppe)
+FIELD_KEYS: Dict[str, str] = {
+    "is_correct": "ok",
+    "correct_move": "cm",
+    "opponent_move": "om",
+    "board_fen": "fen",
+    "score": "sc",
+    "max_score": "ms",
+    "score_percentage": "sp",
+    "game_over": "go",
+    "is_player_turn": "pt",
+    "last_opponent_move": "lo",
+    "hint": "hi",
+    "is_pawn_move": "pm",
+    "is_valid_format": "vf",
+    "comment": "co",
+    "opponent_comment": "oc",
+    "submitted_move": "sm",
+    "is_last_chance": "lc",
+    "move_quality": "mq",
+    "points_earned": "pe",
+    "is_checkmate": "cx",
+    "checkmate_bonus": "cb",
+    "move_evaluation": "me",
+    "best_moves": "bm",
+    "previous_position_best_moves": "pb",
+    "analysis_depth": "ad",
+    "analysis_pending": "ap",
+    "analysis_seq": "aq",
+    "remaining_attempts": "ra",
+    "attempts_used": "au",
+    "time_left": "tl",
+    "error": "er",
+}
+MOVE_LIST_FIELDS = ("best_moves", "previous_position_best_moves")
+
+# Indicateurs d'un coup ou d'une évaluation (champ `flags`)
+FLAG_BOOK = 1
+FLAG_TABLEBASE = 2
+
+# Taille des réponses de `/submit-move` par format (`json`, `compact`), après compression éventuelle (`/metrics`)
+RESPONSE_BYTES = get_metrics().histogram("chess_response_bytes", "Taille des réponses de /submit-move, par format.",
+                                         buckets=(128, 256, 512, 1024, 2048, 4096, 8192), labels=("format",))
+
+
+def _flags(entry: Dict[str, Any]) -> int:
+    return (FLAG_BOOK if entry.get("book") else 0) | (FLAG_TABLEBASE if entry.get("tablebase") else 0)
+
+
+def encode_move(move: Dict[str, Any], white_to_move: bool) -> List[Any]:
+    """
+        Coup proposé au format compact : `[uci, san, score, force]`, suivi des indicateurs
+        s'il y en a (`FLAG_BOOK`). Le score est l'entier de `encode_score` (point de vue des
+        blancs, mats codés `±(MATE_SCORE - n)`) : le client recalcule le score affiché.
+    """
+    strength = move.get("relative_strength")
+    encoded = [move["uci"], move.get("san"), encode_score(move["evaluation"], white_to_move),
+               None if strength is None else round(strength)]
+    flags = _flags(move)
+    if flags:
+        encoded.append(flags)
+    return encoded
+
+
+def encode_evaluation(evaluation: Dict[str, Any], white_to_move: bool) -> List[int]:
+    """
+        Évaluation du coup joué (`move_evaluation`) au format compact : `[score]`, ou
+        `[score, indicateurs]`, complété de `wdl` et `dtz` pour un coup des tables de finales.
+    """
+    encoded = [encode_score(evaluation, white_to_move)]
+    flags = _flags(evaluation)
+    if flags:
+        encoded.append(flags)
+        if "wdl" in evaluation:
+            encoded += [evaluation["wdl"], evaluation["dtz"]]
+    return encoded
+
+
+def compact_result(result: Dict[str, Any], white_to_move: bool) -> Dict[str, Any]:
+    """
+        Convertit le résultat de `submit_move` au format compact v1 : clés courtes (`FIELD_KEYS`,
+        les clés inconnues sont gardées telles quelles), coups et évaluations en entiers.
+
+        `white_to_move` est le camp du joueur : toutes les positions évaluées dans la réponse sont
+        des positions où il est au trait (un mat en 0 est à son avantage).
+    """
+    state = {}
+    for key, value in result.items():
+        if key in MOVE_LIST_FIELDS and value is not None:
+            value = [encode_move(move, white_to_move) for move in value]
+        elif key == "move_evaluation" and value is not None:
+            value = encode_evaluation(value, white_to_move)
+        state[FIELD_KEYS.get(key, key)] = value
+    return state
+
+
+def delta(state: Dict[str, Any], base: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str], Dict[str, str]]:
+    """
+        Différence entre l'état à envoyer et l'état connu du client.
+
+        ###Retourne :
+
+            tuple : (champs modifiés ou nouveaux, champs supprimés, références) ; une référence
+            `{"pb": "bm"}` indique que la valeur est celle du champ `bm` de l'état connu (les
+            meilleurs coups de la position précédente ont déjà été envoyés comme `best_moves`).
+    """
+    changed, references = {}, {}
+    base_moves = base.get("bm")
+    for key, value in state.items():
+        if key in base and base[key] == value:
+            continue
+        if key == "pb" and base_moves is not None and value == base_moves:
+            references[key] = "bm"
+            continue
+        changed[key] = value
+    removed = [key for key in base if key not in state]
+    return changed, removed, references
+
+
+class ResponseStates:
+    """
+        Derniers états envoyés à chaque partie au format compact, pour répondre par différence.
+
+        Chaque état reçoit un identifiant (`i` dans la réponse) dont le client accuse réception
+        à la requête suivante (paramètre `ack`). Les identifiants sont préfixés par un jeton
+        propre au processus : un worker qui ne connaît pas l'état accusé (redémarrage, autre
+        worker, partie sortie de la LRU) répond avec l'état complet.
+    """
+
+    def __init__(self, max_games: int = DEFAULT_MAX_GAMES, per_game: int = DEFAULT_STATES_PER_GAME) -> None:
+        self.max_games: int = max(1, max_games)
+        self.per_game: int = max(1, per_game)
+        self._prefix: str = secrets.token_hex(2)
+        self._next: int = 0
+        self._games: "OrderedDict[str, OrderedDict[str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def get(self, game_id: str, state_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """État `state_id` envoyé à la partie, ou None s'il n'est plus (ou pas) connu."""
+        if not state_id:
+            return None
+        with self._lock:
+            states = self._games.get(game_id)
+            return states.get(state_id) if states is not None else None
+
+    def put(self, game_id: str, state: Dict[str, Any]) -> str:
+        """Enregistre l'état envoyé à la partie et retourne son identifiant."""
+        with self._lock:
+            self._next += 1
+            state_id = f"{self._prefix}.{self._next:x}"
+            states = self._games.setdefault(game_id, OrderedDict())
+            self._games.move_to_end(game_id)
+            states[state_id] = state
+            while len(states) > self.per_game:
+                states.popitem(last=False)
+            while len(self._games) > self.max_games:
+                self._games.popitem(last=False)
+            return state_id
+
+    def discard(self, game_id: str) -> None:
+        """Oublie les états envoyés à une partie terminée ou supprimée."""
+        with self._lock:
+            self._games.pop(game_id, None)
+
+
+def compact_response(states: ResponseStates, game_id: str, result: Dict[str, Any], white_to_move: bool,
+                     ack: Optional[str] = None) -> Dict[str, Any]:
+    """
+        Réponse compacte v1 de `/submit-move`.
+
+        ###Retourne :
+
+            dict : Enveloppe `{"v": version, "i": identifiant de l'état}` et champs courts. Si
+            l'état `ack` du client est connu, seuls les champs modifiés sont envoyés, avec
+            `b` (état de base), `x` (champs supprimés) et `r` (références, voir `delta`) ;
+            sinon l'état est complet (pas de `b`).
+    """
+    state = compact_result(result, white_to_move)
+    base = states.get(game_id, ack)
+    payload: Dict[str, Any] = {"v": COMPACT_FORMAT_VERSION, "i": states.put(game_id, state)}
+    if base is None:
+        payload.update(state)
+        return payload
+    changed, removed, references = delta(state, base)
+    payload["b"] = ack
+    payload.update(changed)
+    if removed:
+        payload["x"] = removed
+    if references:
+        payload["r"] = references
+    return payload
+
+
+def encode_body(payload: Dict[str, Any], accept_gzip: bool = False) -> Tuple[bytes, Dict[str, str]]:
+    """
+        Sérialise la réponse (JSON sans espaces) et la compresse en gzip si le client l'accepte
+        et qu'elle dépasse `GZIP_MIN_BYTES`.
+
+        ###Retourne :
+
+            tuple : (corps, en-têtes HTTP à ajouter).
+    """
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    headers = {"Vary": "Accept-Encoding"}
+    if accept_gzip and len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    RESPONSE_BYTES.observe(len(body), format="compact")
+    return body, headers
+
+
+_states: Optional[ResponseStates] = None
+_states_lock = threading.Lock()
+
+
+def get_response_states() -> ResponseStates:
+    """Retourne les états des réponses compactes du processus."""
+    global _states
+    if _states is None:
+        with _states_lock:
+            if _states is None:
+                _states = ResponseStates()
+    return _states
@@ -0,0 +1,248 @@
+import os
+import sys
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import chess.engine
+from app.utils.metrics import get_metrics, span
+from app.utils.shutdown import on_shutdown
+
+# Nombre de processus Stockfish gardés ouverts par processus Python (surcharge via STOCKFISH_POOL_SIZE)
+DEFAULT_POOL_SIZE = 2
+# Délai maximal d'attente d'un moteur libre avant d'abandonner (secondes)
+DEFAULT_CHECKOUT_TIMEOUT = 30.0
+# Délai maximal accordé à un moteur pour répondre à une commande UCI (`isready` du contrôle de santé)
+ENGINE_COMMAND_TIMEOUT = 10.0
+
+
+def engine_command(engine_path: Any) -> Any:
+    """
+        Commande de lancement d'un moteur UCI.
+
+        Un script Python (ex. le moteur factice `tests/fake_uci_engine.py`) est lancé avec
+        l'interpréteur courant : il n'a besoin ni d'être exécutable ni d'une ligne shebang.
+    """
+    if isinstance(engine_path, str) and engine_path.endswith(".py"):
+        return [sys.executable, engine_path]
+    return engine_path
+
+
+class EnginePoolExhausted(Exception):
+    """Levée lorsqu'aucun moteur ne se libère dans le délai imparti."""
+
+
+class EnginePool:
+    """
+        Pool de moteurs Stockfish persistants partagé par tout le processus.
+
+        Chaque analyse emprunte un moteur déjà lancé au lieu de créer un nouveau processus
+        (et de repayer la poignée de main UCI et l'allocation de la table de hachage).
+
+        - Les moteurs sont lancés paresseusement, jusqu'à `size` processus.
+        - Un moteur est contrôlé (`isready`) avant d'être prêté ; s'il ne répond plus,
+          il est fermé puis relancé automatiquement.
+        - Un moteur rendu en signalant une erreur est considéré comme planté et remplacé.
+
+        ###Utilisation :
+
+            with get_engine_pool().engine() as engine:
+                info = engine.analyse(board, chess.engine.Limit(depth=15))
+    """
+
+    def __init__(self, engine_path: Any, size: int = DEFAULT_POOL_SIZE,
+                 engine_factory: Optional[Callable[[], Any]] = None,
+                 checkout_timeout: float = DEFAULT_CHECKOUT_TIMEOUT) -> None:
+        self.engine_path = engine_path
+        self.size: int = max(1, int(size))
+        self.checkout_timeout: float = checkout_timeout
+        self._engine_factory: Callable[[], Any] = engine_factory or self._spawn_engine
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._spawned: int = 0
+        self._in_use: int = 0
+        self._restarts: int = 0
+        self._checkouts: int = 0
+        self._closed: bool = False
+
+    def _spawn_engine(self) -> chess.engine.SimpleEngine:
+        """Lance un nouveau processus Stockfish et effectue la poignée de main UCI."""
+        return chess.engine.SimpleEngine.popen_uci(engine_command(self.engine_path), timeout=ENGINE_COMMAND_TIMEOUT)
+
+    def _is_healthy(self, engine: Any) -> bool:
+        """Vérifie qu'un moteur inactif répond toujours au protocole UCI."""
+        try:
+            engine.ping()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, engine: Any) -> None:
+        """Ferme un moteur défaillant sans propager d'erreur."""
+        try:
+            engine.quit()
+        except Exception:
+            try:
+                engine.close()
+            except Exception:
+                pass
+
+    def checkout(self, timeout: Optional[float] = None) -> Any:
+        """
+            Emprunte un moteur prêt à l'emploi.
+
+            Réutilise un moteur inactif s'il y en a un, en lance un nouveau si la taille du pool
+            le permet, sinon attend qu'un moteur soit rendu. Le moteur doit être rendu avec `checkin`.
+        """
+        if self._closed:
+            raise RuntimeError("Le pool de moteurs est fermé")
+        wait = self.checkout_timeout if timeout is None else timeout
+
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                engine = None
+                with self._lock:
+                    can_spawn = self._spawned < self.size
+                    if can_spawn:
+                        self._spawned += 1
+                if can_spawn:
+                    try:
+                        engine = self._engine_factory()
+                    except Exception:
+                        with self._lock:
+                            self._spawned -= 1
+                        raise
+                else:
+                    try:
+                        engine = self._idle.get(timeout=wait)
+                    except queue.Empty:
+                        raise EnginePoolExhausted(
+                            f"Aucun moteur disponible après {wait}s (taille du pool : {self.size})"
+                        )
+
+            if not self._is_healthy(engine):
+                # Moteur planté pendant qu'il était inactif : on le remplace
+                print("♻️ Moteur Stockfish ne répondant plus, redémarrage")
+                self._discard(engine)
+                with self._lock:
+                    self._spawned -= 1
+                    self._restarts += 1
+                continue
+
+            with self._lock:
+                self._in_use += 1
+                self._checkouts += 1
+            return engine
+
+    def checkin(self, engine: Any, healthy: bool = True) -> None:
+        """
+            Rend un moteur au pool.
+
+            Si `healthy` est faux (erreur pendant l'analyse), le moteur est fermé et
+            sa place est libérée pour qu'un nouveau processus soit lancé au prochain emprunt.
+        """
+        with self._lock:
+            self._in_use -= 1
+            if not healthy or self._closed:
+                self._spawned -= 1
+                if not healthy:
+                    self._restarts += 1
+        if healthy and not self._closed:
+            self._idle.put(engine)
+        else:
+            self._discard(engine)
+
+    @contextmanager
+    def engine(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Gestionnaire de contexte : emprunte un moteur et le rend, même en cas d'erreur."""
+        with span("engine_wait"):
+            engine = self.checkout(timeout=timeout)
+        healthy = True
+        try:
+            yield engine
+        except (chess.engine.EngineError, TimeoutError, OSError):
+            healthy = False
+            raise
+        finally:
+            self.checkin(engine, healthy=healthy)
+
+    def stats(self) -> Dict[str, int]:
+        """Retourne l'état du pool (utile pour la supervision)."""
+        with self._lock:
+            return {
+                'size': self.size,
+                'spawned': self._spawned,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'restarts': self._restarts,
+                'checkouts': self._checkouts,
+            }
+
+    def close(self) -> None:
+        """Ferme tous les moteurs inactifs ; les moteurs empruntés seront fermés à leur retour."""
+        self._closed = True
+        engines: List[Any] = []
+        while True:
+            try:
+                engines.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for engine in engines:
+            self._discard(engine)
+        with self._lock:
+            self._spawned -= len(engines)
+
+
+_pool: Optional[EnginePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool_size() -> int:
+    """Lit la taille du pool depuis la variable d'environnement STOCKFISH_POOL_SIZE."""
+    try:
+        return max(1, int(os.environ.get("STOCKFISH_POOL_SIZE", DEFAULT_POOL_SIZE)))
+    except ValueError:
+        return DEFAULT_POOL_SIZE
+
+
+def get_engine_pool() -> EnginePool:
+    """
+        Retourne le pool de moteurs du processus, créé au premier appel.
+
+        La création est paresseuse pour que chaque worker gunicorn (après le fork) possède
+        ses propres processus Stockfish.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from app.utils.engine_utils import STOCKFISH_PATH
+                _pool = EnginePool(STOCKFISH_PATH, size=get_pool_size())
+                # Les threads de python-chess ne sont pas des démons : les moteurs doivent être
+                # fermés avant que l'interpréteur n'attende ces threads (atexit passe trop tard)
+                on_shutdown(_pool.close)
+    return _pool
+
+
+def _pool_stat(name: str) -> Optional[float]:
+    """Compteur du pool du processus pour `/metrics`, ou None s'il n'a pas encore été créé."""
+    pool = _pool
+    if pool is None:
+        return None
+    stats = pool.stats()
+    if name == "utilisation":
+        return stats["in_use"] / stats["size"] if stats["size"] else 0.0
+    return stats[name]
+
+
+get_metrics().collect("chess_engine_pool_size", "Taille maximale du pool de moteurs.", lambda: _pool_stat("size"))
+get_metrics().collect("chess_engine_pool_in_use", "Moteurs empruntés.", lambda: _pool_stat("in_use"))
+get_metrics().collect("chess_engine_pool_utilisation", "Part des moteurs du pool empruntés (0 à 1).",
+                      lambda: _pool_stat("utilisation"))
+get_metrics().collect("chess_engine_pool_checkouts_total", "Emprunts de moteurs.", lambda: _pool_stat("checkouts"),
+                      kind="counter")
+get_metrics().collect("chess_engine_pool_restarts_total", "Moteurs relancés après un plantage.",
+                      lambda: _pool_stat("restarts"), kind="counter")
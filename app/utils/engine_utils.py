@@ -1,8 +1,26 @@
 import os
 import platform
+from typing import Union
+import chess
 import chess.engine
-import platform
-from stockfish import Stockfish
+import chess.polyglot
+from app.utils.analysis_budget import ANALYSIS_DEPTH
+from app.utils.analysis_scheduler import get_analysis_scheduler
+from app.utils.engine_pool import get_engine_pool
+from app.utils.eval_cache import get_evaluation_cache
+from app.utils.metrics import get_metrics, span
+from app.utils.move_scores import MoveScoreTable, display_score, relative_strength
+from app.utils.opening_book import get_opening_book
+from app.utils.single_flight import SingleFlight
+from app.utils.tablebase import get_tablebase
+
+# Profondeur atteinte et nœuds explorés par les recherches du moteur (`/metrics`)
+ENGINE_DEPTH = get_metrics().histogram("chess_engine_search_depth", "Profondeur atteinte par les recherches du moteur.",
+                                       buckets=(1, 2, 4, 6, 8, 10, 12, 15, 20, 25, 30))
+ENGINE_NODES = get_metrics().histogram("chess_engine_search_nodes", "Nœuds explorés par les recherches du moteur.",
+                                       buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8))
+# Évaluations en cours, par (position, profondeur)
+_evaluation_flights = SingleFlight("evaluation")
 
 def get_stockfish_path():
     """Détecte automatiquement le chemin de Stockfish selon l'environnement"""
@@ -36,70 +54,225 @@ def get_stockfish_path():
 # Utiliser cette fonction pour obtenir le chemin
 STOCKFISH_PATH = get_stockfish_path()
 
+def score_to_evaluation(score):
+    """
+    Convertit un score python-chess (`PovScore`) en dictionnaire {"type", "value"}
+    du point de vue des blancs, au même format que l'ancien wrapper `stockfish`.
+    """
+    white_score = score.white()
+    if white_score.is_mate():
+        return {"type": "mate", "value": white_score.mate()}
+    return {"type": "cp", "value": white_score.score()}
+
+def search_iteratively(engine, board, limit, multipv=None, root_moves=None):
+    """
+    Recherche à approfondissement itératif bornée par `limit` (profondeur, temps, nœuds).
+
+    Le moteur publie ses lignes à chaque profondeur ; à l'arrêt de la recherche, seules les lignes
+    de la dernière profondeur dont toutes les lignes multi-PV ont été calculées sont retenues
+    (à défaut, celles de la profondeur la plus avancée). Les lignes incomplètes (bornes
+    `lowerbound` / `upperbound` d'une itération interrompue) sont ignorées.
+    Retourne une liste d'InfoDict, chacun portant la profondeur atteinte (`depth`).
+    """
+    iterations = {}
+    with engine.analysis(board, limit, multipv=multipv, root_moves=root_moves) as search:
+        for info in search:
+            record_iteration(iterations, info)
+    return deepest_complete_iteration(iterations, expected_lines(board, multipv, root_moves))
+
+def expected_lines(board, multipv=None, root_moves=None):
+    """Nombre de lignes qu'une itération complète doit contenir (multi-PV borné par les coups candidats)."""
+    candidates = len(root_moves) if root_moves else board.legal_moves.count()
+    return max(1, min(multipv or 1, candidates))
+
+def record_iteration(iterations, info):
+    """Range une ligne publiée par le moteur par profondeur puis par rang multi-PV (voir `search_iteratively`)."""
+    if "pv" not in info or "score" not in info or "depth" not in info:
+        return
+    if info.get("lowerbound") or info.get("upperbound"):
+        return
+    iterations.setdefault(info["depth"], {})[info.get("multipv", 1)] = info
+
+def deepest_complete_iteration(iterations, expected):
+    """Lignes de la dernière profondeur complète (à défaut, de la plus avancée), dans l'ordre multi-PV."""
+    if not iterations:
+        return []
+    complete = [depth for depth, lines in iterations.items() if len(lines) >= expected]
+    lines = iterations[max(complete) if complete else max(iterations)]
+    return [lines[rank] for rank in sorted(lines)]
+
+def analyse_board(board, depth=ANALYSIS_DEPTH, multipv=None, root_moves=None, budget=None, deadline_at=None):
+    """
+    Lance une analyse sur un moteur emprunté au pool partagé.
+    Retourne l'InfoDict de python-chess (ou une liste d'InfoDict si `multipv` est donné).
+    `root_moves` restreint la recherche à ces coups (commande UCI `searchmoves`).
+    Avec un budget borné (`AnalysisBudget`), la recherche s'arrête à l'expiration du budget ou de
+    l'échéance `deadline_at` et retourne la dernière profondeur complète (`search_iteratively`).
+    Avec ENGINE_CLIENT=async, la recherche est confiée au client asynchrone
+    (`app.utils.async_engine`) au lieu du pool synchrone.
+
+    Dans les deux cas, le thread appelant attend son résultat : une recherche par thread est
+    voulue dans l'application, où la requête Flask ne peut répondre qu'avec l'analyse et où
+    l'ordonnanceur borne le nombre de recherches simultanées. Les appels groupés y font déjà une
+    seule recherche (`complete_analysis` évalue tous les coups manquants par `searchmoves`) ou
+    sont volontairement sérialisés (analyses anticipées sur LOOKAHEAD_WORKERS threads, pour laisser
+    les moteurs aux joueurs). Seuls les appelants qui lancent plusieurs recherches à la fois
+    (`AsyncEngineClient.analyse_many`) en profitent sans bloquer un thread par recherche.
+
+    La recherche attend d'abord sa place auprès de l'ordonnanceur du processus
+    (`app.utils.analysis_scheduler`), par ordre de priorité et d'échéance ; lorsque le serveur
+    est chargé, elle est limitée à une profondeur moindre.
+    """
+    scheduler = get_analysis_scheduler()
+    with scheduler.slot(deadline_at) as slot:
+        if slot.degraded:
+            depth = min(depth, scheduler.degraded_depth)
+            if budget is not None:
+                budget = budget.replace(depth=min(budget.depth, scheduler.degraded_depth))
+        from app.utils.async_engine import is_async_engine_enabled
+        if is_async_engine_enabled():
+            return analyse_board_async(board, depth, multipv, root_moves, budget, deadline_at)
+        with get_engine_pool().engine() as engine, span("engine", multipv=multipv or 1) as attributes:
+            if budget is None or not budget.is_bounded:
+                limit = chess.engine.Limit(depth=budget.depth if budget is not None else depth)
+                result = engine.analyse(board, limit, multipv=multipv, root_moves=root_moves)
+            else:
+                infos = search_iteratively(engine, board, budget.limit(deadline_at), multipv=multipv, root_moves=root_moves)
+                result = (infos[0] if infos else {}) if multipv is None else infos
+            record_search(attributes, result)
+            return result
+
+def analyse_board_async(board, depth=ANALYSIS_DEPTH, multipv=None, root_moves=None, budget=None, deadline_at=None):
+    """
+    Comme `analyse_board`, sur un moteur du client asynchrone du processus (`get_async_engine_client`) ;
+    le thread appelant attend le résultat (voir `analyse_board`).
+    """
+    from app.utils.async_engine import get_async_engine_client
+    bounded = budget is not None and budget.is_bounded
+    if bounded:
+        limit = budget.limit(deadline_at)
+    else:
+        limit = chess.engine.Limit(depth=budget.depth if budget is not None else depth)
+    with span("engine", multipv=multipv or 1, client="async") as attributes:
+        result = get_async_engine_client().analyse(board, limit, multipv=multipv, root_moves=root_moves,
+                                                   iterative=bounded)
+        record_search(attributes, result)
+        return result
+
+def record_search(attributes, result):
+    """Ajoute la profondeur atteinte et les nœuds explorés d'une recherche à sa trace et aux métriques."""
+    info = result[0] if isinstance(result, list) and result else result
+    if not isinstance(info, dict):
+        return
+    if "depth" in info:
+        attributes["depth"] = info["depth"]
+        ENGINE_DEPTH.observe(info["depth"])
+    if "nodes" in info:
+        attributes["nodes"] = info["nodes"]
+        ENGINE_NODES.observe(info["nodes"])
+
+def evaluate_position(board, depth=ANALYSIS_DEPTH):
+    """
+    Évalue une position (point de vue des blancs) en passant par le cache d'évaluations partagé :
+    une position déjà évaluée à cette profondeur ne relance pas le moteur.
+    """
+    cache = get_evaluation_cache()
+    evaluation = cache.get(board, depth)
+    if evaluation is None:
+        # Les évaluations simultanées de la même position partagent une recherche
+        key = (chess.polyglot.zobrist_hash(board), depth)
+        evaluation = _evaluation_flights.do(key, lambda: search_evaluation(board, depth))
+    return dict(evaluation)
+
+def search_evaluation(board, depth=ANALYSIS_DEPTH):
+    """
+    Évalue une position par le moteur et enregistre l'évaluation dans le cache partagé.
+    Une recherche qui n'a pas atteint `depth` (recherche dégradée d'un serveur chargé) n'est
+    pas mise en cache : elle serait ensuite servie comme une évaluation à pleine profondeur.
+    """
+    info = analyse_board(board, depth=depth)
+    evaluation = score_to_evaluation(info["score"])
+    if info.get("depth", depth) >= depth or board.is_game_over():
+        get_evaluation_cache().set(board, depth, evaluation)
+    return evaluation
+
+def format_move_info(board, chess_move, evaluation):
+    """Construit la description d'un coup analysé (UCI, SAN, évaluation et score affiché)."""
+    return {
+        "uci": chess_move.uci(),
+        "evaluation": evaluation,
+        "display_score": display_score(evaluation),
+        "san": board.san(chess_move)
+    }
+
+def lines_from_analysis(board, infos):
+    """Convertit les lignes multi-PV de python-chess en descriptions de coups (voir `format_move_info`)."""
+    lines = []
+    for info in infos:
+        if not info.get("pv") or "score" not in info:
+            continue
+        chess_move = info["pv"][0]
+        if chess_move in board.legal_moves:
+            lines.append(format_move_info(board, chess_move, score_to_evaluation(info["score"])))
+    return lines
+
 def evaluate_move_strength(board, move):
     """
     Évalue la force d'un coup avec Stockfish
     Retourne un dictionnaire avec l'évaluation du coup
+    En finale, le résultat exact des tables Syzygy (si elles sont installées) remplace le moteur.
     """
-    temp_board = chess.Board(board.fen())
-    temp_board.push(move)
-    stockfish = Stockfish(STOCKFISH_PATH)
-    stockfish.set_fen_position(temp_board.fen())
-    stockfish.set_depth(15)
-    
-    # Obtenir l'évaluation de la position après le coup
-    evaluation = stockfish.get_evaluation()
+    evaluation = get_tablebase().evaluate_move(board, move)
+    if evaluation is None:
+        temp_board = chess.Board(board.fen())
+        temp_board.push(move)
+
+        # Obtenir l'évaluation de la position après le coup
+        evaluation = evaluate_position(temp_board)
     
     return {
         "type": evaluation["type"],
         "value": evaluation["value"],
-        "display_score": f"M{evaluation['value']}" if evaluation["type"] == "mate" else f"{evaluation['value']/100}"
+        "display_score": display_score(evaluation)
     }
 
-def get_best_moves_from_fen(fen_file_path, num_top_moves=3, num_total_moves=3):
+def to_board(position: Union[chess.Board, str]) -> chess.Board:
     """
-    Analyse une position FEN avec Stockfish et retourne les meilleurs coups avec leurs évaluations.
+    Retourne un `chess.Board` indépendant à partir d'un échiquier ou d'une chaîne FEN.
+
+    L'analyse travaille directement sur la position en mémoire : aucun aller-retour
+    par un fichier FEN n'est nécessaire.
+    """
+    if isinstance(position, chess.Board):
+        return position.copy(stack=False)
+    return chess.Board(position)
+
+def get_best_moves_from_fen(position, num_top_moves=3, num_total_moves=3):
+    """
+    Analyse une position avec Stockfish et retourne les meilleurs coups avec leurs évaluations.
+    position: la position à analyser (`chess.Board` ou chaîne FEN)
     num_top_moves: nombre de coups à retourner pour les suggestions
     num_total_moves: nombre total de coups à analyser pour l'évaluation
+    En ouverture, les coups évalués du livre d'ouvertures sont retournés sans moteur ;
+    les coups de théorie sont étiquetés `"book": True`. En finale, les coups sont classés par
+    les tables Syzygy (si elles sont installées), sans moteur.
     """
     try:
-        with open(fen_file_path, "r") as f:
-            fen = f.read().strip()
-            
-        stockfish = Stockfish(STOCKFISH_PATH)
-        stockfish.set_fen_position(fen)
-        stockfish.set_depth(15)
-        
-        board = chess.Board(fen)
-        all_moves_info = stockfish.get_top_moves(num_total_moves)
-        
-        best_moves = []
-        for move in all_moves_info:
-            move_uci = move["Move"]
-            try:
-                chess_move = chess.Move.from_uci(move_uci)
-                if chess_move in board.legal_moves:
-                    score = move.get("Centipawn")
-                    mate = move.get("Mate")
-                    
-                    if mate is not None:
-                        evaluation = {"type": "mate", "value": mate}
-                        display_score = f"M{mate}"
-                    else:
-                        evaluation = {"type": "cp", "value": score}
-                        # Affichage sans arrondi du score
-                        display_score = f"{score/100}"
-                    
-                    move_info = {
-                        "uci": move_uci,
-                        "evaluation": evaluation,
-                        "display_score": display_score,
-                        "san": board.san(chess_move)
-                    }
-                    
-                    best_moves.append(move_info)
-            except ValueError:
-                continue
+        board = to_board(position)
+        if board.is_game_over():
+            return []
+        tablebase_lines = get_tablebase().evaluate_moves(board)
+        book_lines = get_opening_book().best_lines(board, num_total_moves) if tablebase_lines is None else None
+        if tablebase_lines is not None:
+            best_moves = [format_move_info(board, chess.Move.from_uci(line["uci"]), line["evaluation"])
+                          for line in tablebase_lines[:num_total_moves]]
+        elif book_lines is not None:
+            best_moves = [dict(format_move_info(board, chess.Move.from_uci(line["uci"]), line["evaluation"]),
+                               **({"book": True} if line["book"] else {}))
+                          for line in book_lines[:num_total_moves]]
+        else:
+            all_moves_info = analyse_board(board, multipv=num_total_moves)
+            best_moves = lines_from_analysis(board, all_moves_info)
 
         # N'afficher que les num_top_moves meilleurs coups
         print("🔍 Meilleurs coups proposés par Stockfish :")
@@ -107,25 +280,13 @@ def get_best_moves_from_fen(fen_file_path, num_top_moves=3, num_total_moves=3):
             move = best_moves[i]
             print(f"➡ {move['uci']} ({move['san']}) : {move['display_score']}")
         
-        # Calculer la force relative par rapport au meilleur coup
+        # Force relative par rapport au meilleur coup, lue dans la table des coups de la position
         if best_moves:
-            first_eval = best_moves[0]["evaluation"]
-            if first_eval["type"] == "cp":
-                base_score = first_eval["value"]
-                for move in best_moves:
-                    if move["evaluation"]["type"] == "cp":
-                        diff = abs(move["evaluation"]["value"] - base_score)
-                        # Une différence de 100 centipawns (1 pawn) = 50% de force relative
-                        move["relative_strength"] = max(0, 100 - (diff/2))
-                    else:
-                        move["relative_strength"] = 100 if move["evaluation"]["value"] > 0 else 0
-            else:
-                for move in best_moves:
-                    if move["evaluation"]["type"] == "mate":
-                        move["relative_strength"] = 100 - (abs(move["evaluation"]["value"]) - 1) * 10
-                    else:
-                        move["relative_strength"] = 50
-                        
+            table = MoveScoreTable(board)
+            table.update(best_moves)
+            ucis = [move["uci"] for move in best_moves]
+            for move, strength in zip(best_moves, table.relative_strengths(ucis, base=ucis[0])):
+                move["relative_strength"] = strength
         return best_moves
 
     except Exception as e:
@@ -133,19 +294,23 @@ def get_best_moves_from_fen(fen_file_path, num_top_moves=3, num_total_moves=3):
         return [] 
     
 
-def evaluate_played_move(fen_before, move_uci):
+def evaluate_played_move(fen_before, move_uci, analysis=None):
     """
     Évalue simplement la force d'un coup joué par le joueur.
     
     Paramètres:
-    - fen_before: Position FEN avant que le coup soit joué
+    - fen_before: Position avant que le coup soit joué (chaîne FEN ou `chess.Board`)
     - move_uci: Le coup joué au format UCI (ex: "e2e4")
+    - analysis: Analyse multi-PV de la position (`PositionAnalysis`) ; si elle contient déjà
+      le coup, son évaluation est réutilisée sans relancer le moteur
     
-    Affiche uniquement l'évaluation du coup en centipawns ou en mat.
+    Affiche uniquement l'évaluation du coup en centipawns ou en mat ; un coup de théorie
+    du livre d'ouvertures est étiqueté `"book": True`. En finale, le résultat exact des tables
+    Syzygy est utilisé avant toute analyse (`"tablebase": True`, avec `wdl` et `dtz`).
     """
     try:
-        # Créer un objet Board à partir de la position FEN
-        board = chess.Board(fen_before)
+        # Copie de travail de la position (le plateau de la partie n'est pas modifié)
+        board = to_board(fen_before)
         
         # Vérifier si le coup est légal
         move = chess.Move.from_uci(move_uci)
@@ -156,14 +321,20 @@ def evaluate_played_move(fen_before, move_uci):
         # Convertir en SAN avant de jouer le coup
         move_san = board.san(move)
         
-        # Jouer le coup
-        board.push(move)
-        
-        # Évaluer la nouvelle position
-        stockfish = Stockfish(STOCKFISH_PATH)
-        stockfish.set_fen_position(board.fen())
-        stockfish.set_depth(15)
-        evaluation = stockfish.get_evaluation()
+        # Résultat exact des tables de finales, puis évaluation de l'analyse
+        evaluation = get_tablebase().evaluate_move(board, move)
+        is_tablebase_move = evaluation is not None
+        if evaluation is None and analysis is not None:
+            evaluation = analysis.get_evaluation(move)
+        # Coup de théorie du livre d'ouvertures
+        if analysis is not None:
+            is_book_move = analysis.is_book_move(move)
+        else:
+            is_book_move = move.uci() in get_opening_book().book_moves(board)
+        if evaluation is None:
+            # Jouer le coup puis évaluer la nouvelle position
+            board.push(move)
+            evaluation = evaluate_position(board)
         
          # Créer la structure de réponse
         eval_result = {
@@ -177,9 +348,18 @@ def evaluate_played_move(fen_before, move_uci):
         else:
             eval_result["display"] = f"{evaluation['value']/100} pions"
         
+        if is_book_move:
+            eval_result["book"] = True
+        if is_tablebase_move:
+            eval_result["tablebase"] = True
+            if "wdl" in evaluation:
+                eval_result["wdl"] = evaluation["wdl"]
+                eval_result["dtz"] = evaluation["dtz"]
+
         # Afficher dans le terminal
         print("\n📊 Évaluation du coup joué:")
-        print(f"▶ Coup: {move_uci} ({move_san})")
+        print(f"▶ Coup: {move_uci} ({move_san}){' 📖 coup du livre' if is_book_move else ''}"
+              f"{' ♔ tables de finales' if is_tablebase_move else ''}")
         print(f"▶ Évaluation: {eval_result['display']}")
             
         return eval_result
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import chess
+import chess.polyglot
+from app.utils.metrics import get_metrics
+
+# Nombre maximal d'entrées gardées en mémoire (surcharge via EVAL_CACHE_SIZE)
+DEFAULT_CACHE_SIZE = 10000
+
+CacheKey = Tuple[int, int, str]
+
+
+def _to_signed(zobrist: int) -> int:
+    """SQLite stocke des entiers signés sur 64 bits : on replie le hachage Zobrist non signé."""
+    return zobrist - (1 << 64) if zobrist >= (1 << 63) else zobrist
+
+
+class EvaluationCache:
+    """
+        Cache borné des évaluations Stockfish, partagé par toutes les parties du processus.
+
+        Une entrée est identifiée par le hachage Zobrist de la position, la profondeur
+        de recherche et le type de résultat (`kind`) :
+
+        - `"eval"` : évaluation d'une position (`evaluate_move_strength`, `evaluate_played_move`) ;
+        - `"analysis"` : analyse multi-PV d'une position (`analyse_position`).
+
+        Deux niveaux :
+
+        - une LRU en mémoire (`max_entries` entrées au plus) ;
+        - une base SQLite optionnelle (`db_path`) qui survit aux redémarrages et est partagée
+          entre les workers d'une même machine.
+
+        Les entrées plus anciennes que `ttl` secondes (si défini) sont ignorées et supprimées.
+        Les compteurs `hits` / `misses` sont exposés par `stats()`.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE, ttl: Optional[float] = None,
+                 db_path: Optional[str] = None) -> None:
+        self.max_entries: int = max(1, max_entries)
+        self.ttl: Optional[float] = ttl
+        self.db_path: Optional[str] = db_path
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.sqlite_hits: int = 0
+        self.evictions: int = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS eval_cache ("
+                " zobrist INTEGER NOT NULL, depth INTEGER NOT NULL, kind TEXT NOT NULL,"
+                " value TEXT NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (zobrist, depth, kind))"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(board: chess.Board, depth: int, kind: str = "eval") -> CacheKey:
+        return (chess.polyglot.zobrist_hash(board), depth, kind)
+
+    def _is_expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remember(self, key: CacheKey, created: float, value: Any) -> None:
+        """Insère dans la LRU mémoire en évinçant l'entrée la moins récemment utilisée (verrou tenu)."""
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, board: chess.Board, depth: int, kind: str = "eval") -> Optional[Any]:
+        """Retourne la valeur en cache pour la position, ou None (compté comme un défaut de cache)."""
+        key = self.make_key(board, depth, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self._is_expired(created):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM eval_cache WHERE zobrist = ? AND depth = ? AND kind = ?",
+                    (_to_signed(key[0]), depth, kind),
+                ).fetchone()
+                if row is not None:
+                    if not self._is_expired(row[1]):
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self.hits += 1
+                        self.sqlite_hits += 1
+                        return value
+                    self._db.execute(
+                        "DELETE FROM eval_cache WHERE zobrist = ? AND depth = ? AND kind = ?",
+                        (_to_signed(key[0]), depth, kind),
+                    )
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, board: chess.Board, depth: int, value: Any, kind: str = "eval") -> None:
+        """Enregistre une valeur (sérialisable en JSON) pour la position."""
+        key = self.make_key(board, depth, kind)
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO eval_cache (zobrist, depth, kind, value, created) VALUES (?, ?, ?, ?, ?)",
+                    (_to_signed(key[0]), depth, kind, json.dumps(value, separators=(",", ":")), created),
+                )
+                self._db.commit()
+
+    def clear(self) -> None:
+        """Vide les deux niveaux du cache et remet les compteurs à zéro."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM eval_cache")
+                self._db.commit()
+            self.hits = self.misses = self.sqlite_hits = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs du cache (taille, succès, défauts, taux de succès)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'sqlite_hits': self.sqlite_hits,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache: Optional[EvaluationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_evaluation_cache() -> EvaluationCache:
+    """
+        Retourne le cache d'évaluations du processus, créé au premier appel.
+
+        Configuration par variables d'environnement :
+        - EVAL_CACHE_SIZE : nombre maximal d'entrées en mémoire ;
+        - EVAL_CACHE_TTL : durée de vie d'une entrée en secondes (aucune limite par défaut) ;
+        - EVAL_CACHE_DB : chemin de la base SQLite persistante (désactivée par défaut).
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                ttl = os.environ.get("EVAL_CACHE_TTL")
+                _cache = EvaluationCache(
+                    max_entries=int(os.environ.get("EVAL_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+                    ttl=float(ttl) if ttl else None,
+                    db_path=os.environ.get("EVAL_CACHE_DB") or None,
+                )
+    return _cache
+
+
+def _cache_stat(name: str) -> Optional[float]:
+    """Compteur du cache du processus pour `/metrics`, ou None s'il n'a pas encore été créé."""
+    return None if _cache is None else _cache.stats()[name]
+
+
+get_metrics().collect("chess_eval_cache_entries", "Entrées du cache d'évaluations en mémoire.", lambda: _cache_stat("size"))
+get_metrics().collect("chess_eval_cache_hits_total", "Succès du cache d'évaluations.", lambda: _cache_stat("hits"),
+                      kind="counter")
+get_metrics().collect("chess_eval_cache_misses_total", "Défauts du cache d'évaluations.", lambda: _cache_stat("misses"),
+                      kind="counter")
+get_metrics().collect("chess_eval_cache_hit_rate", "Taux de succès du cache d'évaluations (0 à 1).",
+                      lambda: _cache_stat("hit_rate"))
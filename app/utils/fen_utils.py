@@ -1,4 +1,9 @@
 import os
+import time
+import queue
+import threading
+from app.utils.metrics import span
+from app.utils.shutdown import on_shutdown
 
 def save_board_fen(board, filename):
     """Sauvegarde l'état actuel du plateau sous forme de FEN dans un fichier situé dans le dossier 'fen_saves'."""
@@ -15,4 +20,167 @@ def save_board_fen(board, filename):
 
 
 def get_fen_path(board):
-        return os.path.join(os.getcwd(), "fichierFenAjour.fen")
\ No newline at end of file
+        return os.path.join(os.getcwd(), "fichierFenAjour.fen")
+
+
+# Dossier par défaut des instantanés FEN (surcharge via FEN_SNAPSHOT_DIR)
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "fen_saves")
+# Intervalle entre deux écritures groupées (secondes)
+SNAPSHOT_FLUSH_INTERVAL = 2.0
+
+
+class FenSnapshotWriter:
+    """
+        Persistance asynchrone et groupée de l'état des parties (FEN), désactivée par défaut.
+
+        L'analyse n'a plus besoin de relire la position sur disque : les instantanés ne servent
+        qu'à garder une trace des parties en cours. Les demandes sont mises en file et un thread
+        en arrière-plan les écrit par lots ; seul le dernier état de chaque partie est écrit.
+        Les fichiers des parties terminées sont supprimés (`discard`).
+    """
+
+    def __init__(self, directory, flush_interval=SNAPSHOT_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        # Signale au thread d'écriture que des demandes sont en file
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Tenu pendant l'écriture d'un lot : `flush` attend le lot en cours du thread
+        self._write_lock = threading.Lock()
+        # Volume écrit sur disque (mesures de `tests/benchmark_submit_move.py`)
+        self.writes = 0
+        self.bytes_written = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="fen-snapshots", daemon=True)
+                self._thread.start()
+
+    def snapshot(self, game_id, fen):
+        """Demande l'écriture de la position `fen` pour la partie `game_id` (non bloquant)."""
+        self._ensure_started()
+        self._queue.put((game_id, fen))
+        self._wakeup.set()
+
+    def discard(self, game_id):
+        """Demande la suppression de l'instantané d'une partie terminée (non bloquant)."""
+        self._ensure_started()
+        self._queue.put((game_id, None))
+        self._wakeup.set()
+
+    def _path(self, game_id):
+        return os.path.join(self.directory, f"{os.path.basename(str(game_id))}.fen")
+
+    def _drain(self, first_item):
+        """
+            Regroupe les demandes en attente : seule la dernière demande de chaque partie compte.
+            Retourne aussi le nombre de demandes retirées de la file.
+        """
+        pending = dict([first_item])
+        count = 1
+        while True:
+            try:
+                game_id, fen = self._queue.get_nowait()
+            except queue.Empty:
+                return pending, count
+            pending[game_id] = fen
+            count += 1
+
+    def _process(self, first_item):
+        pending, count = self._drain(first_item)
+        try:
+            self._write_batch(pending)
+        finally:
+            for _ in range(count):
+                self._queue.task_done()
+
+    def _write_batch(self, pending):
+        with span("fen_write", files=len(pending)):
+            self._write_files(pending)
+
+    def _write_files(self, pending):
+        for game_id, fen in pending.items():
+            path = self._path(game_id)
+            try:
+                if fen is None:
+                    if os.path.exists(path):
+                        os.remove(path)
+                else:
+                    with open(path, "w") as f:
+                        f.write(fen)
+                    self.writes += 1
+                    self.bytes_written += len(fen)
+            except OSError as e:
+                print(f"Erreur lors de la sauvegarde FEN : {e}")
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.flush_interval)  # Laisser les demandes s'accumuler pour écrire par lot
+            # Les demandes arrivées après ce point réveilleront le thread au tour suivant
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+            Écrit immédiatement les demandes en attente (utilisé à l'arrêt et dans les tests).
+
+            Les demandes restent dans la file jusqu'à leur écriture : si le thread est en train
+            d'écrire un lot, `flush` attend qu'il soit terminé puis écrit le reste.
+        """
+        with self._write_lock:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._process(item)
+
+    def join(self):
+        """Attend que toutes les demandes en file aient été écrites (ou supprimées)."""
+        self._queue.join()
+
+    def cleanup(self, max_age):
+        """Supprime les instantanés orphelins non modifiés depuis `max_age` secondes."""
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        now = time.time()
+        for file in os.listdir(self.directory):
+            path = os.path.join(self.directory, file)
+            if file.endswith(".fen") and now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                removed += 1
+        return removed
+
+
+_writer = None
+
+
+def snapshots_enabled():
+    """Les instantanés FEN ne sont écrits que si FEN_SNAPSHOTS=1."""
+    return os.environ.get("FEN_SNAPSHOTS", "0").lower() in ("1", "true", "yes")
+
+
+def get_snapshot_writer():
+    """Retourne l'écrivain d'instantanés du processus, créé au premier appel."""
+    global _writer
+    if _writer is None:
+        _writer = FenSnapshotWriter(os.environ.get("FEN_SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR))
+        on_shutdown(_writer.flush)
+    return _writer
+
+
+def snapshot_board(game_id, board):
+    """Enregistre (de façon asynchrone) la position d'une partie si les instantanés sont activés."""
+    if game_id and snapshots_enabled():
+        get_snapshot_writer().snapshot(game_id, board.fen())
+
+
+def discard_snapshot(game_id):
+    """Supprime l'instantané d'une partie terminée si les instantanés sont activés."""
+    if game_id and snapshots_enabled():
+        get_snapshot_writer().discard(game_id)
@@ -0,0 +1,300 @@
+"""
+    Mesures du serveur : traces des requêtes et métriques au format texte Prometheus (`/metrics`).
+
+    - `span(name, **attributs)` mesure une étape (lecture PGN, construction de la session, appel
+      moteur, sérialisation JSON, entrées/sorties). Sa durée alimente l'histogramme
+      `chess_span_duration_seconds{span=...}` et, pendant une requête tracée (`trace_request`),
+      elle est ajoutée à la trace de la requête, renvoyée dans l'en-tête `Server-Timing`.
+    - `get_metrics()` est le registre du processus : compteurs, histogrammes et valeurs lues
+      au moment de la collecte (`collect`), rendus par `render()`.
+
+    Les mesures sont propres à chaque processus : avec plusieurs workers gunicorn, chaque
+    collecte ne voit que le worker qui répond.
+"""
+import os
+import math
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Bornes des histogrammes de durée (secondes)
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Type MIME du format texte Prometheus
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+CollectedValue = Union[None, float, Dict[LabelValues, float]]
+
+
+def _format_value(value: float) -> str:
+    """Nombre au format Prometheus (entiers sans décimale, `+Inf`, `NaN`)."""
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Counter:
+    """Compteur croissant, éventuellement décliné par étiquettes (nom en `_total`)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in values]
+
+
+class Histogram:
+    """Histogramme cumulatif (`_bucket`, `_sum`, `_count`), éventuellement décliné par étiquettes."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DURATION_BUCKETS,
+                 labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Par étiquettes : [effectif de chaque intervalle (+Inf compris), somme]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            values = self._values.get(self._key(labels))
+            return sum(values[0]) if values else 0
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        samples: List[Sample] = []
+        for key, (counts, total) in values:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class CollectedMetric:
+    """
+        Valeur lue au moment de la collecte (taille d'un pool, nombre de sessions...).
+
+        `callback` retourne un nombre, un dictionnaire {valeurs des étiquettes: nombre}, ou None
+        si la mesure n'est pas disponible (pool pas encore créé) ; elle est alors omise.
+    """
+
+    def __init__(self, name: str, help: str, callback: Callable[[], CollectedValue],
+                 kind: str = "gauge", labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.callback = callback
+
+    def samples(self) -> List[Sample]:
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Erreur lors de la collecte de {self.name} : {e}")
+            return []
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            return [(self.name, dict(zip(self.labels, key)), float(count)) for key, count in sorted(value.items())]
+        return [(self.name, {}, float(value))]
+
+
+Metric = Union[Counter, Histogram, CollectedMetric]
+
+
+class MetricsRegistry:
+    """Registre des métriques d'un processus ; un nom déjà enregistré retourne la métrique existante."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Any:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DURATION_BUCKETS,
+                  labels: Sequence[str] = ()) -> Histogram:
+        return self._register(Histogram(name, help, buckets, labels))
+
+    def collect(self, name: str, help: str, callback: Callable[[], CollectedValue],
+                kind: str = "gauge", labels: Sequence[str] = ()) -> CollectedMetric:
+        """Enregistre une valeur lue à chaque collecte (`kind` : `gauge` ou `counter`)."""
+        return self._register(CollectedMetric(name, help, callback, kind, labels))
+
+    def render(self) -> str:
+        """Retourne toutes les métriques au format texte Prometheus (version 0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            samples = metric.samples()
+            if not samples and isinstance(metric, CollectedMetric):
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Retourne le registre de métriques du processus."""
+    return _registry
+
+
+SPAN_SECONDS = _registry.histogram("chess_span_duration_seconds", "Durée des étapes mesurées (span).", labels=("span",))
+REQUEST_SECONDS = _registry.histogram("chess_request_duration_seconds", "Durée des requêtes tracées.", labels=("route",))
+REQUESTS = _registry.counter("chess_requests_total", "Requêtes tracées, par route et code HTTP.", labels=("route", "status"))
+
+
+class RequestTrace:
+    """Étapes mesurées pendant une requête, dans l'ordre où elles se terminent."""
+
+    def __init__(self, route: str) -> None:
+        self.route = route
+        self.status = 200
+        self.spans: List[Tuple[str, float, Dict[str, Any]]] = []
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def add(self, name: str, seconds: float, attributes: Dict[str, Any]) -> None:
+        self.spans.append((name, seconds, dict(attributes)))
+
+    def summary(self) -> Dict[str, Tuple[int, float]]:
+        """Nombre et durée totale (secondes) des étapes, par nom."""
+        summary: Dict[str, Tuple[int, float]] = {}
+        for name, seconds, _ in self.spans:
+            count, total = summary.get(name, (0, 0.0))
+            summary[name] = (count + 1, total + seconds)
+        return summary
+
+    def server_timing(self) -> str:
+        """Valeur de l'en-tête `Server-Timing` : durée cumulée de chaque étape (ms) et durée totale."""
+        entries = [f'{name};dur={total * 1000:.1f};desc="{count}x"' for name, (count, total) in self.summary().items()]
+        if self.duration is not None:
+            entries.append(f"total;dur={self.duration * 1000:.1f}")
+        return ", ".join(entries)
+
+    def __str__(self) -> str:
+        details = " ".join(
+            f"{name}={seconds * 1000:.1f}ms" + "".join(f" {key}={value}" for key, value in attributes.items())
+            for name, seconds, attributes in self.spans)
+        total = f"{self.duration * 1000:.1f}ms" if self.duration is not None else "?"
+        return f"{self.route} {self.status} {total} : {details}"
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    """Retourne la trace de la requête en cours dans ce thread, ou None."""
+    return _current_trace.get()
+
+
+def is_trace_logging_enabled() -> bool:
+    """Indique si chaque trace de requête est affichée (TRACE_REQUESTS=1)."""
+    return os.environ.get("TRACE_REQUESTS", "0").lower() in ("1", "true", "yes", "on")
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+        Mesure une étape. Le dictionnaire retourné reçoit les attributs connus en fin d'étape
+        (ex. profondeur et nœuds d'une recherche) ; ils figurent dans la trace de la requête.
+
+        Les étapes exécutées dans un autre thread (analyses en arrière-plan) ne sont comptées
+        que dans l'histogramme.
+    """
+    started = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_SECONDS.observe(elapsed, span=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed, attributes)
+
+
+@contextmanager
+def trace_request(route: str) -> Iterator[RequestTrace]:
+    """Trace une requête : ses étapes (`span`), sa durée et son code HTTP (`trace.status`)."""
+    trace = RequestTrace(route)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except Exception as e:
+        # Une exception portant son code HTTP (ex. 503 `AnalysisOverloaded`) est comptée avec ce code
+        trace.status = getattr(e, "status_code", 500)
+        raise
+    finally:
+        _current_trace.reset(token)
+        trace.duration = time.perf_counter() - trace.started
+        REQUEST_SECONDS.observe(trace.duration, route=route)
+        REQUESTS.inc(route=route, status=trace.status)
+        if is_trace_logging_enabled():
+            print(f"🔎 {trace}")
@@ -0,0 +1,162 @@
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import chess
+
+# Score entier d'un mat : un mat en n coups vaut ±(MATE_SCORE - n), au-delà de toute évaluation en centipawns
+MATE_SCORE = 100000
+# Case d'un coup pas encore évalué
+UNSCORED = -(2 ** 31)
+
+MoveLike = Union[chess.Move, str]
+
+
+def display_score(evaluation: Dict[str, Any]) -> str:
+    """Score affiché d'une évaluation {"type", "value"} : `M3` pour un mat, `0.35` en pions sinon."""
+    if evaluation["type"] == "mate":
+        return f"M{evaluation['value']}"
+    # Affichage sans arrondi du score
+    return f"{evaluation['value']/100}"
+
+
+def encode_score(evaluation: Dict[str, Any], white_to_move: bool = True) -> int:
+    """
+        Score entier d'une évaluation {"type", "value"} (point de vue des blancs) : centipawns tels
+        quels, mat en n coups `±(MATE_SCORE - n)`. Un mat en 0 (le coup joué mate) est à l'avantage
+        du camp qui a joué le coup (`white_to_move` dans la position avant le coup).
+    """
+    if evaluation["type"] == "cp":
+        return max(-MATE_SCORE + 1000, min(MATE_SCORE - 1000, evaluation["value"]))
+    value = evaluation["value"]
+    if value == 0:
+        return MATE_SCORE if white_to_move else -MATE_SCORE
+    return MATE_SCORE - value if value > 0 else -MATE_SCORE - value
+
+
+def decode_score(score: int) -> Dict[str, Any]:
+    """Inverse de `encode_score` : évaluation {"type", "value"} d'un score entier."""
+    if abs(score) > MATE_SCORE - 1000:
+        return {"type": "mate", "value": MATE_SCORE - score if score > 0 else -MATE_SCORE - score}
+    return {"type": "cp", "value": score}
+
+
+def relative_strength(evaluation: Dict[str, Any], base: Dict[str, Any]) -> float:
+    """
+        Force relative d'un coup par rapport au meilleur coup (`base`), de 0 à 100.
+
+        Une différence de 100 centipawns (1 pion) vaut 50 % de force relative ; face à un mat,
+        seul un mat obtient une force (d'autant plus faible que le mat est lointain).
+    """
+    if base["type"] == "cp":
+        if evaluation["type"] == "cp":
+            return max(0, 100 - (abs(evaluation["value"] - base["value"]) / 2))
+        return 100 if evaluation["value"] > 0 else 0
+    if evaluation["type"] == "mate":
+        return 100 - (abs(evaluation["value"]) - 1) * 10
+    return 50
+
+
+class MoveScoreTable:
+    """
+        Table des évaluations de tous les coups légaux d'une position.
+
+        Les coups sont numérotés dans l'ordre de génération de python-chess ; les évaluations
+        (point de vue des blancs, comme `evaluate_move_strength`) sont rangées dans un tableau
+        d'entiers indexé par ce numéro : centipawns tels quels, mats codés `±(MATE_SCORE - n)`,
+        `UNSCORED` pour un coup pas encore évalué. Noter un essai du joueur, le coup du maître
+        ou la force relative des suggestions revient ainsi à lire une case du tableau.
+
+        ###Utilisation :
+
+            table = MoveScoreTable(board)
+            table.update(lines)  # lignes {"uci", "evaluation"} d'une recherche
+            table.evaluations(["e2e4", "a2a3"])  # [{"type": "cp", "value": 35}, None]
+    """
+
+    __slots__ = ("white_to_move", "moves", "index", "scores")
+
+    def __init__(self, board: chess.Board) -> None:
+        # Camp au trait : un mat immédiat (mat en 0 après le coup) est à son avantage
+        self.white_to_move: bool = board.turn == chess.WHITE
+        self.moves: Tuple[str, ...] = tuple(move.uci() for move in board.legal_moves)
+        self.index: Dict[str, int] = {uci: i for i, uci in enumerate(self.moves)}
+        self.scores: array = array("i", [UNSCORED]) * len(self.moves)
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def __contains__(self, move: MoveLike) -> bool:
+        """Indique si le coup (légal) est déjà évalué."""
+        i = self.index.get(_to_uci(move))
+        return i is not None and self.scores[i] != UNSCORED
+
+    def encode(self, evaluation: Dict[str, Any]) -> int:
+        """Score entier d'une évaluation {"type", "value"} d'un coup de la position (`encode_score`)."""
+        return encode_score(evaluation, self.white_to_move)
+
+    @staticmethod
+    def decode(score: int) -> Dict[str, Any]:
+        """Inverse de `encode` : évaluation {"type", "value"} d'un score entier."""
+        return decode_score(score)
+
+    def set(self, move: MoveLike, evaluation: Dict[str, Any]) -> bool:
+        """Enregistre l'évaluation d'un coup légal (sans écraser une évaluation existante) ; False sinon."""
+        i = self.index.get(_to_uci(move))
+        if i is None or self.scores[i] != UNSCORED:
+            return False
+        self.scores[i] = self.encode(evaluation)
+        return True
+
+    def update(self, lines: Iterable[Dict[str, Any]]) -> None:
+        """Enregistre les coups analysés ({"uci", "evaluation"}) d'une recherche."""
+        for line in lines:
+            self.set(line["uci"], line["evaluation"])
+
+    def get(self, move: MoveLike) -> Optional[Dict[str, Any]]:
+        """Évaluation {"type", "value"} d'un coup, ou None s'il n'est pas évalué (ou pas légal)."""
+        i = self.index.get(_to_uci(move))
+        if i is None or self.scores[i] == UNSCORED:
+            return None
+        return self.decode(self.scores[i])
+
+    def evaluations(self, moves: Iterable[MoveLike]) -> List[Optional[Dict[str, Any]]]:
+        """Évaluations de plusieurs coups en une lecture du tableau (None pour un coup non évalué)."""
+        scores = self.scores
+        positions = [self.index.get(_to_uci(move)) for move in moves]
+        return [None if i is None or scores[i] == UNSCORED else self.decode(scores[i]) for i in positions]
+
+    def scored(self) -> List[str]:
+        """Coups évalués, dans l'ordre de la table."""
+        return [uci for uci, score in zip(self.moves, self.scores) if score != UNSCORED]
+
+    def missing(self) -> List[str]:
+        """Coups légaux pas encore évalués, dans l'ordre de la table."""
+        return [uci for uci, score in zip(self.moves, self.scores) if score == UNSCORED]
+
+    @property
+    def is_complete(self) -> bool:
+        """Indique si tous les coups légaux sont évalués."""
+        return UNSCORED not in self.scores
+
+    def best(self) -> Optional[str]:
+        """Meilleur coup évalué pour le camp au trait, ou None si aucun coup n'est évalué."""
+        scored = [(score, uci) for uci, score in zip(self.moves, self.scores) if score != UNSCORED]
+        if not scored:
+            return None
+        pick = max if self.white_to_move else min
+        return pick(scored, key=lambda item: item[0])[1]
+
+    def relative_strengths(self, moves: Sequence[MoveLike], base: Optional[MoveLike] = None) -> List[Optional[float]]:
+        """
+            Force relative (`relative_strength`) de chaque coup par rapport à `base` (par défaut le
+            meilleur coup évalué) ; None pour un coup non évalué.
+        """
+        base = base if base is not None else self.best()
+        base_evaluation = self.get(base) if base is not None else None
+        if base_evaluation is None:
+            return [None] * len(moves)
+        return [None if evaluation is None else relative_strength(evaluation, base_evaluation)
+                for evaluation in self.evaluations(moves)]
+
+
+def _to_uci(move: MoveLike) -> str:
+    return move.uci() if isinstance(move, chess.Move) else move
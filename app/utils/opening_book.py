@@ -0,0 +1,180 @@
+import os
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+import chess
+import chess.polyglot
+from app.utils.move_scores import decode_score, encode_score
+
+# Emplacement par défaut du livre d'ouvertures (surcharge via OPENING_BOOK_PATH)
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "opening_book.bin")
+# Nombre de demi-coups de chaque partie retenus dans le livre
+DEFAULT_BOOK_PLIES = 12
+
+# Champ `learn` d'une entrée : profondeur de l'évaluation (8 bits de poids fort) et score décalé (24 bits)
+SCORE_OFFSET = 1 << 23
+NO_EVALUATION = 0
+MAX_WEIGHT = 0xFFFF
+
+
+def get_book_path() -> str:
+    """Retourne le chemin du livre d'ouvertures."""
+    return os.environ.get("OPENING_BOOK_PATH", DEFAULT_BOOK_PATH)
+
+
+def encode_learn(evaluation: Optional[Dict[str, Any]], depth: int, white_to_move: bool) -> int:
+    """Range l'évaluation d'un coup et sa profondeur dans le champ `learn` (32 bits) d'une entrée Polyglot."""
+    if evaluation is None or depth <= 0:
+        return NO_EVALUATION
+    return (min(depth, 0xFF) << 24) | (encode_score(evaluation, white_to_move) + SCORE_OFFSET)
+
+
+def decode_learn(learn: int) -> Tuple[Optional[Dict[str, Any]], int]:
+    """Inverse de `encode_learn` : (évaluation ou None, profondeur)."""
+    depth = learn >> 24
+    if depth == 0:
+        return None, 0
+    return decode_score((learn & 0xFFFFFF) - SCORE_OFFSET), depth
+
+
+def polyglot_move(board: chess.Board, move: chess.Move) -> int:
+    """
+        Codage Polyglot d'un coup : cases de départ et d'arrivée (6 bits chacune) et promotion.
+
+        Le roque est codé par le déplacement du roi sur la case de sa tour (`e1h1`), comme l'attend
+        `chess.polyglot` à la lecture.
+    """
+    to_square = move.to_square
+    if board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        to_square = chess.square(7 if board.is_kingside_castling(move) else 0, rank)
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | (move.from_square << 6) | (promotion << 12)
+
+
+class OpeningBookWriter:
+    """
+        Construit un livre d'ouvertures au format Polyglot (`.bin`).
+
+        Chaque coup reçoit un poids (nombre de parties de maîtres qui l'ont joué) et, si elle est
+        connue, son évaluation (champ `learn`). Un coup de poids nul n'est pas un coup de théorie
+        mais une alternative évaluée, proposée au joueur sans être étiquetée « coup du livre ».
+    """
+
+    def __init__(self) -> None:
+        # {clé Zobrist: {coup codé: [poids, learn]}}
+        self.entries: Dict[int, Dict[int, List[int]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(moves) for moves in self.entries.values())
+
+    def add(self, board: chess.Board, move: chess.Move, weight: int = 1,
+            evaluation: Optional[Dict[str, Any]] = None, depth: int = 0) -> None:
+        """Ajoute `weight` au poids du coup et enregistre son évaluation si elle n'est pas encore connue."""
+        moves = self.entries.setdefault(chess.polyglot.zobrist_hash(board), {})
+        entry = moves.setdefault(polyglot_move(board, move), [0, NO_EVALUATION])
+        entry[0] = min(MAX_WEIGHT, entry[0] + weight)
+        if entry[1] == NO_EVALUATION:
+            entry[1] = encode_learn(evaluation, depth, board.turn == chess.WHITE)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Écrit le livre trié par position (recherche dichotomique) puis par poids décroissant, de façon atomique."""
+        path = path or get_book_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for key in sorted(self.entries):
+                for raw_move, (weight, learn) in sorted(self.entries[key].items(), key=lambda item: -item[1][0]):
+                    f.write(chess.polyglot.ENTRY_STRUCT.pack(key, raw_move, weight, learn))
+        os.replace(tmp_path, path)
+
+
+class OpeningBook:
+    """
+        Livre d'ouvertures Polyglot construit à partir des parties de `dossierPgn`
+        (voir `build_opening_book.py`), lu par `chess.polyglot`.
+
+        Le fichier est projeté en mémoire et consulté par recherche dichotomique : une position
+        d'ouverture est servie en quelques microsecondes, sans moteur. Un livre absent est vide.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path: str = path or get_book_path()
+        self._reader: Optional[chess.polyglot.MemoryMappedReader] = None
+        if os.path.exists(self.path):
+            try:
+                self._reader = chess.polyglot.open_reader(self.path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Livre d'ouvertures illisible ({self.path}) : {e}")
+
+    def __len__(self) -> int:
+        return len(self._reader) if self._reader is not None else 0
+
+    def lookup(self, board: chess.Board) -> List[Dict[str, Any]]:
+        """
+            Entrées légales de la position, par poids décroissant.
+
+            ###Retourne :
+
+                list : [{"uci", "weight", "evaluation" (ou None), "depth"}, ...] ; `weight` nul pour
+                une alternative évaluée qui n'est pas un coup de théorie.
+        """
+        if self._reader is None:
+            return []
+        entries: List[Dict[str, Any]] = []
+        for entry in self._reader.find_all(board, minimum_weight=0):
+            evaluation, depth = decode_learn(entry.learn)
+            entries.append({"uci": entry.move.uci(), "weight": entry.weight, "evaluation": evaluation, "depth": depth})
+        entries.sort(key=lambda entry: -entry["weight"])
+        return entries
+
+    def book_moves(self, board: chess.Board) -> FrozenSet[str]:
+        """Coups de théorie (joués par les maîtres) de la position, en UCI."""
+        return frozenset(entry["uci"] for entry in self.lookup(board) if entry["weight"] > 0)
+
+    def best_lines(self, board: chess.Board, count: int, min_depth: int = 1) -> Optional[List[Dict[str, Any]]]:
+        """
+            Coups évalués de la position, du meilleur au moins bon pour le camp au trait, si le livre
+            en contient au moins `count` (évalués au moins à la profondeur `min_depth`) dont un coup
+            de théorie ; None sinon.
+
+            ###Retourne :
+
+                list : [{"uci", "evaluation", "depth", "book"}, ...], `book` indiquant un coup de théorie.
+        """
+        entries = [entry for entry in self.lookup(board)
+                   if entry["evaluation"] is not None and entry["depth"] >= min_depth]
+        if len(entries) < max(1, count) or not any(entry["weight"] for entry in entries):
+            return None
+        white_to_move = board.turn == chess.WHITE
+        entries.sort(key=lambda entry: encode_score(entry["evaluation"], white_to_move), reverse=white_to_move)
+        return [{"uci": entry["uci"], "evaluation": entry["evaluation"], "depth": entry["depth"],
+                 "book": entry["weight"] > 0} for entry in entries]
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+_book: Optional[OpeningBook] = None
+_book_lock = threading.Lock()
+
+
+def get_opening_book() -> OpeningBook:
+    """Retourne le livre d'ouvertures du processus, ouvert au premier appel."""
+    global _book
+    if _book is None:
+        with _book_lock:
+            if _book is None:
+                _book = OpeningBook()
+                if len(_book):
+                    print(f"📖 Livre d'ouvertures chargé : {len(_book)} coups")
+    return _book
+
+
+def reset_opening_book() -> None:
+    """Referme le livre ouvert (il sera rouvert au prochain appel de `get_opening_book`)."""
+    global _book
+    with _book_lock:
+        if _book is not None:
+            _book.close()
+        _book = None
@@ -1,28 +1,265 @@
+import io
 import os
+import re
+import json
+import mmap
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 import chess
+import chess.pgn
+from app.utils.metrics import span
 
-def get_pgn_games():
-    """Charge les parties PGN depuis le dossier et retourne la liste des parties disponibles."""
-    pgn_dir = os.path.join(os.path.dirname(__file__), "..", "dossierPgn")  # 📂 Adapte ce chemin si nécessaire
-    pgn_games = []
-    for file in os.listdir(pgn_dir):
-        if file.endswith(".pgn"):
-            with open(os.path.join(pgn_dir, file)) as pgn:
-                game = chess.pgn.read_game(pgn)
-                if game:
-                    pgn_games.append({
-                        "event": game.headers.get("Event", "Inconnu"),
-                        "white": game.headers.get("White", "Inconnu"),
-                        "black": game.headers.get("Black", "Inconnu"),
-                        "result": game.headers.get("Result", "Inconnu"),
-                        "file": file
-                    })
-    return pgn_games
-
-def load_pgn_file(file_path):
-    """Lit un fichier PGN et retourne la partie de jeu correspondante."""
-    with open(file_path) as pgn:
-        game = chess.pgn.read_game(pgn)
-        moves = list(game.mainline_moves())
-        print(f"Moves loaded: {moves}")
-        return game
\ No newline at end of file
+# Dossier contenant les fichiers PGN de l'application
+PGN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dossierPgn")
+# Intervalle minimal entre deux vérifications du dossier PGN par le catalogue (secondes)
+CATALOGUE_REFRESH_INTERVAL = 2.0
+# Nombre maximal de parties gardées en mémoire par `get_cached_pgn_game` (LRU)
+GAME_CACHE_SIZE = 256
+
+
+# Suffixe de l'index des parties enregistré à côté de chaque fichier PGN (`partie.pgn.idx`)
+INDEX_SUFFIX = ".idx"
+# Version du format de l'index ; un index d'une autre version est reconstruit
+INDEX_FORMAT_VERSION = 1
+
+# En-têtes retenus pour le catalogue, par clé du catalogue
+_CATALOGUE_TAGS = {b"Event": "event", b"White": "white", b"Black": "black", b"Result": "result"}
+_TAG_RE = re.compile(rb'^\[([A-Za-z0-9_]+)\s+"(.*)"\]\s*$')
+_BOM = b"\xef\xbb\xbf"
+
+
+def _ends_in_comment(line, in_comment):
+    """Indique si un commentaire `{...}` de la partie reste ouvert à la fin de la ligne."""
+    pos = 0
+    while True:
+        if in_comment:
+            end = line.find(b"}", pos)
+            if end < 0:
+                return True
+            in_comment = False
+            pos = end + 1
+        else:
+            start = line.find(b"{", pos)
+            rest_of_line = line.find(b";", pos)
+            if start < 0 or 0 <= rest_of_line < start:
+                return False
+            in_comment = True
+            pos = start + 1
+
+
+def scan_pgn_headers(file_path):
+    """
+    Parcourt un fichier PGN en ne lisant que les en-têtes de ses parties (les coups ne sont pas analysés).
+
+    Le fichier est lu ligne à ligne en binaire : la mémoire utilisée ne dépend pas de sa taille
+    et la position de chaque partie est exacte en octets, même pour une base de plusieurs
+    centaines de Mo.
+
+    ###Retourne :
+
+        list : Pour chaque partie, dans l'ordre du fichier : `index`, `offset` (position du début
+        de la partie dans le fichier, en octets), `event`, `white`, `black` et `result`.
+    """
+    entries = []
+    in_headers = False
+    in_comment = False
+    offset = 0
+    with open(file_path, "rb") as pgn:
+        for line in pgn:
+            text = line[len(_BOM):] if offset == 0 and line.startswith(_BOM) else line
+            if not in_comment and text.startswith(b"["):
+                if not in_headers:
+                    entries.append({"index": len(entries), "offset": offset, "event": "Inconnu",
+                                    "white": "Inconnu", "black": "Inconnu", "result": "Inconnu"})
+                    in_headers = True
+                match = _TAG_RE.match(text)
+                if match and match.group(1) in _CATALOGUE_TAGS:
+                    value = match.group(2).replace(b'\\"', b'"').replace(b"\\\\", b"\\")
+                    entries[-1][_CATALOGUE_TAGS[match.group(1)]] = value.decode("utf-8", errors="replace")
+            elif text.strip():
+                in_headers = False
+                in_comment = _ends_in_comment(text, in_comment)
+            offset += len(line)
+    return entries
+
+
+def get_index_file(file_path):
+    """Chemin de l'index des parties d'un fichier PGN, enregistré à côté du fichier."""
+    return file_path + INDEX_SUFFIX
+
+
+def load_pgn_index(file_path, signature):
+    """Lit l'index enregistré d'un fichier PGN ; None s'il n'existe pas ou ne correspond plus au fichier."""
+    try:
+        with open(get_index_file(file_path), encoding="utf-8") as index_file:
+            data = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    if data.get("v") != INDEX_FORMAT_VERSION or data.get("signature") != list(signature):
+        return None
+    return [
+        {"index": index, "offset": offset, "event": event, "white": white, "black": black, "result": result}
+        for index, (offset, event, white, black, result) in enumerate(data["games"])
+    ]
+
+
+def save_pgn_index(file_path, signature, entries):
+    """Enregistre l'index des parties à côté du fichier PGN (ignoré si le dossier est en lecture seule)."""
+    data = {
+        "v": INDEX_FORMAT_VERSION,
+        "signature": list(signature),
+        "games": [[e["offset"], e["event"], e["white"], e["black"], e["result"]] for e in entries],
+    }
+    index_path = get_index_file(file_path)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as index_file:
+            json.dump(data, index_file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"⚠️ Index PGN non enregistré pour {file_path} : {e}")
+
+
+FileSignature = Tuple[float, int]
+
+# En-têtes déjà lus, par chemin : ((date de modification, taille), parties du fichier)
+_headers_cache: Dict[str, Tuple[FileSignature, List[Dict[str, Any]]]] = {}
+_headers_cache_lock = threading.Lock()
+
+
+def _file_signature(file_path: str) -> FileSignature:
+    stat = os.stat(file_path)
+    return stat.st_mtime, stat.st_size
+
+
+def get_pgn_headers(file_path):
+    """
+    Retourne les en-têtes et positions des parties d'un fichier PGN.
+
+    Ordre de recherche : mémoire du processus, puis index enregistré à côté du fichier
+    (`partie.pgn.idx`), puis parcours complet (`scan_pgn_headers`) dont le résultat est
+    enregistré. L'index est reconstruit dès que le fichier change (date, taille).
+    """
+    signature = _file_signature(file_path)
+    with _headers_cache_lock:
+        cached = _headers_cache.get(file_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    entries = load_pgn_index(file_path, signature)
+    if entries is None:
+        entries = scan_pgn_headers(file_path)
+        save_pgn_index(file_path, signature, entries)
+    with _headers_cache_lock:
+        _headers_cache[file_path] = (signature, entries)
+    return entries
+
+
+# Catalogue des parties du dossier PGN : dernière vérification, signature des fichiers, parties
+_catalogue: Dict[str, Any] = {"checked": None, "dir": None, "signature": None, "games": []}
+_catalogue_lock = threading.Lock()
+
+
+def get_pgn_games(pgn_dir=PGN_DIR, refresh_interval=CATALOGUE_REFRESH_INTERVAL):
+    """
+    Retourne le catalogue de toutes les parties de tous les fichiers PGN du dossier.
+
+    Le catalogue est gardé en mémoire : le dossier n'est revérifié qu'après `refresh_interval`
+    secondes, et seuls les fichiers nouveaux ou modifiés (date, taille) sont relus, en-têtes
+    seulement. Chaque partie est décrite par `file`, `index` (rang dans le fichier), `offset`,
+    `event`, `white`, `black` et `result`.
+    """
+    with _catalogue_lock:
+        checked = _catalogue["checked"]
+        if (checked is not None and _catalogue["dir"] == pgn_dir
+                and time.monotonic() - checked < refresh_interval):
+            return _catalogue["games"]
+
+        files = sorted(file for file in os.listdir(pgn_dir) if file.endswith(".pgn"))
+        signature = [(file, _file_signature(os.path.join(pgn_dir, file))) for file in files]
+        if signature != _catalogue["signature"] or _catalogue["dir"] != pgn_dir:
+            _catalogue["games"] = [
+                dict(entry, file=file)
+                for file in files
+                for entry in get_pgn_headers(os.path.join(pgn_dir, file))
+            ]
+            _catalogue["signature"] = signature
+            _catalogue["dir"] = pgn_dir
+        _catalogue["checked"] = time.monotonic()
+        return _catalogue["games"]
+
+
+def resolve_pgn_file(game_file, pgn_dir=PGN_DIR):
+    """
+    Chemin d'un fichier PGN du dossier à partir du nom reçu du client ; None si le nom désigne
+    autre chose qu'un fichier `.pgn` du dossier (`../`, chemin absolu, lien sortant du dossier).
+
+    À appeler avant toute lecture : `get_pgn_headers` enregistre un index à côté du fichier lu.
+    """
+    if not game_file or not game_file.endswith(".pgn"):
+        return None
+    root = os.path.realpath(pgn_dir)
+    file_path = os.path.realpath(os.path.join(root, game_file))
+    if os.path.dirname(file_path) != root or not os.path.isfile(file_path):
+        return None
+    return file_path
+
+
+def read_pgn_game(file_path, game_index=0):
+    """
+    Lit la partie de rang `game_index` d'un fichier PGN ; None si elle n'existe pas.
+
+    Grâce à l'index des positions, seuls les octets de cette partie sont lus (fichier projeté
+    en mémoire) : le temps de chargement ne dépend pas du nombre de parties qui la précèdent.
+    """
+    entries = get_pgn_headers(file_path)
+    if not 0 <= game_index < len(entries):
+        return None
+    start = entries[game_index]["offset"]
+    end = entries[game_index + 1]["offset"] if game_index + 1 < len(entries) else None
+    with span("pgn_load", file=os.path.basename(file_path), game=game_index):
+        with open(file_path, "rb") as pgn, mmap.mmap(pgn.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = data[start:end].decode("utf-8-sig", errors="replace")
+        return chess.pgn.read_game(io.StringIO(text))
+
+
+def load_pgn_file(file_path, game_index=0):
+    """Lit un fichier PGN et retourne la partie de jeu correspondante (la première par défaut)."""
+    game = read_pgn_game(file_path, game_index)
+    if game is None:
+        return None
+    moves = list(game.mainline_moves())
+    print(f"Moves loaded: {moves}")
+    return game
+
+
+# Parties déjà lues, par (chemin, rang) : (signature du fichier, partie), des moins aux plus récemment lues
+_game_cache: "OrderedDict[Tuple[str, int], Tuple[FileSignature, chess.pgn.Game]]" = OrderedDict()
+_game_cache_lock = threading.Lock()
+
+
+def get_cached_pgn_game(file_path: str, game_index: int = 0) -> Optional[chess.pgn.Game]:
+    """
+    Retourne une partie d'un fichier PGN en ne la lisant qu'une fois par processus.
+
+    La partie est partagée entre toutes les sessions qui la suivent : elle ne doit pas être
+    modifiée. Elle est relue si le fichier a changé (date de modification, taille). Au plus
+    `GAME_CACHE_SIZE` parties sont gardées ; une partie inexistante n'est pas mise en cache.
+    """
+    signature = _file_signature(file_path)
+    key = (file_path, game_index)
+    with _game_cache_lock:
+        cached = _game_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            _game_cache.move_to_end(key)
+            return cached[1]
+    game = read_pgn_game(file_path, game_index)
+    if game is None:
+        return None
+    with _game_cache_lock:
+        _game_cache[key] = (signature, game)
+        _game_cache.move_to_end(key)
+        while len(_game_cache) > GAME_CACHE_SIZE:
+            _game_cache.popitem(last=False)
+    return game
@@ -0,0 +1,46 @@
+import threading
+from typing import Callable, List, Optional
+
+# Fonctions de fermeture du processus, exécutées dans l'ordre inverse de leur enregistrement
+_hooks: List[Callable[[], None]] = []
+_hooks_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+
+
+def on_shutdown(callback: Callable[[], None]) -> None:
+    """
+        Enregistre une fonction de fermeture, appelée quand le thread principal se termine.
+
+        `atexit` passe trop tard pour les moteurs : l'interpréteur attend d'abord la fin des
+        threads non démons, dont ceux de python-chess, qui ne s'arrêtent qu'à la fermeture des
+        moteurs. Un thread démon attend donc la fin du thread principal puis exécute les fonctions
+        enregistrées (la dernière enregistrée d'abord, comme `atexit`).
+
+        ###Paramètres :
+
+            - **callback** (callable) : Fonction sans argument (par exemple `EnginePool.close`).
+    """
+    global _watcher
+    with _hooks_lock:
+        _hooks.append(callback)
+        if _watcher is None:
+            _watcher = threading.Thread(target=_run_after_main_thread, name="shutdown-hooks", daemon=True)
+            _watcher.start()
+
+
+def run_shutdown_hooks() -> None:
+    """Exécute une seule fois les fonctions enregistrées, de la dernière à la première."""
+    while True:
+        with _hooks_lock:
+            if not _hooks:
+                return
+            callback = _hooks.pop()
+        try:
+            callback()
+        except Exception as e:
+            print(f"⚠️ Erreur lors de la fermeture ({getattr(callback, '__qualname__', callback)}) : {e}")
+
+
+def _run_after_main_thread() -> None:
+    threading.main_thread().join()
+    run_shutdown_hooks()
@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+from app.utils.metrics import get_metrics
+
+# Recherches évitées parce qu'une recherche identique était déjà en cours (`/metrics`)
+COALESCED = get_metrics().counter("chess_coalesced_searches_total",
+                                  "Recherches identiques simultanées servies par une seule recherche.",
+                                  labels=("kind",))
+
+
+class SingleFlight:
+    """
+        Regroupe les appels identiques simultanés (même clé) en un seul calcul.
+
+        Le premier appelant d'une clé exécute la fonction ; ceux qui arrivent pendant le calcul
+        attendent son résultat (ou son exception) au lieu de relancer le même calcul. Une fois
+        le calcul terminé, la clé est libérée : un appel suivant recalcule (le résultat durable
+        relève des caches). Le résultat est partagé entre les appelants : il ne doit pas être modifié.
+
+        ###Utilisation :
+
+            flights = SingleFlight("analysis")
+            lines = flights.do((zobrist_hash, depth), lambda: search(board))
+    """
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "Future[Any]"] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, function: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Exécute `function`, ou attend le calcul déjà en cours pour `key` (au plus `timeout` secondes)."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if future is None:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.shared += 1
+        if not leader:
+            COALESCED.inc(kind=self.kind)
+            return future.result(timeout)
+        try:
+            result = function()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def inflight(self) -> int:
+        """Nombre de calculs en cours."""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        """Retourne les compteurs : calculs lancés (`leaders`), appels servis par un calcul en cours (`shared`)."""
+        with self._lock:
+            return {'inflight': len(self._calls), 'leaders': self.leaders, 'shared': self.shared}
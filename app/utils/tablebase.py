@@ -0,0 +1,157 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional
+import chess
+import chess.syzygy
+from app.utils.metrics import get_metrics
+from app.utils.move_scores import encode_score
+
+# Score (centipawns, camp au trait) d'un gain prouvé par les tables, diminué de la distance au zéroïng (DTZ)
+TABLEBASE_WIN = 20000
+
+# Consultations des tables par résultat : `hit` (position résolue), `miss` (table absente) (`/metrics`)
+PROBES = get_metrics().counter("chess_tablebase_probes_total", "Consultations des tables de finales Syzygy.",
+                               labels=("result",))
+
+
+def get_syzygy_path() -> Optional[str]:
+    """Retourne le ou les dossiers des tables Syzygy (séparés par `os.pathsep`), ou None."""
+    return os.environ.get("SYZYGY_PATH") or None
+
+
+def tablebase_evaluation(wdl: int, dtz: int, turn: chess.Color) -> Dict[str, Any]:
+    """
+        Évaluation {"type", "value"} du point de vue des blancs d'un résultat des tables
+        (`wdl` et `dtz` du point de vue du camp au trait `turn`).
+
+        Un gain vaut `TABLEBASE_WIN` moins la distance au zéroïng (le gain le plus rapide est
+        préféré), une nulle 0 ; un gain ou une perte annulés par la règle des 50 coups
+        (`wdl` ±1) comptent comme nulles. Les champs `wdl` et `dtz` sont conservés.
+    """
+    if wdl == 2:
+        value = TABLEBASE_WIN - min(abs(dtz), 1000)
+    elif wdl == -2:
+        value = -(TABLEBASE_WIN - min(abs(dtz), 1000))
+    else:
+        value = 0
+    if turn == chess.BLACK:
+        value, wdl, dtz = -value, -wdl, -dtz
+    return {"type": "cp", "value": value, "wdl": wdl, "dtz": dtz}
+
+
+class SyzygyTablebase:
+    """
+        Tables de finales Syzygy locales, consultées par `chess.syzygy`.
+
+        Une position sans droit de roque et avec au plus `max_pieces` pièces (selon les tables
+        présentes : 5, 6 ou 7) est résolue exactement (gain, nulle ou perte et distance au
+        zéroïng) en quelques microsecondes, sans moteur. Sans tables, ou pour une table absente,
+        les méthodes retournent None et l'appelant se rabat sur Stockfish.
+    """
+
+    def __init__(self, directories: Optional[str] = None) -> None:
+        self._tablebase: Optional[chess.syzygy.Tablebase] = None
+        self.max_pieces: int = 0
+        for directory in (directories or "").split(os.pathsep):
+            if not directory:
+                continue
+            if not os.path.isdir(directory):
+                print(f"⚠️ Dossier de tables Syzygy introuvable : {directory}")
+                continue
+            if self._tablebase is None:
+                self._tablebase = chess.syzygy.Tablebase()
+            self._tablebase.add_directory(directory)
+        if self._tablebase is not None and self._tablebase.wdl:
+            # Nom de table : pièces des deux camps séparées par "v" (ex. KRPvKR)
+            self.max_pieces = max(len(name) - 1 for name in self._tablebase.wdl)
+
+    def __len__(self) -> int:
+        return len(self._tablebase.wdl) if self._tablebase is not None else 0
+
+    def can_probe(self, board: chess.Board) -> bool:
+        """Indique si la position peut figurer dans les tables (nombre de pièces, pas de roque)."""
+        return (self.max_pieces > 0 and not board.castling_rights
+                and chess.popcount(board.occupied) <= self.max_pieces)
+
+    def probe(self, board: chess.Board) -> Optional[Dict[str, int]]:
+        """Résultat {"wdl", "dtz"} de la position pour le camp au trait, ou None si elle n'est pas dans les tables."""
+        if self._tablebase is None or not self.can_probe(board):
+            return None
+        try:
+            result = {"wdl": self._tablebase.probe_wdl(board), "dtz": self._tablebase.probe_dtz(board)}
+        except (KeyError, chess.syzygy.MissingTableError):
+            PROBES.inc(result="miss")
+            return None
+        PROBES.inc(result="hit")
+        return result
+
+    def evaluate_move(self, board: chess.Board, move: chess.Move) -> Optional[Dict[str, Any]]:
+        """Évaluation exacte (point de vue des blancs) de la position après `move`, ou None."""
+        if self.max_pieces == 0:
+            return None
+        board = board.copy(stack=False)
+        board.push(move)
+        if board.is_checkmate():
+            # Même forme que l'évaluation du moteur pour un coup qui mate (mat en 0)
+            return {"type": "mate", "value": 0}
+        result = self.probe(board)
+        if result is None:
+            return None
+        return tablebase_evaluation(result["wdl"], result["dtz"], board.turn)
+
+    def evaluate_moves(self, board: chess.Board) -> Optional[List[Dict[str, Any]]]:
+        """
+            Évalue tous les coups légaux de la position, du meilleur au moins bon pour le camp au trait.
+
+            ###Retourne :
+
+                list : [{"uci", "evaluation"}, ...], ou None si la position ou l'un des coups n'est
+                pas couvert par les tables.
+        """
+        if not self.can_probe(board):
+            return None
+        lines: List[Dict[str, Any]] = []
+        for move in board.legal_moves:
+            evaluation = self.evaluate_move(board, move)
+            if evaluation is None:
+                return None
+            lines.append({"uci": move.uci(), "evaluation": evaluation})
+        if not lines:
+            return None
+        white_to_move = board.turn == chess.WHITE
+        lines.sort(key=lambda line: encode_score(line["evaluation"], white_to_move), reverse=white_to_move)
+        return lines
+
+    def close(self) -> None:
+        if self._tablebase is not None:
+            self._tablebase.close()
+            self._tablebase = None
+        self.max_pieces = 0
+
+
+_tablebase: Optional[SyzygyTablebase] = None
+_tablebase_lock = threading.Lock()
+
+
+def get_tablebase() -> SyzygyTablebase:
+    """
+        Retourne les tables Syzygy du processus, ouvertes au premier appel à partir de SYZYGY_PATH
+        (vide si la variable n'est pas définie ou si aucun dossier ne contient de tables).
+    """
+    global _tablebase
+    if _tablebase is None:
+        with _tablebase_lock:
+            if _tablebase is None:
+                _tablebase = SyzygyTablebase(get_syzygy_path())
+                if len(_tablebase):
+                    print(f"♔ Tables Syzygy chargées : {len(_tablebase)} tables, jusqu'à {_tablebase.max_pieces} pièces")
+    return _tablebase
+
+
+def reset_tablebase() -> None:
+    """Referme les tables ouvertes (elles seront rouvertes au prochain appel de `get_tablebase`)."""
+    global _tablebase
+    with _tablebase_lock:
+        if _tablebase is not None:
+            _tablebase.close()
+        _tablebase = None
@@ -0,0 +1,215 @@
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import chess
+import chess.pgn
+from app.services.analysis_service import analyse_position, NUM_TOP_MOVES
+from app.utils.analysis_index import AnalysisIndex, get_index_path, position_key, encode_lines, decode_lines
+from app.utils.engine_utils import ANALYSIS_DEPTH
+from app.utils.pgn_utils import PGN_DIR
+
+# Nombre de positions analysées entre deux messages de progression
+PROGRESS_EVERY = 50
+
+
+def iter_pgn_games(pgn_dir):
+    """Parcourt toutes les parties de tous les fichiers PGN du dossier (dans l'ordre alphabétique)."""
+    for file in sorted(os.listdir(pgn_dir)):
+        if not file.endswith(".pgn"):
+            continue
+        with open(os.path.join(pgn_dir, file)) as pgn:
+            while True:
+                game = chess.pgn.read_game(pgn)
+                if game is None:
+                    break
+                yield file, game
+
+
+def collect_positions(pgn_dir, index):
+    """
+        Liste les positions de la ligne principale de toutes les parties qui restent à analyser.
+
+        Une position déjà indexée avec le coup du maître n'est pas reprise ; une position atteinte
+        par plusieurs parties (transpositions) n'est analysée qu'une fois, avec tous les coups
+        joués par les maîtres.
+
+        ###Retourne :
+
+            dict : {clé de position: (FEN, [coups UCI des maîtres])}, dans l'ordre des parties.
+    """
+    pending = {}
+    for file, game in iter_pgn_games(pgn_dir):
+        print(f"♟️ {file} : {game.headers.get('White', '?')} - {game.headers.get('Black', '?')}")
+        board = game.board()
+        for move in game.mainline_moves():
+            key = position_key(board)
+            entry = index.lookup(board)
+            known_moves = [] if entry is None else [line["uci"] for line in entry["lines"] + entry["extra"]]
+            if move.uci() not in known_moves:
+                fen, moves = pending.setdefault(key, (board.fen(), []))
+                if move.uci() not in moves:
+                    moves.append(move.uci())
+            board.push(move)
+    return pending
+
+
+def _init_worker():
+    """Initialise un processus d'analyse : un seul moteur Stockfish, sans base de cache partagée."""
+    os.environ["STOCKFISH_POOL_SIZE"] = "1"
+    # Plusieurs processus écrivant la même base SQLite se bloqueraient : seul l'index est écrit
+    os.environ.pop("EVAL_CACHE_DB", None)
+
+
+def analyse_index_position(fen, moves, depth, num_top_moves):
+    """
+        Analyse une position pour l'index (exécuté dans un processus du pool).
+
+        ###Retourne :
+
+            tuple : (FEN, lignes principales, coups évalués en plus) au format {"uci", "evaluation"}.
+    """
+    analysis = analyse_position(chess.Board(fen), moves=moves, num_top_moves=num_top_moves, depth=depth, use_index=False)
+    return fen, analysis.lines, analysis.extra_lines()
+
+
+def run_analyses(pending, depth, num_top_moves, workers=1):
+    """
+        Analyse les positions en attente, dans le processus courant (`workers` = 1) ou réparties
+        sur un `ProcessPoolExecutor` de `workers` processus, chacun avec son propre moteur.
+
+        Les résultats sont produits au fur et à mesure, dans l'ordre où ils se terminent.
+    """
+    if workers <= 1:
+        for fen, moves in pending.values():
+            yield analyse_index_position(fen, moves, depth, num_top_moves)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(analyse_index_position, fen, moves, depth, num_top_moves)
+                   for fen, moves in pending.values()]
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # La position reste absente de l'index : elle sera reprise au prochain lancement
+                print(f"Erreur lors de l'analyse Stockfish : {e}")
+
+
+def add_to_index(index, board, lines, extra):
+    """Enregistre une analyse dans l'index en conservant les coups du maître déjà indexés (transpositions)."""
+    entry = index.lookup(board)
+    if entry is not None:
+        analysed = {line["uci"] for line in lines + extra}
+        extra = extra + [line for line in entry["extra"] if line["uci"] not in analysed]
+    index.add(board, lines, extra)
+
+
+def load_checkpoint(path, index, depth, num_top_moves):
+    """
+        Reprend les analyses enregistrées par un lancement interrompu.
+
+        Le point de contrôle est un fichier JSON Lines : un en-tête (profondeur, nombre de coups)
+        puis une ligne par position analysée. Il est ignoré s'il a été écrit avec d'autres
+        paramètres ; une dernière ligne tronquée (interruption pendant l'écriture) est ignorée.
+
+        ###Retourne :
+
+            int : Nombre de positions reprises dans l'index.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        records = f.read().splitlines()
+    try:
+        header = json.loads(records[0]) if records else {}
+    except ValueError:
+        header = {}
+    if header.get("depth") != depth or header.get("num_top_moves") != num_top_moves:
+        print(f"⚠️ Point de contrôle ignoré (paramètres différents) : {path}")
+        os.remove(path)
+        return 0
+    resumed = 0
+    for record in records[1:]:
+        try:
+            record = json.loads(record)
+        except ValueError:
+            continue
+        add_to_index(index, chess.Board(record["fen"]), decode_lines(record["lines"]), decode_lines(record["extra"]))
+        resumed += 1
+    return resumed
+
+
+def build_analysis_index(pgn_dir=PGN_DIR, output=None, depth=ANALYSIS_DEPTH, num_top_moves=NUM_TOP_MOVES, rebuild=False,
+                         workers=1, checkpoint=None):
+    """
+        Construit (ou complète) l'index des analyses de toutes les positions des parties PGN.
+
+        Chaque position de la ligne principale est analysée une fois : meilleurs coups et
+        évaluation du coup joué par le maître. Les positions déjà indexées (transpositions,
+        parties déjà traitées) ne sont pas réanalysées, sauf si le coup du maître n'y figure pas.
+
+        ###Paramètres :
+
+            workers (int) : Nombre de processus d'analyse (un moteur Stockfish chacun).
+            checkpoint (str) : Point de contrôle des analyses terminées (défaut : `<index>.checkpoint`).
+                Chaque position analysée y est ajoutée immédiatement : un lancement interrompu
+                reprend là où il s'était arrêté. Le fichier est supprimé une fois l'index écrit.
+
+        ###Retourne :
+
+            AnalysisIndex : L'index complété, déjà écrit sur disque.
+    """
+    output = output or get_index_path()
+    checkpoint = checkpoint or f"{output}.checkpoint"
+    index = AnalysisIndex.load(output)
+    if rebuild or index.depth != depth or index.num_top_moves != num_top_moves:
+        index = AnalysisIndex(depth=depth, num_top_moves=num_top_moves)
+    if rebuild and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    resumed = load_checkpoint(checkpoint, index, depth, num_top_moves)
+    pending = collect_positions(pgn_dir, index)
+    print(f"🧮 {len(pending)} positions à analyser ({workers} processus, {resumed} reprises du point de contrôle)")
+
+    analysed = 0
+    with open(checkpoint, "a") as log:
+        if log.tell() == 0:
+            log.write(json.dumps({"depth": depth, "num_top_moves": num_top_moves}) + "\n")
+        for fen, lines, extra in run_analyses(pending, depth, num_top_moves, workers=workers):
+            if not lines:
+                continue
+            log.write(json.dumps({"fen": fen, "lines": encode_lines(lines), "extra": encode_lines(extra)},
+                                 separators=(",", ":")) + "\n")
+            log.flush()
+            add_to_index(index, chess.Board(fen), lines, extra)
+            analysed += 1
+            if analysed % PROGRESS_EVERY == 0:
+                print(f"⏳ {analysed}/{len(pending)} positions analysées")
+
+    index.save(output)
+    os.remove(checkpoint)
+    print(f"✅ Index écrit dans {output} : {len(index)} positions ({analysed} analysées)")
+    return index
+
+
+if __name__ == "__main__":
+    """
+        Précalcule les analyses Stockfish des parties de `dossierPgn`.
+
+        Exemple d'exécution :
+            python build_analysis_index.py
+            python build_analysis_index.py --depth 18 --top 5 --rebuild
+            python build_analysis_index.py --pgn-dir /chemin/vers/tournoi --workers 16
+    """
+    parser = argparse.ArgumentParser(description="Construit l'index des analyses des parties PGN.")
+    parser.add_argument("--pgn-dir", default=PGN_DIR, help="Dossier contenant les fichiers PGN")
+    parser.add_argument("--output", default=None, help="Fichier d'index (défaut : ANALYSIS_INDEX_PATH ou app/analysis_index.json)")
+    parser.add_argument("--depth", type=int, default=ANALYSIS_DEPTH, help="Profondeur de recherche")
+    parser.add_argument("--top", type=int, default=NUM_TOP_MOVES, help="Nombre de meilleurs coups par position")
+    parser.add_argument("--rebuild", action="store_true", help="Ignorer l'index existant et tout réanalyser")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Nombre de processus d'analyse (défaut : un par cœur)")
+    parser.add_argument("--checkpoint", default=None, help="Point de contrôle pour reprendre un calcul interrompu (défaut : <index>.checkpoint)")
+    args = parser.parse_args()
+
+    build_analysis_index(args.pgn_dir, output=args.output, depth=args.depth, num_top_moves=args.top, rebuild=args.rebuild,
+                         workers=args.workers, checkpoint=args.checkpoint)
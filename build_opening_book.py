@@ -0,0 +1,102 @@
+import argparse
+import chess
+import chess.polyglot
+from app.utils.analysis_index import AnalysisIndex, decode_lines
+from app.utils.engine_utils import ANALYSIS_DEPTH
+from app.utils.eval_cache import get_evaluation_cache
+from app.utils.opening_book import DEFAULT_BOOK_PLIES, OpeningBookWriter, get_book_path
+from app.utils.pgn_utils import PGN_DIR
+from build_analysis_index import iter_pgn_games
+
+
+def known_evaluations(board, index, cache, depth):
+    """
+        Évaluations déjà calculées des coups d'une position : index des analyses, puis analyses
+        du cache d'évaluations partagé (persistant avec EVAL_CACHE_DB).
+
+        ###Retourne :
+
+            dict : {coup UCI: (évaluation {"type", "value"}, profondeur)}.
+    """
+    known = {}
+    entry = index.lookup(board)
+    if entry is not None:
+        for line in entry["lines"] + entry["extra"]:
+            known.setdefault(line["uci"], (line["evaluation"], index.depth))
+    record = cache.get(board, depth, kind="analysis")
+    if record is not None:
+        for line in decode_lines(record["lines"]) + decode_lines(record["extra"]):
+            known.setdefault(line["uci"], (line["evaluation"], record.get("d", depth)))
+    return known
+
+
+def cached_move_evaluation(board, move, cache, depth):
+    """Évaluation en cache de la position après le coup (`evaluate_position`), ou (None, 0)."""
+    board = board.copy(stack=False)
+    board.push(move)
+    evaluation = cache.get(board, depth)
+    return (evaluation, depth) if evaluation is not None else (None, 0)
+
+
+def build_opening_book(pgn_dir=PGN_DIR, output=None, plies=DEFAULT_BOOK_PLIES, depth=ANALYSIS_DEPTH, index_path=None):
+    """
+        Construit le livre d'ouvertures Polyglot des `plies` premiers demi-coups des parties PGN.
+
+        Le poids d'un coup est le nombre de parties de maîtres qui l'ont joué dans la position.
+        Les évaluations déjà calculées (index des analyses, cache d'évaluations) sont rangées
+        dans le champ `learn` des entrées ; les meilleurs coups du moteur qui ne sont pas des
+        coups de théorie sont ajoutés avec un poids nul, pour que l'application puisse proposer
+        les meilleurs coups d'une position d'ouverture sans moteur.
+
+        ###Retourne :
+
+            OpeningBookWriter : Le livre construit, déjà écrit sur disque.
+    """
+    output = output or get_book_path()
+    index = AnalysisIndex.load(index_path)
+    cache = get_evaluation_cache()
+    writer = OpeningBookWriter()
+    positions = set()
+    games = 0
+    for file, game in iter_pgn_games(pgn_dir):
+        games += 1
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves()):
+            if ply >= plies:
+                break
+            known = known_evaluations(board, index, cache, depth)
+            evaluation, evaluation_depth = known.get(move.uci(), (None, 0))
+            if evaluation is None:
+                evaluation, evaluation_depth = cached_move_evaluation(board, move, cache, depth)
+            writer.add(board, move, weight=1, evaluation=evaluation, depth=evaluation_depth)
+            key = chess.polyglot.zobrist_hash(board)
+            if key not in positions:
+                positions.add(key)
+                for uci, (evaluation, evaluation_depth) in known.items():
+                    writer.add(board, chess.Move.from_uci(uci), weight=0, evaluation=evaluation, depth=evaluation_depth)
+            board.push(move)
+
+    writer.save(output)
+    evaluated = sum(1 for moves in writer.entries.values() for _, learn in moves.values() if learn)
+    print(f"✅ Livre d'ouvertures écrit dans {output} : {len(positions)} positions, {len(writer)} coups "
+          f"({evaluated} évalués) à partir de {games} parties")
+    return writer
+
+
+if __name__ == "__main__":
+    """
+        Construit le livre d'ouvertures des parties de `dossierPgn`.
+
+        Exemple d'exécution :
+            python build_analysis_index.py && python build_opening_book.py
+            python build_opening_book.py --plies 10 --output /chemin/vers/livre.bin
+    """
+    parser = argparse.ArgumentParser(description="Construit le livre d'ouvertures Polyglot des parties PGN.")
+    parser.add_argument("--pgn-dir", default=PGN_DIR, help="Dossier contenant les fichiers PGN")
+    parser.add_argument("--output", default=None, help="Fichier du livre (défaut : OPENING_BOOK_PATH ou app/opening_book.bin)")
+    parser.add_argument("--plies", type=int, default=DEFAULT_BOOK_PLIES, help="Nombre de demi-coups retenus par partie")
+    parser.add_argument("--depth", type=int, default=ANALYSIS_DEPTH, help="Profondeur des analyses en cache à reprendre")
+    parser.add_argument("--index", default=None, help="Index des analyses (défaut : ANALYSIS_INDEX_PATH ou app/analysis_index.json)")
+    args = parser.parse_args()
+
+    build_opening_book(args.pgn_dir, output=args.output, plies=args.plies, depth=args.depth, index_path=args.index)
@@ -0,0 +1,327 @@
+"""
+    Mesure de la latence de `submit_move` sur les parties de `dossierPgn`.
+
+    Chaque mode de jeu (`ChessGame`, `ChessGameNormal`, `ChessGameEasy` et les trois modes
+    chronométrés) rejoue les parties des deux côtés selon trois scénarios :
+
+    - `correct` : le joueur trouve toujours le coup du maître ;
+    - `wrong` : le joueur se trompe jusqu'à ce que la partie passe au coup suivant ;
+    - `attempts` : deux essais faux puis le coup du maître.
+
+    Pour chaque mode et scénario, le rapport JSON donne les percentiles p50/p95/p99 de la
+    latence, le nombre d'appels au moteur par coup, la mémoire allouée par coup (second passage
+    sous `tracemalloc`, pour ne pas fausser les temps), les octets écrits dans `fen_saves` et la
+    taille des réponses par coup, JSON complet et format compact (différences, gzip).
+    Les analyses anticipées sont désactivées et le cache d'évaluations vidé à chaque partie :
+    deux exécutions sur le même code donnent les mêmes nombres d'appels.
+
+    ###Exemples :
+
+        python tests/benchmark_submit_move.py --output bench.json
+        python tests/benchmark_submit_move.py --engine real --games 3 --output bench-real.json
+        python tests/benchmark_submit_move.py --output new.json --compare bench.json
+
+    Avec `--compare`, la commande échoue (code 1) si un percentile de latence ou le nombre
+    d'appels au moteur régresse de plus de `--threshold` (20 % par défaut).
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from contextlib import redirect_stdout
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+FAKE_UCI_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_uci_engine.py")
+
+REPORT_VERSION = 1
+SCENARIOS = ("correct", "wrong", "attempts")
+# Essais faux au plus avant de jouer le coup du maître (scénario `wrong`)
+MAX_WRONG_ATTEMPTS = 10
+# Métriques comparées par `--compare` : une hausse au-delà du seuil est une régression
+COMPARED_METRICS = (("latency_ms", "p50"), ("latency_ms", "p95"), ("latency_ms", "p99"), ("engine_calls_per_move", None))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Percentile (interpolation linéaire) d'une liste de mesures."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[float], digits: int = 3) -> Dict[str, float]:
+    """Résumé d'une série de mesures : p50, p95, p99, moyenne et maximum."""
+    return {
+        "p50": round(percentile(values, 0.50), digits),
+        "p95": round(percentile(values, 0.95), digits),
+        "p99": round(percentile(values, 0.99), digits),
+        "mean": round(sum(values) / len(values), digits) if values else 0.0,
+        "max": round(max(values), digits) if values else 0.0,
+    }
+
+
+def game_modes() -> Dict[str, Any]:
+    """Classes de partie mesurées, par nom (import tardif : STOCKFISH_PATH est fixé avant)."""
+    from app.models.game_model import ChessGame
+    from app.models.game_modelEasy import ChessGameEasy
+    from app.models.game_modelNormal import ChessGameNormal
+    from app.models.game_model_30sec import ChessGame30sec
+    from app.models.game_model1min import ChessGame1Min
+    from app.models.game_model3min import ChessGame3Min
+    return {cls.__name__: cls for cls in (ChessGame, ChessGameNormal, ChessGameEasy, ChessGame30sec, ChessGame1Min, ChessGame3Min)}
+
+
+def move_sequence(game: Any, scenario: str) -> List[str]:
+    """Coups soumis pour la position courante, dans l'ordre, selon le scénario."""
+    master = game.moves[game.current_move_index]
+    wrong_moves = sorted(move.uci() for move in game.board.legal_moves if move != master)
+    if not wrong_moves or scenario == "correct":
+        return [master.uci()]
+    if scenario == "wrong":
+        return [wrong_moves[0]] * MAX_WRONG_ATTEMPTS + [master.uci()]
+    return [wrong_moves[0], wrong_moves[-1], master.uci()]
+
+
+def play_game(game: Any, scenario: str, max_moves: int, defer: bool,
+              measure: Callable[[Callable[[], Any]], None]) -> None:
+    """Rejoue au plus `max_moves` coups du joueur ; chaque `submit_move` est mesuré par `measure`."""
+    from app.services.move_analysis_service import get_move_analysis_queue
+    played = 0
+    while game.current_move_index < len(game.moves) and played < max_moves:
+        for move in move_sequence(game, scenario):
+            index_before = game.current_move_index
+            measure(lambda: game.submit_move(move, defer_analysis=defer))
+            if defer:
+                # Hors mesure : l'analyse en arrière-plan doit être finie avant le coup suivant
+                get_move_analysis_queue().wait_idle(game.game_id)
+            if game.current_move_index != index_before:
+                break
+        played += 1
+
+
+def run_benchmark(pgn_files: Optional[List[str]] = None, modes: Optional[List[str]] = None,
+                  scenarios: Tuple[str, ...] = SCENARIOS, sides: Tuple[str, ...] = ("white", "black"),
+                  max_moves: int = 4, defer: bool = False, allocations: bool = True) -> Dict[str, Any]:
+    """
+        Exécute les mesures et retourne le rapport (sérialisable en JSON).
+
+        ###Paramètres :
+
+            pgn_files (list) : Fichiers de `dossierPgn` rejoués (défaut : tous).
+            modes (list) : Noms des classes de partie mesurées (défaut : toutes).
+            max_moves (int) : Nombre maximal de coups du joueur par partie.
+            defer (bool) : Mesurer la réponse de `submit_move(defer_analysis=True)`.
+            allocations (bool) : Mesurer la mémoire allouée par coup (second passage).
+    """
+    from app.services.lookahead_service import get_lookahead_scheduler
+    from app.utils import analysis_index, fen_utils
+    from app.utils.compact_response import ResponseStates, compact_response, encode_body
+    from app.utils.engine_pool import get_engine_pool
+    from app.utils.engine_utils import STOCKFISH_PATH
+    from app.utils.eval_cache import get_evaluation_cache
+    from app.utils.pgn_utils import PGN_DIR, get_cached_pgn_game, get_pgn_games
+
+    catalogue = [entry for entry in get_pgn_games(PGN_DIR, refresh_interval=0)
+                 if pgn_files is None or entry["file"] in pgn_files]
+    classes = game_modes()
+    classes = {name: cls for name, cls in classes.items() if modes is None or name in modes}
+    pool = get_engine_pool()
+    cache = get_evaluation_cache()
+
+    # Conditions reproductibles : ni analyses anticipées, ni index précalculé ;
+    # instantanés FEN écrits sans attente dans un dossier temporaire
+    scheduler = get_lookahead_scheduler()
+    saved_positions, scheduler.positions = scheduler.positions, 0
+    saved_writer = fen_utils._writer
+    saved_env = {name: os.environ.get(name) for name in ("FEN_SNAPSHOTS", "ANALYSIS_INDEX_PATH")}
+    snapshot_dir = tempfile.TemporaryDirectory()
+    os.environ["FEN_SNAPSHOTS"] = "1"
+    os.environ["ANALYSIS_INDEX_PATH"] = os.path.join(snapshot_dir.name, "aucun_index.json")
+    analysis_index.reset_analysis_index()
+    fen_utils._writer = fen_utils.FenSnapshotWriter(os.path.join(snapshot_dir.name, "fen_saves"), flush_interval=0)
+
+    results: Dict[str, Any] = {}
+    started = time.perf_counter()
+    devnull = open(os.devnull, "w")
+    try:
+        for mode_name, cls in classes.items():
+            for scenario in scenarios:
+                latencies: List[float] = []
+                engine_calls = 0
+                writer = fen_utils._writer
+                fen_bytes = 0
+
+                response_bytes = {"json": 0, "compact": 0}
+                states = ResponseStates()
+                # Client de la partie en cours : dernier état compact reçu et camp joué (fixés à chaque partie)
+                client: Dict[str, Any] = {"ack": None, "white": None}
+
+                def timed(submit: Callable[[], Any]) -> None:
+                    start = time.perf_counter()
+                    result = submit()
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    # Hors mesure : taille de la réponse JSON complète et de la réponse compacte (différence, gzip)
+                    response_bytes["json"] += len(json.dumps(result))
+                    payload = compact_response(states, "bench", result, client["white"], ack=client["ack"])
+                    client["ack"] = payload["i"]
+                    response_bytes["compact"] += len(encode_body(payload, accept_gzip=True)[0])
+
+                allocated: List[float] = []
+
+                def traced(submit: Callable[[], Any]) -> None:
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    submit()
+                    allocated.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+
+                passes = [timed, traced] if allocations else [timed]
+                for measure in passes:
+                    if measure is traced:
+                        gc.collect()
+                        tracemalloc.start()
+                    try:
+                        for entry in catalogue:
+                            pgn_game = get_cached_pgn_game(os.path.join(PGN_DIR, entry["file"]), entry["index"])
+                            for side in sides:
+                                cache.clear()
+                                client.update(ack=None, white=side == "white")
+                                with redirect_stdout(devnull):
+                                    # L'analyse de la position initiale (démarrage de la partie) n'est pas mesurée
+                                    game = cls(pgn_game, side, game_id=f"bench-{mode_name}-{scenario}-{side}")
+                                    writer.join()
+                                    checkouts, bytes_before = pool.stats()["checkouts"], writer.bytes_written
+                                    play_game(game, scenario, max_moves, defer, measure)
+                                    writer.join()
+                                # Partie terminée : ses états compacts sont oubliés, comme dans `submit_move`
+                                states.discard("bench")
+                                if measure is timed:
+                                    engine_calls += pool.stats()["checkouts"] - checkouts
+                                    fen_bytes += writer.bytes_written - bytes_before
+                    finally:
+                        if measure is traced:
+                            tracemalloc.stop()
+
+                moves = len(latencies)
+                results[f"{mode_name}/{scenario}"] = {
+                    "moves": moves,
+                    "latency_ms": summarize(latencies),
+                    "engine_calls_per_move": round(engine_calls / moves, 3) if moves else 0.0,
+                    "alloc_kib": summarize(allocated, digits=1) if allocations else None,
+                    "fen_bytes_per_move": round(fen_bytes / moves, 1) if moves else 0.0,
+                    "json_bytes_per_move": round(response_bytes["json"] / moves, 1) if moves else 0.0,
+                    "compact_bytes_per_move": round(response_bytes["compact"] / moves, 1) if moves else 0.0,
+                }
+    finally:
+        devnull.close()
+        scheduler.positions = saved_positions
+        fen_utils._writer = saved_writer
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        analysis_index.reset_analysis_index()
+        snapshot_dir.cleanup()
+
+    return {
+        "version": REPORT_VERSION,
+        "commit": git_commit(),
+        "engine": "fake" if os.path.abspath(str(STOCKFISH_PATH)) == FAKE_UCI_ENGINE else str(STOCKFISH_PATH),
+        "python": platform.python_version(),
+        "settings": {"pgn_files": sorted({entry["file"] for entry in catalogue}), "sides": list(sides),
+                     "max_moves": max_moves, "defer_analysis": defer},
+        "duration_s": round(time.perf_counter() - started, 2),
+        "results": results,
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Commit mesuré (None hors d'un dépôt git)."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(current: Dict[str, Any], previous: Dict[str, Any], threshold: float = 0.2) -> List[str]:
+    """
+        Compare deux rapports ; retourne les régressions (hausse de plus de `threshold`)
+        de latence (p50/p95/p99) ou d'appels au moteur, par mode et scénario.
+    """
+    regressions = []
+    for key, result in current["results"].items():
+        before = previous.get("results", {}).get(key)
+        if before is None:
+            continue
+        for metric, field in COMPARED_METRICS:
+            new_value = result[metric] if field is None else result[metric][field]
+            old_value = before[metric] if field is None else before[metric][field]
+            if old_value and new_value > old_value * (1 + threshold):
+                label = metric if field is None else f"{metric}.{field}"
+                regressions.append(f"{key} {label} : {old_value} -> {new_value} (+{(new_value / old_value - 1) * 100:.0f} %)")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Affiche le rapport sous forme de tableau."""
+    print(f"⏱️ submit_move — moteur {report['engine']}, commit {report['commit']}, {report['duration_s']} s")
+    print(f"{'mode/scénario':<28}{'coups':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'moteur':>8}{'KiB p50':>9}{'FEN o':>7}")
+    for key, result in report["results"].items():
+        latency = result["latency_ms"]
+        alloc = result["alloc_kib"]["p50"] if result["alloc_kib"] else "-"
+        print(f"{key:<28}{result['moves']:>7}{latency['p50']:>9}{latency['p95']:>9}{latency['p99']:>9}"
+              f"{result['engine_calls_per_move']:>8}{alloc:>9}{result['fen_bytes_per_move']:>7}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mesure la latence de submit_move sur les parties PGN.")
+    parser.add_argument("--engine", choices=("fake", "real"), default="fake",
+                        help="Moteur factice déterministe (défaut) ou Stockfish (STOCKFISH_PATH ou détection automatique)")
+    parser.add_argument("--fake-latency-ms", type=float, default=0, help="Délai du moteur factice par profondeur")
+    parser.add_argument("--games", type=int, default=None, help="Nombre de fichiers PGN rejoués (défaut : tous)")
+    parser.add_argument("--modes", nargs="*", default=None, help="Classes de partie mesurées (défaut : toutes)")
+    parser.add_argument("--scenarios", nargs="*", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--moves", type=int, default=4, help="Nombre maximal de coups du joueur par partie")
+    parser.add_argument("--defer", action="store_true", help="Mesurer submit_move(defer_analysis=True)")
+    parser.add_argument("--no-alloc", action="store_true", help="Ne pas mesurer la mémoire allouée")
+    parser.add_argument("--output", default=None, help="Fichier JSON du rapport")
+    parser.add_argument("--compare", default=None, help="Rapport de référence : échoue en cas de régression")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Hausse tolérée avant de signaler une régression")
+    args = parser.parse_args(argv)
+
+    if args.engine == "fake":
+        os.environ["STOCKFISH_PATH"] = FAKE_UCI_ENGINE
+        os.environ["FAKE_UCI_LATENCY_MS"] = str(args.fake_latency_ms)
+    from app.utils.pgn_utils import PGN_DIR
+    pgn_files = sorted(file for file in os.listdir(PGN_DIR) if file.endswith(".pgn"))
+    report = run_benchmark(pgn_files[:args.games] if args.games else None, modes=args.modes,
+                           scenarios=tuple(args.scenarios), max_moves=args.moves, defer=args.defer,
+                           allocations=not args.no_alloc)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_reports(report, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"⚠️ Régression : {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+import os
+
+# Les tests utilisent le moteur UCI factice et déterministe plutôt que Stockfish : la suite est
+# rapide, reproductible et s'exécute sur une machine sans Stockfish. `TEST_REAL_STOCKFISH=1`
+# garde le moteur désigné par STOCKFISH_PATH (ou détecté automatiquement).
+# Défini avant l'import de l'application : STOCKFISH_PATH est lu une fois au chargement d'`engine_utils`.
+FAKE_UCI_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_uci_engine.py")
+
+if os.environ.get("TEST_REAL_STOCKFISH") != "1":
+    os.environ["STOCKFISH_PATH"] = FAKE_UCI_ENGINE
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+    Moteur UCI factice et déterministe, utilisé à la place de Stockfish par les tests et
+    les mesures de débit (`STOCKFISH_PATH=tests/fake_uci_engine.py`).
+
+    Chaque coup légal est évalué sans recherche : bilan matériel après le coup, du point de
+    vue du camp qui le joue, plus un léger écart stable dérivé de la position et du coup (CRC32,
+    indépendant de `PYTHONHASHSEED`). Un mat en un est annoncé `mate 1`. Les mêmes positions
+    donnent donc toujours les mêmes lignes, sur toutes les machines.
+
+    La recherche est simulée par approfondissement itératif : les lignes de chaque profondeur
+    sont publiées l'une après l'autre, après un délai artificiel par profondeur, jusqu'à la
+    première limite atteinte (`depth`, `movetime`, `nodes`).
+
+    ###Options UCI (`setoption`) et variables d'environnement :
+
+        Latency / FAKE_UCI_LATENCY_MS : délai par profondeur, en millisecondes (0 par défaut).
+        Depth / FAKE_UCI_DEPTH : profondeur atteinte sans limite `depth` (15 par défaut).
+        EvalFile / FAKE_UCI_EVALS : fichier JSON d'évaluations imposées, par position :
+            {"<FEN>": {"e2e4": 35, "d2d4": "M3"}} (centipions ou mat, du point de vue du camp
+            au trait ; seuls les quatre premiers champs de la FEN sont comparés).
+"""
+import os
+import sys
+import json
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
+import chess
+
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 320, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+NODES_PER_DEPTH = 1000
+
+Score = Tuple[str, int]
+
+
+def position_key(fen: str) -> str:
+    """Position sans les compteurs de coups : placement, trait, roques, prise en passant."""
+    return " ".join(fen.split()[:4])
+
+
+def load_evals(path: Optional[str]) -> Dict[str, Dict[str, Union[int, str]]]:
+    """Charge les évaluations imposées (voir l'option `EvalFile`)."""
+    if not path:
+        return {}
+    with open(path) as f:
+        return {position_key(fen): moves for fen, moves in json.load(f).items()}
+
+
+def material(board: chess.Board, color: chess.Color) -> int:
+    """Bilan matériel du point de vue de `color`."""
+    return sum(value * (len(board.pieces(piece, color)) - len(board.pieces(piece, not color)))
+               for piece, value in PIECE_VALUES.items())
+
+
+def score_move(board: chess.Board, move: chess.Move, evals: Dict[str, Dict[str, Union[int, str]]]) -> Score:
+    """Évaluation d'un coup du point de vue du camp au trait : ("cp", centipions) ou ("mate", coups)."""
+    imposed = evals.get(position_key(board.fen()), {}).get(move.uci())
+    if isinstance(imposed, str) and imposed.upper().startswith("M"):
+        return ("mate", int(imposed[1:]))
+    if imposed is not None:
+        return ("cp", int(imposed))
+    mover = board.turn
+    board.push(move)
+    try:
+        if board.is_checkmate():
+            return ("mate", 1)
+        jitter = zlib.crc32(f"{board.fen()} {move.uci()}".encode()) % 21 - 10
+        return ("cp", material(board, mover) + jitter)
+    finally:
+        board.pop()
+
+
+def sort_key(scored: Tuple[chess.Move, Score]) -> Tuple[int, int]:
+    """Ordre des lignes : mats les plus courts d'abord, puis meilleures évaluations."""
+    kind, value = scored[1]
+    if kind == "mate":
+        return (2, -value) if value > 0 else (0, -value)
+    return (1, value)
+
+
+def parse_go(parts: List[str]) -> Dict[str, Union[int, List[str]]]:
+    """Lit les limites d'une commande `go` (depth, movetime, nodes) et les coups `searchmoves`."""
+    limits: Dict[str, Union[int, List[str]]] = {}
+    index = 1
+    while index < len(parts):
+        token = parts[index]
+        if token in ("depth", "movetime", "nodes", "multipv"):
+            limits[token] = int(parts[index + 1])
+            index += 2
+        elif token == "searchmoves":
+            limits["searchmoves"] = parts[index + 1:]
+            break
+        else:
+            index += 1
+    return limits
+
+
+class FakeEngine:
+    """État d'une session UCI : position courante et options."""
+
+    def __init__(self) -> None:
+        self.board = chess.Board()
+        self.multipv = 1
+        self.latency_ms = float(os.environ.get("FAKE_UCI_LATENCY_MS", 0))
+        self.depth = int(os.environ.get("FAKE_UCI_DEPTH", 15))
+        self.evals = load_evals(os.environ.get("FAKE_UCI_EVALS"))
+
+    def send(self, line: str) -> None:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    def uci(self) -> None:
+        self.send("id name FakeUCI")
+        self.send("id author ChessGrandMastersFootsteps")
+        self.send("option name MultiPV type spin default 1 min 1 max 500")
+        self.send("option name Hash type spin default 16 min 1 max 1024")
+        self.send("option name Threads type spin default 1 min 1 max 1")
+        self.send("option name Latency type spin default 0 min 0 max 60000")
+        self.send("option name Depth type spin default 15 min 1 max 99")
+        self.send("option name EvalFile type string default <empty>")
+        self.send("uciok")
+
+    def setoption(self, parts: List[str]) -> None:
+        if "name" not in parts or "value" not in parts:
+            return
+        name = " ".join(parts[parts.index("name") + 1:parts.index("value")]).lower()
+        value = " ".join(parts[parts.index("value") + 1:])
+        if name == "multipv":
+            self.multipv = int(value)
+        elif name == "latency":
+            self.latency_ms = float(value)
+        elif name == "depth":
+            self.depth = int(value)
+        elif name == "evalfile":
+            self.evals = load_evals(None if value == "<empty>" else value)
+
+    def position(self, parts: List[str]) -> None:
+        moves_at = parts.index("moves") if "moves" in parts else len(parts)
+        if parts[1] == "startpos":
+            self.board = chess.Board()
+        else:
+            self.board = chess.Board(" ".join(parts[2:moves_at]))
+        for uci in parts[moves_at + 1:]:
+            self.board.push_uci(uci)
+
+    def go(self, parts: List[str]) -> None:
+        limits = parse_go(parts)
+        moves = list(self.board.legal_moves)
+        searchmoves = limits.get("searchmoves")
+        if isinstance(searchmoves, list):
+            moves = [move for move in moves if move.uci() in searchmoves]
+        if not moves:
+            self.send("info depth 0 score " + ("mate 0" if self.board.is_checkmate() else "cp 0"))
+            self.send("bestmove (none)")
+            return
+
+        scored = sorted(((move, score_move(self.board, move, self.evals)) for move in moves), key=sort_key, reverse=True)
+        lines = scored[:max(1, self.multipv)]
+        max_depth = int(limits.get("depth", self.depth))  # type: ignore[arg-type]
+        movetime = limits.get("movetime")
+        max_nodes = limits.get("nodes")
+        started = time.monotonic()
+        for depth in range(1, max_depth + 1):
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000)
+            elapsed_ms = int((time.monotonic() - started) * 1000)
+            nodes = NODES_PER_DEPTH * depth
+            for rank, (move, (kind, value)) in enumerate(lines, start=1):
+                self.send(f"info depth {depth} seldepth {depth} multipv {rank} score {kind} {value} "
+                          f"nodes {nodes} nps {nodes * 1000 // max(1, elapsed_ms)} time {elapsed_ms} pv {move.uci()}")
+            # Arrêt avant une profondeur qui dépasserait le temps ou le nombre de nœuds accordés
+            if isinstance(movetime, int) and elapsed_ms + self.latency_ms > movetime:
+                break
+            if isinstance(max_nodes, int) and nodes + NODES_PER_DEPTH > max_nodes:
+                break
+        self.send(f"bestmove {lines[0][0].uci()}")
+
+    def run(self) -> None:
+        self.send("FakeUCI (moteur factice de test)")
+        for line in sys.stdin:
+            parts = line.split()
+            if not parts:
+                continue
+            command = parts[0]
+            if command == "uci":
+                self.uci()
+            elif command == "isready":
+                self.send("readyok")
+            elif command == "setoption":
+                self.setoption(parts)
+            elif command == "ucinewgame":
+                self.board = chess.Board()
+            elif command == "position":
+                self.position(parts)
+            elif command == "go":
+                self.go(parts)
+            elif command == "quit":
+                break
+
+
+if __name__ == "__main__":
+    FakeEngine().run()
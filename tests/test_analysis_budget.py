@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+import chess.engine
+from app.services.analysis_service import analyse_position
+from app.utils import analysis_budget
+from app.utils.analysis_budget import AnalysisBudget, get_analysis_budget
+from app.utils.engine_utils import search_iteratively
+from app.utils.eval_cache import get_evaluation_cache
+
+
+def fake_info(uci, cp, depth, multipv=1, **extra):
+    """Ligne publiée par le moteur à une profondeur donnée."""
+    info = {"depth": depth, "multipv": multipv, "pv": [chess.Move.from_uci(uci)],
+            "score": chess.engine.PovScore(chess.engine.Cp(cp), chess.WHITE)}
+    info.update(extra)
+    return info
+
+
+class FakeEngine:
+    """Moteur publiant une suite de lignes, interrompue à l'expiration du budget."""
+
+    def __init__(self, infos):
+        self.infos = infos
+        self.limits = []
+
+    @contextmanager
+    def analysis(self, board, limit, multipv=None, root_moves=None):
+        self.limits.append(limit)
+        yield iter(self.infos)
+
+
+class TestAnalysisBudget(unittest.TestCase):
+
+    def setUp(self):
+        get_evaluation_cache().clear()
+        analysis_budget._budgets.clear()
+
+    def test_budget_limits_search_and_deadline(self):
+        """La durée d'une recherche est plafonnée par le temps restant avant l'échéance."""
+        budget = AnalysisBudget(movetime=1.0, nodes=5000, deadline=0.5, min_depth=20)
+        self.assertEqual(budget.min_depth, budget.depth)
+        limit = budget.limit(budget.start())
+        self.assertEqual((limit.depth, limit.nodes), (15, 5000))
+        self.assertLessEqual(limit.time, 0.5)
+        # Échéance dépassée : le moteur garde un temps minimal pour rendre un résultat
+        self.assertEqual(budget.limit(0.0).time, analysis_budget.MIN_SEARCH_TIME)
+        self.assertFalse(AnalysisBudget().is_bounded)
+        self.assertIsNone(AnalysisBudget().limit().time)
+
+    def test_budget_per_mode_can_be_overridden(self):
+        """Chaque mode a son budget, redéfinissable par variable d'environnement."""
+        self.assertLess(get_analysis_budget("30sec").deadline, get_analysis_budget("3min").deadline)
+        self.assertFalse(get_analysis_budget(None).is_bounded)
+        with patch.dict(os.environ, {"ANALYSIS_BUDGET_30SEC": "movetime=0.1,nodes=20000,deadline=none"}):
+            analysis_budget._budgets.clear()
+            budget = get_analysis_budget("30sec")
+        self.assertEqual((budget.movetime, budget.nodes, budget.deadline), (0.1, 20000, None))
+        self.assertEqual(budget.min_depth, analysis_budget.ANALYSIS_BUDGETS["30sec"].min_depth)
+        with self.assertRaises(ValueError):
+            AnalysisBudget.parse("temps=1")
+
+    def test_iterative_search_keeps_deepest_complete_iteration(self):
+        """Une itération interrompue par le budget est ignorée au profit de la précédente."""
+        engine = FakeEngine([
+            fake_info("e2e4", 30, 1), fake_info("d2d4", 20, 1, multipv=2),
+            fake_info("d2d4", 35, 2), fake_info("e2e4", 25, 2, multipv=2),
+            {"depth": 3, "currmove": chess.Move.from_uci("c2c4")},
+            fake_info("c2c4", 40, 3, lowerbound=True),
+            fake_info("g1f3", 38, 3),
+        ])
+        infos = search_iteratively(engine, chess.Board(), chess.engine.Limit(time=0.1), multipv=2)
+        self.assertEqual([(info["depth"], info["pv"][0].uci()) for info in infos], [(2, "d2d4"), (2, "e2e4")])
+        # Recherche restreinte à un coup : une seule ligne suffit pour qu'une itération soit complète
+        infos = search_iteratively(engine, chess.Board(), chess.engine.Limit(time=0.1), multipv=2,
+                                   root_moves=[chess.Move.from_uci("g1f3")])
+        self.assertEqual(infos[0]["depth"], 3)
+
+    @patch('app.services.analysis_service.analyse_board')
+    def test_analysis_reports_reached_depth_and_reuse_respects_min_depth(self, mock_analyse_board):
+        """L'analyse indique la profondeur atteinte ; un budget plus exigeant ne réutilise pas une analyse trop courte."""
+        mock_analyse_board.return_value = [fake_info("e2e4", 30, 9), fake_info("d2d4", 20, 9, multipv=2),
+                                           fake_info("g1f3", 15, 9, multipv=3)]
+        fast = AnalysisBudget(movetime=0.1, min_depth=6)
+        analysis = analyse_position(chess.Board(), budget=fast)
+        self.assertEqual(analysis.depth, 9)
+        self.assertIs(mock_analyse_board.call_args.kwargs["budget"], fast)
+
+        # Même mode : l'analyse en cache (profondeur 9 >= 6) est réutilisée
+        self.assertEqual(analyse_position(chess.Board(), budget=fast).depth, 9)
+        self.assertEqual(mock_analyse_board.call_count, 1)
+
+        # Mode plus exigeant : nouvelle recherche
+        mock_analyse_board.return_value = [fake_info("e2e4", 32, 14), fake_info("d2d4", 22, 14, multipv=2),
+                                           fake_info("g1f3", 12, 14, multipv=3)]
+        self.assertEqual(analyse_position(chess.Board(), budget=AnalysisBudget(movetime=1.0, min_depth=12)).depth, 14)
+        self.assertEqual(mock_analyse_board.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
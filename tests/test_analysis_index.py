@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import json
+import chess
+from app.utils import analysis_index
+from app.utils.analysis_index import AnalysisIndex, encode_lines
+from app.services.analysis_service import PositionAnalysis, analyse_position
+from app.utils.engine_utils import format_move_info
+from build_analysis_index import build_analysis_index
+from app.utils.eval_cache import get_evaluation_cache
+
+
+class TestAnalysisIndex(unittest.TestCase):
+
+    def setUp(self):
+        get_evaluation_cache().clear()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmp_dir.name, "index.json")
+        self.board = chess.Board()
+
+        index = AnalysisIndex(depth=15, num_top_moves=3)
+        lines = [
+            {"uci": "e2e4", "evaluation": {"type": "cp", "value": 35}},
+            {"uci": "d2d4", "evaluation": {"type": "cp", "value": 30}},
+            {"uci": "g1f3", "evaluation": {"type": "cp", "value": 25}},
+        ]
+        extra = [{"uci": "b2b3", "evaluation": {"type": "cp", "value": 5}}]
+        index.add(self.board, lines, extra)
+        index.save(self.index_path)
+
+        self.env_patcher = patch.dict(os.environ, {"ANALYSIS_INDEX_PATH": self.index_path})
+        self.env_patcher.start()
+        analysis_index.reset_analysis_index()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        analysis_index.reset_analysis_index()
+        self.tmp_dir.cleanup()
+
+    def test_save_and_load_round_trip(self):
+        """L'index relu depuis le disque retrouve les coups par hachage de position."""
+        index = AnalysisIndex.load(self.index_path)
+        self.assertEqual(len(index), 1)
+        self.assertIn(self.board, index)
+        entry = index.lookup(self.board)
+        self.assertEqual([line["uci"] for line in entry["lines"]], ["e2e4", "d2d4", "g1f3"])
+        self.assertEqual(entry["extra"][0]["evaluation"], {"type": "cp", "value": 5})
+
+    @patch('app.services.analysis_service.analyse_board')
+    def test_indexed_position_does_not_call_engine(self, mock_analyse_board):
+        """Une position indexée est servie sans moteur, y compris pour le coup du maître."""
+        analysis = analyse_position(self.board, moves=["b2b3"])
+        mock_analyse_board.assert_not_called()
+        self.assertEqual([m["san"] for m in analysis.best_moves], ["e4", "d4", "Nf3"])
+        self.assertEqual(analysis.get_evaluation("b2b3")["value"], 5)
+
+    @patch('app.services.analysis_service.analyse_board')
+    def test_uncovered_player_move_uses_engine(self, mock_analyse_board):
+        """Seul un coup absent de l'index déclenche une recherche (restreinte à ce coup)."""
+        mock_analyse_board.return_value = []
+        analyse_position(self.board, moves=["a2a3"])
+        mock_analyse_board.assert_called_once()
+        self.assertEqual(mock_analyse_board.call_args.kwargs["root_moves"], [chess.Move.from_uci("a2a3")])
+
+
+class TestBuildAnalysisIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp_dir.name, "partie.pgn"), "w") as pgn:
+            pgn.write('[Event "Test"]\n[White "A"]\n[Black "B"]\n\n1. e4 e5 2. Nf3 *\n')
+        self.output = os.path.join(self.tmp_dir.name, "index.json")
+        self.checkpoint = f"{self.output}.checkpoint"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def fake_analysis(board, moves, **kwargs):
+        """Analyse factice : le premier coup légal et les coups demandés, évalués à 0."""
+        board = chess.Board(board.fen())
+        analysis = PositionAnalysis(board.fen(), [format_move_info(board, next(iter(board.legal_moves)), {"type": "cp", "value": 0})])
+        analysis.add_lines([format_move_info(board, chess.Move.from_uci(uci), {"type": "cp", "value": 0}) for uci in moves])
+        return analysis
+
+    @patch('build_analysis_index.analyse_position')
+    def test_interrupted_build_resumes_from_checkpoint(self, mock_analyse_position):
+        """Les positions enregistrées au point de contrôle ne sont pas réanalysées."""
+        mock_analyse_position.side_effect = self.fake_analysis
+        start = chess.Board()
+        with open(self.checkpoint, "w") as log:
+            log.write(json.dumps({"depth": 15, "num_top_moves": 3}) + "\n")
+            resumed = self.fake_analysis(start, ["e2e4"])
+            log.write(json.dumps({"fen": start.fen(), "lines": encode_lines(resumed.lines),
+                                  "extra": encode_lines(resumed.extra_lines())}) + "\n")
+            log.write('{"fen": "tronqu')  # Interruption pendant l'écriture
+
+        index = build_analysis_index(self.tmp_dir.name, output=self.output, depth=15, num_top_moves=3)
+        self.assertEqual(mock_analyse_position.call_count, 2)
+        self.assertNotIn(start.fen(), [call.args[0].fen() for call in mock_analyse_position.call_args_list])
+        self.assertEqual(len(index), 3)
+        self.assertEqual(len(AnalysisIndex.load(self.output)), 3)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        # Index complet : aucun nouveau calcul
+        build_analysis_index(self.tmp_dir.name, output=self.output, depth=15, num_top_moves=3)
+        self.assertEqual(mock_analyse_position.call_count, 2)
+
+    @patch('build_analysis_index.analyse_position')
+    def test_checkpoint_with_other_settings_is_ignored(self, mock_analyse_position):
+        """Un point de contrôle écrit avec une autre profondeur n'est pas repris."""
+        mock_analyse_position.side_effect = self.fake_analysis
+        with open(self.checkpoint, "w") as log:
+            log.write(json.dumps({"depth": 20, "num_top_moves": 3}) + "\n")
+            log.write(json.dumps({"fen": chess.Board().fen(), "lines": [["e2e4", "cp", 0]], "extra": []}) + "\n")
+        build_analysis_index(self.tmp_dir.name, output=self.output, depth=15, num_top_moves=3)
+        self.assertEqual(mock_analyse_position.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
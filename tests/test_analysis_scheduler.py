@@ -0,0 +1,113 @@
+import unittest
+import os
+import sys
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.analysis_scheduler import AnalysisOverloaded, AnalysisScheduler, analysis_context
+
+
+class TestAnalysisScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.order = []
+        self.threads = []
+
+    def hold(self, scheduler, session=None):
+        """Occupe l'unique place de l'ordonnanceur ; retourne le gestionnaire à refermer."""
+        with analysis_context(session=session):
+            holder = scheduler.slot()
+            slot = holder.__enter__()
+        return holder, slot
+
+    def enqueue(self, scheduler, label, deadline_at=None, **context):
+        """Lance une recherche dans un thread et attend qu'elle soit en file."""
+        waiting = scheduler.stats()['waiting']
+
+        def run():
+            with analysis_context(**context):
+                try:
+                    with scheduler.slot(deadline_at) as slot:
+                        self.order.append((label, slot.degraded))
+                except AnalysisOverloaded:
+                    self.order.append((label, "rejected"))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+        while scheduler.stats()['waiting'] == waiting:
+            time.sleep(0.001)
+
+    def release(self, holder):
+        holder.__exit__(None, None, None)
+        for thread in self.threads:
+            thread.join(5)
+
+    def test_priority_classes_then_deadline(self):
+        """Parties chronométrées (échéance la plus proche d'abord), puis parties à vies, puis arrière-plan."""
+        scheduler = AnalysisScheduler(1)
+        holder, _ = self.hold(scheduler)
+        now = time.monotonic()
+        self.enqueue(scheduler, "lookahead", background=True)
+        self.enqueue(scheduler, "lives")
+        self.enqueue(scheduler, "3min", deadline_at=now + 60)
+        self.enqueue(scheduler, "30sec", deadline_at=now + 30)
+        self.release(holder)
+        self.assertEqual([label for label, _ in self.order], ["30sec", "3min", "lives", "lookahead"])
+
+    def test_sessions_are_served_fairly(self):
+        """Une partie qui a déjà une recherche en file passe après une partie qui n'en a pas."""
+        scheduler = AnalysisScheduler(1)
+        holder, _ = self.hold(scheduler)
+        self.enqueue(scheduler, "a1", session="a")
+        self.enqueue(scheduler, "a2", session="a")
+        self.enqueue(scheduler, "b1", session="b")
+        self.release(holder)
+        self.assertEqual([label for label, _ in self.order], ["a1", "b1", "a2"])
+
+    def test_admission_is_refused_when_saturated(self):
+        """File pleine ou partie trop gourmande : refus avec un délai `retry_after`, sans rien mettre en file."""
+        scheduler = AnalysisScheduler(1, max_queue=1, max_per_session=1)
+        holder, _ = self.hold(scheduler, session="a")
+        scheduler.admit("b")
+        with self.assertRaises(AnalysisOverloaded) as refused:
+            scheduler.admit("a")
+        self.assertGreaterEqual(refused.exception.retry_after, 1)
+        self.assertEqual(refused.exception.status_code, 503)
+        self.enqueue(scheduler, "b1", session="b")
+        with self.assertRaises(AnalysisOverloaded):
+            scheduler.admit("c")
+        self.release(holder)
+        scheduler.admit("c")
+        self.assertEqual(scheduler.stats()['rejected'], {"queue": 1, "session": 1, "background": 0})
+
+    def test_searches_degrade_then_background_is_shed(self):
+        """Au-delà de `degrade_at` les recherches sont raccourcies ; file pleine, l'arrière-plan est abandonné."""
+        scheduler = AnalysisScheduler(1, max_queue=2, degrade_at=1)
+        holder, slot = self.hold(scheduler)
+        self.assertFalse(slot.degraded)
+        self.enqueue(scheduler, "first")
+        self.enqueue(scheduler, "second")
+        with analysis_context(background=True):
+            with self.assertRaises(AnalysisOverloaded):
+                with scheduler.slot():
+                    pass
+        self.release(holder)
+        self.assertEqual(self.order, [("first", False), ("second", True)])
+        self.assertFalse(scheduler.saturated())
+        self.assertEqual(scheduler.stats()['degraded'], 1)
+
+    def test_promote_waited_background_search(self):
+        """Une analyse d'arrière-plan attendue par un joueur passe devant les autres."""
+        scheduler = AnalysisScheduler(1)
+        holder, _ = self.hold(scheduler)
+        self.enqueue(scheduler, "x", background=True, tag="x")
+        self.enqueue(scheduler, "y", background=True, tag="y")
+        self.assertEqual(scheduler.promote("y"), 1)
+        self.assertEqual(scheduler.promote("unknown"), 0)
+        self.release(holder)
+        self.assertEqual([label for label, _ in self.order], ["y", "x"])
+
+
+if __name__ == '__main__':
+    unittest.main()
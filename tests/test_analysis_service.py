@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+import chess.engine
+from app.services.analysis_service import analyse_position, complete_analysis, _analysis_flights
+from app.utils.eval_cache import get_evaluation_cache
+
+
+def fake_info(uci, cp, turn=chess.WHITE):
+    """Construit une ligne multi-PV telle que retournée par python-chess."""
+    return {"pv": [chess.Move.from_uci(uci)], "score": chess.engine.PovScore(chess.engine.Cp(cp), turn)}
+
+
+class TestAnalysisService(unittest.TestCase):
+
+    def setUp(self):
+        get_evaluation_cache().clear()
+        self.board = chess.Board()
+        self.top_lines = [fake_info("e2e4", 35), fake_info("d2d4", 30), fake_info("g1f3", 25)]
+
+    @patch('app.services.analysis_service.analyse_board')
+    def test_single_search_when_moves_are_in_top_lines(self, mock_analyse_board):
+        """Le coup du maître présent dans les lignes principales ne relance pas le moteur."""
+        mock_analyse_board.return_value = self.top_lines
+        analysis = analyse_position(self.board, moves=[chess.Move.from_uci("d2d4")])
+
+        self.assertEqual(mock_analyse_board.call_count, 1)
+        self.assertEqual([m["uci"] for m in analysis.best_moves], ["e2e4", "d2d4", "g1f3"])
+        self.assertEqual(analysis.get_evaluation("d2d4")["value"], 30)
+        self.assertEqual(analysis.best_moves[0]["relative_strength"], 100)
+
+    @patch('app.services.analysis_service.analyse_board')
+    def test_missing_moves_use_restricted_search(self, mock_analyse_board):
+        """Les coups hors des lignes principales sont évalués par une recherche `searchmoves`."""
+        mock_analyse_board.side_effect = [self.top_lines, [fake_info("a2a3", -10)]]
+        analysis = analyse_position(self.board, moves=["a2a3", "e2e4"])
+
+        self.assertEqual(mock_analyse_board.call_count, 2)
+        restricted_call = mock_analyse_board.call_args_list[1]
+        self.assertEqual(restricted_call.kwargs["root_moves"], [chess.Move.from_uci("a2a3")])
+        self.assertEqual(analysis.get_evaluation("a2a3"), {"type": "cp", "value": -10, "display_score": "-0.1"})
+        # Le coup restreint ne fait pas partie des suggestions
+        self.assertNotIn("a2a3", [m["uci"] for m in analysis.best_moves])
+
+    @patch('app.services.analysis_service.analyse_board')
+    def test_all_moves_are_scored_by_one_search(self, mock_analyse_board):
+        """Avec `all_moves`, le premier coup manquant fait noter tous les coups légaux ; les suivants sont lus."""
+        def search(*args, **kwargs):
+            if kwargs.get("root_moves"):
+                return [fake_info(move.uci(), -5) for move in kwargs["root_moves"]]
+            return self.top_lines
+
+        mock_analyse_board.side_effect = search
+        analysis = analyse_position(self.board)
+        complete_analysis(analysis, self.board, ["a2a3"], all_moves=True)
+        complete_analysis(analysis, self.board, ["h2h4", "b1c3"], all_moves=True)
+
+        self.assertEqual(mock_analyse_board.call_count, 2)
+        self.assertEqual(len(mock_analyse_board.call_args.kwargs["root_moves"]), 17)
+        self.assertTrue(analysis.table.is_complete)
+        self.assertEqual(analysis.get_evaluations(["h2h4", "e2e4"]),
+                         [{"type": "cp", "value": -5, "display_score": "-0.05"},
+                          {"type": "cp", "value": 35, "display_score": "0.35"}])
+        self.assertEqual(len(analysis.to_record()["extra"]), 17)
+
+    @patch('app.services.analysis_service.analyse_board')
+    def test_evaluations_are_from_white_point_of_view(self, mock_analyse_board):
+        """Comme evaluate_move_strength, les scores sont exprimés du point de vue des blancs."""
+        board = chess.Board()
+        board.push_uci("e2e4")
+        mock_analyse_board.return_value = [fake_info("e7e5", 20, turn=chess.BLACK)]
+        analysis = analyse_position(board)
+        self.assertEqual(analysis.get_evaluation("e7e5")["value"], -20)
+
+    @patch('app.services.analysis_service.analyse_board')
+    def test_concurrent_analyses_share_one_search(self, mock_analyse_board):
+        """Des analyses simultanées de la même position attendent une seule recherche multi-PV."""
+        release = threading.Event()
+
+        def search(*args, **kwargs):
+            if kwargs.get("root_moves"):
+                return [fake_info(move.uci(), -10) for move in kwargs["root_moves"]]
+            release.wait(5)
+            return self.top_lines
+
+        mock_analyse_board.side_effect = search
+        shared_before = _analysis_flights.stats()['shared']
+        analyses = []
+        threads = [threading.Thread(target=lambda move=move: analyses.append(
+            analyse_position(chess.Board(), moves=[move], use_index=False))) for move in ("e2e4", "a2a3", "h2h3")]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while _analysis_flights.stats()['shared'] < shared_before + 2 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        multipv_calls = [call for call in mock_analyse_board.call_args_list if not call.kwargs.get("root_moves")]
+        self.assertEqual(len(multipv_calls), 1)
+        self.assertEqual(len(analyses), 3)
+        for analysis in analyses:
+            self.assertEqual([m["uci"] for m in analysis.best_moves], ["e2e4", "d2d4", "g1f3"])
+        # Chaque appelant complète sa propre copie avec ses coups
+        self.assertEqual(sorted(len(analysis.move_infos) for analysis in analyses), [3, 4, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+import chess.engine
+from app.utils.async_engine import AsyncEngineClient
+from app.utils.engine_pool import EnginePool
+from app.utils.engine_utils import analyse_board
+from app.utils.analysis_budget import AnalysisBudget
+
+FAKE_UCI_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_uci_engine.py")
+
+POSITIONS = [
+    chess.STARTING_FEN,
+    "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1",
+    "rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+]
+
+
+class TestAsyncEngineClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = AsyncEngineClient(FAKE_UCI_ENGINE, size=2)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_results_match_the_synchronous_pool(self):
+        """Les analyses du client asynchrone sont celles du pool synchrone, dans l'ordre des demandes."""
+        limit = chess.engine.Limit(depth=6)
+        results = self.client.analyse_many([(chess.Board(fen), limit, {"multipv": 3}) for fen in POSITIONS])
+        pool = EnginePool(FAKE_UCI_ENGINE, size=1)
+        try:
+            with pool.engine() as engine:
+                expected = [engine.analyse(chess.Board(fen), limit, multipv=3) for fen in POSITIONS]
+        finally:
+            pool.close()
+        self.assertEqual([[info["pv"][0] for info in infos] for infos in results],
+                         [[info["pv"][0] for info in infos] for infos in expected])
+        self.assertEqual(results[0][0]["depth"], 6)
+
+    def test_analyses_are_multiplexed_on_the_engines(self):
+        """Quatre recherches sur deux moteurs prennent deux fois la durée d'une recherche, pas quatre."""
+        client = AsyncEngineClient(FAKE_UCI_ENGINE, size=2)
+        try:
+            # Lancer les deux moteurs (avec un délai par profondeur) avant de mesurer
+            with patch.dict(os.environ, {"FAKE_UCI_LATENCY_MS": "50"}):
+                client.analyse_many([(chess.Board(), chess.engine.Limit(depth=1), {}) for _ in range(2)])
+            started = time.monotonic()
+            results = client.analyse_many([(chess.Board(fen), chess.engine.Limit(depth=3), {}) for fen in POSITIONS])
+            elapsed = time.monotonic() - started
+            stats = client.stats()
+        finally:
+            client.close()
+        self.assertTrue(all(info["depth"] == 3 for info in results))
+        self.assertGreaterEqual(elapsed, 2 * 3 * 0.05)
+        self.assertLess(elapsed, 4 * 3 * 0.05)
+        self.assertEqual((stats['spawned'], stats['in_use'], stats['waiting'], stats['checkouts']), (2, 0, 0, 6))
+
+    def test_iterative_search_within_a_time_limit(self):
+        """Une recherche bornée par le temps retient la dernière profondeur complète de chaque ligne."""
+        with patch.dict(os.environ, {"FAKE_UCI_LATENCY_MS": "20"}):
+            client = AsyncEngineClient(FAKE_UCI_ENGINE, size=1)
+            try:
+                infos = client.analyse(chess.Board(), chess.engine.Limit(depth=15, time=0.1), multipv=2, iterative=True)
+            finally:
+                client.close()
+        self.assertEqual(len(infos), 2)
+        self.assertEqual(infos[0]["depth"], infos[1]["depth"])
+        self.assertLess(infos[0]["depth"], 15)
+
+    def test_analyse_board_uses_the_async_client(self):
+        """Avec ENGINE_CLIENT=async, `analyse_board` passe par le client asynchrone du processus."""
+        budget = AnalysisBudget(depth=15, movetime=0.05)
+        with patch.dict(os.environ, {"ENGINE_CLIENT": "async"}), \
+                patch("app.utils.async_engine.get_async_engine_client", return_value=self.client):
+            infos = analyse_board(chess.Board(), multipv=3, budget=budget, deadline_at=budget.start())
+            info = analyse_board(chess.Board(), depth=4)
+        self.assertEqual(len(infos), 3)
+        self.assertEqual(info["depth"], 4)
+        self.assertGreater(self.client.stats()['checkouts'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
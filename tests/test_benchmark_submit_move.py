@@ -0,0 +1,38 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tests.benchmark_submit_move import compare_reports, percentile, run_benchmark
+
+
+class TestSubmitMoveBenchmark(unittest.TestCase):
+
+    def test_report_covers_each_mode_and_scenario(self):
+        """Le rapport donne latence, appels au moteur, allocations, octets FEN et taille des réponses par mode et scénario."""
+        report = run_benchmark(pgn_files=["test.pgn"], modes=["ChessGameNormal"], scenarios=("correct", "attempts"),
+                               sides=("white",), max_moves=2)
+        self.assertEqual(sorted(report["results"]), ["ChessGameNormal/attempts", "ChessGameNormal/correct"])
+        correct, attempts = report["results"]["ChessGameNormal/correct"], report["results"]["ChessGameNormal/attempts"]
+        self.assertEqual(correct["moves"], 2)
+        self.assertEqual(attempts["moves"], 6)  # Deux essais faux puis le coup du maître, pour deux coups
+        self.assertGreater(correct["engine_calls_per_move"], 0)
+        self.assertGreater(correct["fen_bytes_per_move"], 0)
+        self.assertLess(correct["compact_bytes_per_move"], correct["json_bytes_per_move"])
+        self.assertLessEqual(correct["latency_ms"]["p50"], correct["latency_ms"]["p99"])
+        self.assertGreater(correct["alloc_kib"]["max"], 0)
+        self.assertEqual(report["engine"], "fake")
+
+    def test_compare_flags_regressions(self):
+        """Une hausse de latence ou d'appels au moteur au-delà du seuil est signalée."""
+        def report(p95, calls):
+            return {"results": {"ChessGame/correct": {
+                "latency_ms": {"p50": 10.0, "p95": p95, "p99": 30.0}, "engine_calls_per_move": calls}}}
+        self.assertEqual(compare_reports(report(21.0, 2.0), report(20.0, 2.0)), [])
+        regressions = compare_reports(report(30.0, 3.0), report(20.0, 2.0))
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("latency_ms.p95", regressions[0])
+        self.assertEqual(percentile([1.0, 2.0, 3.0, 4.0], 0.5), 2.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import os
+import sys
+import gzip
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.compact_response import (
+    FLAG_BOOK, GZIP_MIN_BYTES, ResponseStates, compact_response, compact_result, encode_body
+)
+from app.utils.move_scores import MATE_SCORE
+
+
+def best_moves(*moves):
+    return [{"uci": uci, "san": san, "evaluation": evaluation, "display_score": "…", "relative_strength": strength}
+            for uci, san, evaluation, strength in moves]
+
+
+FIRST = {
+    "is_correct": True,
+    "board_fen": "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "score": 10,
+    "move_evaluation": {"type": "cp", "value": 35, "display": "0.35 pions", "book": True},
+    "best_moves": best_moves(("g1f3", "Nf3", {"type": "cp", "value": 40}, 100.0),
+                             ("f1c4", "Bc4", {"type": "cp", "value": 25}, 92.5)),
+    "previous_position_best_moves": best_moves(("e2e4", "e4", {"type": "cp", "value": 35}, 100.0)),
+    "hint": "Pensez au centre",
+}
+
+
+def apply(state, payload, known):
+    """Reconstitue l'état du client à partir d'une réponse compacte (comme le ferait le JavaScript)."""
+    if "b" not in payload:
+        state = {}
+    else:
+        state = dict(known[payload["b"]])
+        for key in payload.get("x", []):
+            state.pop(key, None)
+        for key, source in payload.get("r", {}).items():
+            state[key] = known[payload["b"]][source]
+    state.update({key: value for key, value in payload.items() if len(key) > 1})
+    known[payload["i"]] = state
+    return state
+
+
+class TestCompactResponse(unittest.TestCase):
+
+    def test_result_uses_short_keys_and_integer_scores(self):
+        """Clés courtes, scores entiers et force arrondie ; chaînes d'affichage supprimées."""
+        state = compact_result(dict(FIRST, previous_position_best_moves=best_moves(
+            ("d1h5", "Qh5#", {"type": "mate", "value": 0}, 100.0))), white_to_move=True)
+        self.assertEqual(state["ok"], True)
+        self.assertEqual(state["me"], [35, FLAG_BOOK])
+        self.assertEqual(state["bm"], [["g1f3", "Nf3", 40, 100], ["f1c4", "Bc4", 25, 92]])
+        self.assertEqual(state["pb"], [["d1h5", "Qh5#", MATE_SCORE, 100]])
+        self.assertNotIn("display_score", json.dumps(state))
+
+    def test_delta_rebuilds_the_full_state(self):
+        """Après accusé de réception, seuls les champs modifiés sont envoyés ; le client reconstitue l'état."""
+        states = ResponseStates()
+        known = {}
+        first = compact_response(states, "g1", FIRST, True)
+        self.assertNotIn("b", first)
+        client = apply({}, first, known)
+
+        second_result = dict(FIRST, score=20, board_fen="r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+                             previous_position_best_moves=FIRST["best_moves"],
+                             best_moves=best_moves(("f1b5", "Bb5", {"type": "cp", "value": 30}, 100.0)))
+        del second_result["hint"]
+        second = compact_response(states, "g1", second_result, True, ack=first["i"])
+        self.assertEqual(second["b"], first["i"])
+        self.assertEqual(second["r"], {"pb": "bm"})
+        self.assertEqual(second["x"], ["hi"])
+        self.assertNotIn("ok", second)
+        client = apply(client, second, known)
+        self.assertEqual(client, compact_result(second_result, True))
+        self.assertLess(len(json.dumps(second)), len(json.dumps(first)))
+
+        # État accusé inconnu (autre worker, redémarrage) : réponse complète
+        third = compact_response(ResponseStates(), "g1", second_result, True, ack=second["i"])
+        self.assertNotIn("b", third)
+        self.assertEqual(apply(client, third, known), compact_result(second_result, True))
+
+        # Partie terminée ou supprimée : ses états sont oubliés
+        states.discard("g1")
+        self.assertEqual(len(states), 0)
+        self.assertNotIn("b", compact_response(states, "g1", second_result, True, ack=second["i"]))
+
+    def test_large_bodies_are_gzipped(self):
+        """Le corps est compressé si le client l'accepte et qu'il dépasse le seuil."""
+        payload = dict(compact_response(ResponseStates(), "g1", FIRST, True), co="x" * GZIP_MIN_BYTES)
+        body, headers = encode_body(payload, accept_gzip=True)
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(body)), payload)
+        body, headers = encode_body(payload, accept_gzip=False)
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(json.loads(body), payload)
+        # Une petite différence n'est pas compressée
+        body, headers = encode_body({"v": 1, "i": "a.1", "b": "a.0", "sc": 20}, accept_gzip=True)
+        self.assertNotIn("Content-Encoding", headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess.engine
+from app.utils.engine_pool import EnginePool, EnginePoolExhausted
+
+
+class FakeEngine:
+    """Moteur factice : compte les pings et peut simuler un plantage."""
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def ping(self):
+        if not self.alive:
+            raise chess.engine.EngineTerminatedError("engine process died")
+
+    def quit(self):
+        self.closed = True
+
+
+class TestEnginePool(unittest.TestCase):
+
+    def setUp(self):
+        self.created = []
+
+        def factory():
+            engine = FakeEngine()
+            self.created.append(engine)
+            return engine
+
+        self.pool = EnginePool("fake", size=2, engine_factory=factory, checkout_timeout=0.1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_engine_is_reused(self):
+        """Un moteur rendu est réutilisé au lieu d'en lancer un nouveau."""
+        with self.pool.engine() as first:
+            pass
+        with self.pool.engine() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(self.pool.stats()['checkouts'], 2)
+
+    def test_pool_size_is_bounded(self):
+        """Au-delà de `size` emprunts simultanés, le pool attend puis abandonne."""
+        a = self.pool.checkout()
+        b = self.pool.checkout()
+        self.assertIsNot(a, b)
+        with self.assertRaises(EnginePoolExhausted):
+            self.pool.checkout()
+        self.pool.checkin(a)
+        self.assertIs(self.pool.checkout(), a)
+
+    def test_crashed_idle_engine_is_restarted(self):
+        """Un moteur inactif qui ne répond plus est remplacé lors de l'emprunt suivant."""
+        with self.pool.engine() as engine:
+            pass
+        engine.alive = False
+        with self.pool.engine() as replacement:
+            self.assertIsNot(replacement, engine)
+        self.assertTrue(engine.closed)
+        self.assertEqual(self.pool.stats()['restarts'], 1)
+
+    def test_engine_failing_during_analysis_is_discarded(self):
+        """Une erreur moteur pendant l'utilisation ferme le moteur et libère sa place."""
+        with self.assertRaises(chess.engine.EngineTerminatedError):
+            with self.pool.engine() as engine:
+                raise chess.engine.EngineTerminatedError("crash")
+        self.assertTrue(engine.closed)
+        stats = self.pool.stats()
+        self.assertEqual(stats['spawned'], 0)
+        self.assertEqual(stats['in_use'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
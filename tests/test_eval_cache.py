@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+import chess.engine
+from app.utils.engine_utils import evaluate_position
+from app.utils.eval_cache import EvaluationCache, get_evaluation_cache
+
+
+class TestEvaluationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.board = chess.Board()
+        self.after_e4 = chess.Board()
+        self.after_e4.push_uci("e2e4")
+
+    def test_hit_and_miss_counters(self):
+        """Les succès et défauts de cache sont comptés séparément."""
+        cache = EvaluationCache(max_entries=10)
+        self.assertIsNone(cache.get(self.board, 15))
+        cache.set(self.board, 15, {"type": "cp", "value": 20})
+        self.assertEqual(cache.get(self.board, 15), {"type": "cp", "value": 20})
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_key_includes_depth_and_kind(self):
+        """Une même position à une autre profondeur ou d'un autre type est une autre entrée."""
+        cache = EvaluationCache(max_entries=10)
+        cache.set(self.board, 15, {"type": "cp", "value": 20})
+        self.assertIsNone(cache.get(self.board, 10))
+        self.assertIsNone(cache.get(self.board, 15, kind="analysis"))
+
+    def test_lru_eviction(self):
+        """Au-delà de max_entries, l'entrée la moins récemment utilisée est évincée."""
+        cache = EvaluationCache(max_entries=1)
+        cache.set(self.board, 15, 1)
+        cache.set(self.after_e4, 15, 2)
+        self.assertIsNone(cache.get(self.board, 15))
+        self.assertEqual(cache.get(self.after_e4, 15), 2)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl_expiry(self):
+        """Une entrée plus ancienne que le TTL est ignorée."""
+        cache = EvaluationCache(max_entries=10, ttl=60)
+        with patch('app.utils.eval_cache.time.time', return_value=1000.0):
+            cache.set(self.board, 15, 1)
+        with patch('app.utils.eval_cache.time.time', return_value=1030.0):
+            self.assertEqual(cache.get(self.board, 15), 1)
+        with patch('app.utils.eval_cache.time.time', return_value=1100.0):
+            self.assertIsNone(cache.get(self.board, 15))
+
+    def test_sqlite_tier_survives_restart(self):
+        """Les entrées écrites dans la base SQLite sont relues par un nouveau cache."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "cache.sqlite")
+            EvaluationCache(db_path=db_path).set(self.board, 15, {"type": "mate", "value": -3})
+            restarted = EvaluationCache(db_path=db_path)
+            self.assertEqual(restarted.get(self.board, 15), {"type": "mate", "value": -3})
+            self.assertEqual(restarted.stats()['sqlite_hits'], 1)
+
+    def test_shallow_searches_are_not_cached(self):
+        """Une recherche dégradée (profondeur non atteinte) n'est pas servie ensuite comme une évaluation complète."""
+        get_evaluation_cache().clear()
+        score = chess.engine.PovScore(chess.engine.Cp(30), chess.WHITE)
+        with patch('app.utils.engine_utils.analyse_board', return_value={"score": score, "depth": 8}) as mock_search:
+            self.assertEqual(evaluate_position(self.after_e4, depth=15), {"type": "cp", "value": 30})
+            evaluate_position(self.after_e4, depth=15)
+        self.assertEqual(mock_search.call_count, 2)
+        self.assertIsNone(get_evaluation_cache().get(self.after_e4, 15))
+        with patch('app.utils.engine_utils.analyse_board', return_value={"score": score, "depth": 15}):
+            evaluate_position(self.after_e4, depth=15)
+        self.assertEqual(get_evaluation_cache().get(self.after_e4, 15), {"type": "cp", "value": 30})
+        get_evaluation_cache().clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
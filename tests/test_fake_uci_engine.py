@@ -0,0 +1,71 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+import chess.engine
+from app.utils.engine_pool import EnginePool
+from app.utils.engine_utils import search_iteratively
+
+FAKE_UCI_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_uci_engine.py")
+
+
+class TestFakeUciEngine(unittest.TestCase):
+
+    def setUp(self):
+        # Un script Python est lancé avec l'interpréteur courant, comme un exécutable Stockfish
+        self.pool = EnginePool(FAKE_UCI_ENGINE, size=1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_analysis_is_deterministic(self):
+        """Les mêmes positions donnent toujours les mêmes lignes, dans l'ordre des évaluations."""
+        board = chess.Board("rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2")
+        with self.pool.engine() as engine:
+            first = engine.analyse(board, chess.engine.Limit(depth=5), multipv=3)
+            second = engine.analyse(board, chess.engine.Limit(depth=5), multipv=3)
+        self.assertEqual([info["pv"][0] for info in first], [info["pv"][0] for info in second])
+        self.assertEqual(first[0]["pv"][0].uci(), "e4d5")  # Seule prise de pion
+        self.assertEqual(first[0]["depth"], 5)
+        scores = [info["score"].relative.score() for info in first]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_mate_and_restricted_search(self):
+        """Un mat en un est annoncé ; `searchmoves` restreint les coups évalués."""
+        board = chess.Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        with self.pool.engine() as engine:
+            info = engine.analyse(board, chess.engine.Limit(depth=3))
+            restricted = engine.analyse(board, chess.engine.Limit(depth=3), root_moves=[chess.Move.from_uci("g1h2")])
+        self.assertEqual(info["pv"][0].uci(), "a1a8")
+        self.assertEqual(info["score"].white().mate(), 1)
+        self.assertEqual(restricted["pv"][0].uci(), "g1h2")
+
+    def test_latency_bounds_iterative_deepening(self):
+        """Avec un délai par profondeur, un temps de recherche limité arrête l'approfondissement."""
+        with self.pool.engine() as engine:
+            engine.configure({"Latency": 20})
+            infos = search_iteratively(engine, chess.Board(), chess.engine.Limit(depth=15, time=0.1), multipv=2)
+        self.assertEqual(len(infos), 2)
+        self.assertLess(infos[0]["depth"], 15)
+        self.assertGreaterEqual(infos[0]["depth"], 1)
+
+    def test_imposed_evaluations(self):
+        """Les évaluations d'une position peuvent être imposées par un fichier JSON."""
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as evals:
+            json.dump({chess.STARTING_FEN: {"a2a3": 250, "h2h4": "M2"}}, evals)
+        try:
+            with self.pool.engine() as engine:
+                engine.configure({"EvalFile": evals.name})
+                infos = engine.analyse(chess.Board(), chess.engine.Limit(depth=2), multipv=2)
+        finally:
+            os.remove(evals.name)
+        self.assertEqual([info["pv"][0].uci() for info in infos], ["h2h4", "a2a3"])
+        self.assertEqual(infos[0]["score"].white().mate(), 2)
+        self.assertEqual(infos[1]["score"].white().score(), 250)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+from app.utils import fen_utils
+from app.utils.fen_utils import FenSnapshotWriter, snapshot_board
+
+
+class TestFenSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # Intervalle long : les écritures ne se font qu'au flush explicite
+        self.writer = FenSnapshotWriter(self.tmp_dir.name, flush_interval=60)
+        self.board = chess.Board()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_batched_writes_keep_last_position(self):
+        """Plusieurs demandes pour une même partie ne donnent qu'une écriture, la plus récente."""
+        self.writer.snapshot("game", self.board.fen())
+        self.board.push_uci("e2e4")
+        self.writer.snapshot("game", self.board.fen())
+        self.writer.flush()
+        with open(os.path.join(self.tmp_dir.name, "game.fen")) as f:
+            self.assertEqual(f.read(), self.board.fen())
+
+    def test_discard_removes_finished_game(self):
+        """L'instantané d'une partie terminée est supprimé."""
+        self.writer.snapshot("game", self.board.fen())
+        self.writer.flush()
+        self.writer.discard("game")
+        self.writer.flush()
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "game.fen")))
+
+    def test_flush_waits_for_the_batch_being_written(self):
+        """À l'arrêt, `flush` attend le lot que le thread est en train d'écrire : aucun instantané n'est perdu."""
+        writer = FenSnapshotWriter(self.tmp_dir.name, flush_interval=0)
+        writing, release = threading.Event(), threading.Event()
+        write_files = writer._write_files
+
+        def slow_write(pending):
+            writing.set()
+            release.wait(5)
+            write_files(pending)
+
+        with patch.object(writer, "_write_files", side_effect=slow_write):
+            writer.snapshot("game", self.board.fen())
+            self.assertTrue(writing.wait(5))
+            flushed = threading.Thread(target=writer.flush)
+            flushed.start()
+            flushed.join(0.2)
+            self.assertTrue(flushed.is_alive())
+            release.set()
+            flushed.join(5)
+        self.assertFalse(flushed.is_alive())
+        with open(os.path.join(self.tmp_dir.name, "game.fen")) as f:
+            self.assertEqual(f.read(), self.board.fen())
+
+    def test_snapshots_disabled_by_default(self):
+        """Sans FEN_SNAPSHOTS, aucune écriture n'est demandée."""
+        with patch.dict(os.environ, {}, clear=True), \
+                patch.object(fen_utils, "get_snapshot_writer") as mock_writer:
+            snapshot_board("game", self.board)
+            mock_writer.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
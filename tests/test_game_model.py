@@ -4,9 +4,13 @@ import chess
 import chess.pgn
 from io import StringIO
 import sys
+from unittest.mock import patch
 # Ajustez ce chemin d'importation pour qu'il corresponde à votre structure de projet
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.models.game_model import ChessGame
+from app.models import game_template
+from app.services.analysis_service import PositionAnalysis
+from app.utils.engine_utils import format_move_info
 from stockfish import Stockfish
 
 class TestChessGame(unittest.TestCase):
@@ -191,5 +195,35 @@ class TestChessGame(unittest.TestCase):
             # Restaurer la méthode originale
             self.chess_game.submit_move = original_submit_move
 
+    def test_points_for_a_move_missing_from_the_analysis(self):
+        """Un coup absent de l'analyse (recherche restreinte sans résultat) est évalué à part, sans erreur."""
+        board = chess.Board()
+        self.chess_game.analysis = PositionAnalysis(board.fen(), [format_move_info(board, chess.Move.from_uci("e2e4"),
+                                                                                    {"type": "cp", "value": 30})])
+        with patch('app.models.game_model.complete_analysis'), \
+                patch('app.models.game_template.evaluate_move_strength',
+                      wraps=game_template.evaluate_move_strength) as mock_strength:
+            points, message, checkmate_bonus = self.chess_game.calculate_points("d2d4", chess.Move.from_uci("e2e4"),
+                                                                                board=board)
+        mock_strength.assert_called_once_with(board, chess.Move.from_uci("d2d4"))
+        self.assertIsInstance(points, (int, float))
+        self.assertTrue(message)
+        self.assertEqual(checkmate_bonus, 0)
+
+    def test_timer_restarts_after_synchronous_analysis(self):
+        """Comme dans les modes chronométrés, le chronomètre repart une fois l'analyse du coup terminée."""
+        clock = [100.0]
+
+        def slow_points(*args, **kwargs):
+            clock[0] += 5.0  # Analyse du moteur
+            return 10, "Bon coup", 0
+
+        game = ChessGame(chess.pgn.read_game(StringIO("1. e4 e5 2. Nf3 Nc6 *")), 'white', game_id='timer_game')
+        with patch('time.time', side_effect=lambda: clock[0]), \
+                patch.object(ChessGame, 'calculate_points', side_effect=slow_points):
+            result = game.submit_move("e2e4")
+        self.assertEqual(result['points_earned'], 10)
+        self.assertEqual(game.move_start_time, 105.0)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
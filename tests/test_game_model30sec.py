@@ -18,21 +18,21 @@ class TestChessGame30sec(unittest.TestCase):
         self.game = chess.pgn.read_game(pgn)
         
         # Mock pour éviter les appels réels aux fonctions externes
-        self.patcher1 = patch('app.models.game_model_30sec.evaluate_move_strength')
-        self.mock_evaluate_move_strength = self.patcher1.start()
-        # Par défaut, retourner une évaluation positive pour les coups
-        self.mock_evaluate_move_strength.return_value = {"type": "cp", "value": 50}
+        self.patcher1 = patch('app.models.game_model_30sec.complete_analysis')
+        self.mock_complete_analysis = self.patcher1.start()
         
-        self.patcher2 = patch('app.models.game_model_30sec.get_best_moves_from_fen')
-        self.mock_get_best_moves = self.patcher2.start()
-        self.mock_get_best_moves.return_value = ["e4", "d4"]
+        self.patcher2 = patch('app.models.game_template.analyse_position')
+        self.mock_analyse_position = self.patcher2.start()
+        # Par défaut, retourner une évaluation positive pour les coups
+        self.mock_analyse_position.return_value.get_evaluation.return_value = {"type": "cp", "value": 50}
+        self.mock_analyse_position.return_value.best_moves = ["e4", "d4"]
         
         self.patcher3 = patch('app.models.game_model_30sec.evaluate_played_move')
         self.mock_evaluate_played_move = self.patcher3.start()
         self.mock_evaluate_played_move.return_value = {"evaluation": 0.5, "best_move": "e4"}
         
-        self.patcher4 = patch('app.models.game_model_30sec.save_board_fen')
-        self.mock_save_board_fen = self.patcher4.start()
+        self.patcher4 = patch('app.models.game_model_30sec.snapshot_board')
+        self.mock_snapshot_board = self.patcher4.start()
         
         self.patcher5 = patch('os.path.join')
         self.mock_os_path_join = self.patcher5.start()
@@ -120,6 +120,22 @@ class TestChessGame30sec(unittest.TestCase):
         # Vérifier que le message ne contient pas l'indication de temps dépassé
         self.assertNotIn("Temps dépassé", result.get('move_quality', ''))
 
+    def test_timer_restarts_after_synchronous_analysis(self):
+        """Le temps passé à analyser le coup (mode synchrone) n'est pas décompté au joueur."""
+        clock = [100.0]
+
+        def slow_points(*args, **kwargs):
+            clock[0] += 5.0  # Analyse du moteur
+            return 10, "Bon coup", 0
+
+        with patch('time.time', side_effect=lambda: clock[0]), \
+                patch.object(ChessGame30sec, 'calculate_points', side_effect=slow_points):
+            self.chess_game.move_start_time = 100.0
+            result = self.chess_game.submit_move("e2e4")
+        self.assertEqual(result['points_earned'], 10)
+        self.assertEqual(self.chess_game.move_start_time, 105.0)
+        self.assertEqual(result['move_start_time'], 105.0)
+
     def test_manual_time_check(self):
         """
         Test manuel de la vérification du temps écoulé
@@ -0,0 +1,96 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+from app.models.game_template import GameTemplate, get_game_template
+from app.models.game_modelNormal import ChessGameNormal
+from app.models.game_model1min import ChessGame1Min
+from app.services.analysis_service import PositionAnalysis
+from app.services.session_store import approximate_size
+from app.utils.engine_utils import format_move_info
+from app.utils.pgn_utils import PGN_DIR, get_cached_pgn_game
+
+
+class TestGameTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.pgn_game = get_cached_pgn_game(os.path.join(PGN_DIR, "test.pgn"))
+
+    def test_template_precomputes_every_ply(self):
+        """Coups, SAN, FEN et commentaires de chaque demi-coup sont calculés une fois."""
+        template = get_game_template(self.pgn_game)
+        moves = list(self.pgn_game.mainline_moves())
+        self.assertEqual(list(template.moves), moves)
+        self.assertEqual(template.sans[:3], ("e4", "e5", "Nf3"))
+        self.assertEqual(len(template.fens), len(moves) + 1)
+
+        board = self.pgn_game.board()
+        for move in moves[:5]:
+            board.push(move)
+        self.assertEqual(template.fen_at(5), board.fen())
+        # Au-delà de la fin : position finale
+        self.assertEqual(template.fen_at(10_000), template.fens[-1])
+        self.assertEqual(template.comments[1], list(self.pgn_game.mainline())[1].comment.strip())
+
+    def test_sessions_share_one_template(self):
+        """Toutes les sessions d'une même partie référencent les mêmes données, sans copie."""
+        first = ChessGameNormal(self.pgn_game, "white", game_id="a", analyse=False)
+        second = ChessGame1Min(self.pgn_game, "black", game_id="b", analyse=False)
+        self.assertIs(first.template, second.template)
+        self.assertIs(first.all_moves, second.all_moves)
+        self.assertIs(first.comments, second.comments)
+        self.assertIsInstance(get_game_template(first.template), GameTemplate)
+
+    def test_board_follows_cursor_after_compact(self):
+        """Une session compactée reconstruit son échiquier à partir de son curseur."""
+        game = ChessGameNormal(self.pgn_game, "black", game_id="c", analyse=False)
+        self.assertEqual(game.board.fen(), game.template.fen_at(1))
+        self.assertEqual(game.last_opponent_move, "e4")
+
+        game.board.push(game.all_moves[1])
+        game.board.push(game.all_moves[2])
+        game.current_move_index = 1
+        fen = game.board.fen()
+        game.compact()
+        self.assertEqual(game.board.fen(), fen)
+        self.assertEqual(game.board.move_stack, [])
+
+    def test_compacted_session_is_small(self):
+        """Hors modèle partagé, une session au repos n'occupe que quelques centaines d'octets."""
+        template = get_game_template(self.pgn_game)
+        game = ChessGameNormal(self.pgn_game, "white", game_id="d", analyse=False)
+        game.compact()
+        shared = approximate_size([template])
+        self.assertLess(approximate_size([game, template]) - shared, 1000)
+        self.assertIsInstance(game.board, chess.Board)
+
+    @patch('app.models.game_template.wait_for_lookahead')
+    @patch('app.models.game_template.schedule_lookahead')
+    @patch('app.models.game_template.prefetch_position')
+    @patch('app.models.game_template.analyse_position')
+    def test_prefetched_analysis_is_resolved_on_first_read(self, mock_analyse_position, mock_prefetch, *_):
+        """L'analyse différée n'est attendue qu'à la première lecture, pour la position où elle a été demandée."""
+        mock_analyse_position.side_effect = lambda board, moves, budget: PositionAnalysis(
+            board.fen(), [format_move_info(board, moves[0], {"type": "cp", "value": 0})])
+        game = ChessGameNormal(self.pgn_game, "white", game_id="e", analyse=False)
+        fen = game.board.fen()
+        game.prefetch_analysis()
+        mock_prefetch.assert_called_once()
+        self.assertEqual(mock_prefetch.call_args.args[1], [game.moves[0]])
+        self.assertFalse(game.analysis_ready)
+        mock_analyse_position.assert_not_called()
+
+        # La partie avance avant la lecture : l'analyse porte toujours sur la position initiale
+        game.board.push(game.all_moves[0])
+        game.board.push(game.all_moves[1])
+        game.current_move_index = 1
+        self.assertEqual([move["uci"] for move in game.best_moves], [game.all_moves[0].uci()])
+        self.assertEqual(game.analysis.fen, fen)
+        self.assertTrue(game.analysis_ready)
+        mock_analyse_position.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
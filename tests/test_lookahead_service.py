@@ -0,0 +1,63 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+from app.services.lookahead_service import LookaheadScheduler, upcoming_positions
+
+MOVES = [chess.Move.from_uci(uci) for uci in ["e2e4", "e7e5", "g1f3", "b8c6", "f1b5", "a7a6"]]
+
+
+class TestLookahead(unittest.TestCase):
+
+    def test_upcoming_positions_follow_the_pgn(self):
+        """Les positions futures du joueur suivent le coup du maître et la réponse historique."""
+        positions = upcoming_positions(chess.Board(), MOVES, ply=0, count=2)
+        self.assertEqual([move.uci() for _, move in positions], ["g1f3", "f1b5"])
+        expected = chess.Board()
+        for move in MOVES[:4]:
+            expected.push(move)
+        self.assertEqual(positions[1][0].fen(), expected.fen())
+        # Pas de position au-delà de la fin de la partie
+        self.assertEqual(len(upcoming_positions(chess.Board(), MOVES, ply=0, count=5)), 2)
+
+    @patch('app.services.lookahead_service.analyse_position')
+    def test_schedule_analyses_with_master_move_once(self, mock_analyse_position):
+        """Chaque position future est analysée une seule fois, avec le coup du maître."""
+        release = threading.Event()
+        mock_analyse_position.side_effect = lambda board, moves, budget: release.wait(timeout=5)
+        scheduler = LookaheadScheduler(positions=1)
+
+        self.assertEqual(scheduler.schedule(chess.Board(), MOVES, ply=0), 1)
+        # Déjà en cours : pas de seconde planification
+        self.assertEqual(scheduler.schedule(chess.Board(), MOVES, ply=0), 0)
+        release.set()
+
+        next_board = upcoming_positions(chess.Board(), MOVES, ply=0, count=1)[0][0]
+        scheduler.wait(next_board)
+        mock_analyse_position.assert_called_once()
+        self.assertEqual(mock_analyse_position.call_args.kwargs["moves"], [MOVES[2]])
+        self.assertEqual(scheduler.stats()["inflight"], 0)
+
+    @patch('app.services.lookahead_service.analyse_position')
+    def test_prefetch_current_position(self, mock_analyse_position):
+        """La position courante peut être analysée d'avance, une seule fois, sans attendre le résultat."""
+        release = threading.Event()
+        mock_analyse_position.side_effect = lambda board, moves, budget: release.wait(timeout=5)
+        scheduler = LookaheadScheduler(positions=1)
+        board = chess.Board()
+
+        self.assertTrue(scheduler.prefetch(board, [MOVES[0]]))
+        self.assertFalse(scheduler.prefetch(board, [MOVES[0]]))
+        # L'échiquier de l'appelant peut évoluer : la copie planifiée reste inchangée
+        board.push(MOVES[0])
+        release.set()
+        scheduler.wait(chess.Board())
+        self.assertEqual(mock_analyse_position.call_args.args[0].fen(), chess.Board().fen())
+        self.assertEqual(mock_analyse_position.call_args.kwargs["moves"], [MOVES[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
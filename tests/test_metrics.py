@@ -0,0 +1,74 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.metrics import MetricsRegistry, span, trace_request, current_trace
+from app.utils.engine_utils import record_search
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_is_cumulative(self):
+        """Les intervalles d'un histogramme sont cumulés, avec somme et effectif par étiquettes."""
+        registry = MetricsRegistry()
+        histogram = registry.histogram("test_seconds", "Durées.", buckets=(0.1, 1.0), labels=("route",))
+        for value in (0.05, 0.5, 2.0):
+            histogram.observe(value, route="a")
+        text = registry.render()
+        self.assertIn("# TYPE test_seconds histogram", text)
+        self.assertIn('test_seconds_bucket{route="a",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{route="a",le="1"} 2', text)
+        self.assertIn('test_seconds_bucket{route="a",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_sum{route="a"} 2.55', text)
+        self.assertIn('test_seconds_count{route="a"} 3', text)
+
+    def test_counters_and_collected_values(self):
+        """Compteurs et valeurs lues à la collecte ; une valeur indisponible (None) est omise."""
+        registry = MetricsRegistry()
+        counter = registry.counter("test_requests_total", "Requêtes.", labels=("status",))
+        counter.inc(status=200)
+        counter.inc(2, status=200)
+        self.assertIs(registry.counter("test_requests_total", "Requêtes."), counter)
+        registry.collect("test_sessions", "Sessions.", lambda: 4)
+        registry.collect("test_pool", "Pool pas encore créé.", lambda: None)
+        registry.collect("test_evicted_total", "Suppressions.", lambda: {("idle",): 1, ("lru",): 0},
+                         kind="counter", labels=("reason",))
+        text = registry.render()
+        self.assertIn('test_requests_total{status="200"} 3', text)
+        self.assertIn("test_sessions 4", text)
+        self.assertNotIn("test_pool", text)
+        self.assertIn("# TYPE test_evicted_total counter", text)
+        self.assertIn('test_evicted_total{reason="idle"} 1', text)
+
+    def test_spans_are_attached_to_the_request_trace(self):
+        """Les étapes d'une requête tracée figurent dans sa trace et dans l'en-tête Server-Timing."""
+        with span("hors_requete"):
+            pass
+        with trace_request("test_route") as trace:
+            self.assertIs(current_trace(), trace)
+            with span("engine", multipv=3) as attributes:
+                record_search(attributes, [{"depth": 12, "nodes": 34000}])
+            with span("engine"):
+                pass
+            with span("json_serialize"):
+                pass
+        self.assertIsNone(current_trace())
+        self.assertEqual([name for name, _, _ in trace.spans], ["engine", "engine", "json_serialize"])
+        self.assertEqual(trace.spans[0][2], {"multipv": 3, "depth": 12, "nodes": 34000})
+        self.assertEqual(trace.summary()["engine"][0], 2)
+        timing = trace.server_timing()
+        self.assertIn('engine;dur=', timing)
+        self.assertIn('desc="2x"', timing)
+        self.assertTrue(timing.split(", ")[-1].startswith("total;dur="))
+
+    def test_failed_request_is_counted_as_error(self):
+        """Une exception pendant une requête tracée est comptée avec le code 500."""
+        with self.assertRaises(ValueError):
+            with trace_request("test_error") as trace:
+                raise ValueError("boom")
+        self.assertEqual(trace.status, 500)
+        self.assertIsNotNone(trace.duration)
+
+
+if __name__ == '__main__':
+    unittest.main()
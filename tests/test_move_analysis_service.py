@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.move_analysis_service import MoveAnalysisQueue
+
+
+class TestMoveAnalysisQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = MoveAnalysisQueue(max_workers=2)
+
+    def test_jobs_of_a_game_run_in_order(self):
+        """Les analyses d'une même partie s'exécutent dans l'ordre, même avec plusieurs threads."""
+        order = []
+        release = threading.Event()
+
+        def slow_job():
+            release.wait(timeout=5)
+            order.append(1)
+            return {'move': 1}
+
+        self.queue.submit("game", slow_job)
+        self.queue.submit("game", lambda: order.append(2) or {'move': 2})
+        self.assertEqual(self.queue.pending("game"), 2)
+        release.set()
+
+        self.assertTrue(self.queue.wait_idle("game", timeout=5))
+        self.assertEqual(order, [1, 2])
+        self.assertEqual([r['seq'] for r in self.queue.results("game")], [1, 2])
+        self.assertEqual([r['move'] for r in self.queue.results("game", since=1)], [2])
+
+    def test_job_error_is_published(self):
+        """Une erreur du moteur est publiée comme résultat plutôt que perdue."""
+        def failing_job():
+            raise RuntimeError("moteur indisponible")
+
+        seq = self.queue.submit("game", failing_job)
+        results = self.queue.wait_for_results("game", since=seq - 1, timeout=5)
+        self.assertEqual(results[0]['error'], "Analyse indisponible")
+        self.assertEqual(self.queue.pending("game"), 0)
+
+    def test_run_waits_for_pending_jobs(self):
+        """Une analyse synchrone attend la fin des analyses différées de la partie."""
+        state = {'score': 0}
+        release = threading.Event()
+
+        def deferred():
+            release.wait(timeout=5)
+            state['score'] += 10
+            return {}
+
+        self.queue.submit("game", deferred)
+        threading.Timer(0.05, release.set).start()
+        result = self.queue.run("game", lambda: {'score': state['score']})
+        self.assertEqual(result, {'score': 10})
+
+    def test_after_runs_once_jobs_are_done(self):
+        """Un rappel planifié après les analyses s'exécute une fois celles-ci terminées, sans résultat publié."""
+        order = []
+        release = threading.Event()
+        done = threading.Event()
+
+        self.queue.submit("game", lambda: release.wait(timeout=5) and order.append("analyse") or {})
+        self.queue.after("game", lambda: order.append("save") or done.set())
+        release.set()
+
+        self.assertTrue(done.wait(timeout=5))
+        self.assertEqual(order, ["analyse", "save"])
+        self.assertEqual(len(self.queue.results("game")), 1)
+
+        # Sans tâche planifiée, le rappel s'exécute immédiatement
+        self.queue.after("other", lambda: order.append("now"))
+        self.assertEqual(order[-1], "now")
+
+
+if __name__ == '__main__':
+    unittest.main()
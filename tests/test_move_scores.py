@@ -0,0 +1,54 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+from app.utils.move_scores import MoveScoreTable, UNSCORED
+
+
+class TestMoveScoreTable(unittest.TestCase):
+
+    def test_scores_are_indexed_by_legal_move(self):
+        """Une case par coup légal ; centipawns et mats sont relus tels qu'enregistrés."""
+        table = MoveScoreTable(chess.Board())
+        self.assertEqual(len(table), 20)
+        table.update([{"uci": "e2e4", "evaluation": {"type": "cp", "value": 35}},
+                      {"uci": "f2f3", "evaluation": {"type": "mate", "value": -2}},
+                      {"uci": "e2e5", "evaluation": {"type": "cp", "value": 0}}])
+        self.assertFalse(table.set("e2e4", {"type": "cp", "value": 10}))
+        self.assertEqual(table.evaluations(["e2e4", "f2f3", "a2a3", "e2e5"]),
+                         [{"type": "cp", "value": 35}, {"type": "mate", "value": -2}, None, None])
+        self.assertIn("e2e4", table)
+        self.assertNotIn(chess.Move.from_uci("a2a3"), table)
+        self.assertEqual(table.scored(), ["f2f3", "e2e4"])
+        self.assertEqual(len(table.missing()), 18)
+        self.assertEqual(table.scores.count(UNSCORED), 18)
+
+    def test_best_move_for_the_side_to_move(self):
+        """Le meilleur coup est le plus grand score pour les blancs, le plus petit pour les noirs."""
+        board = chess.Board("6k1/5ppp/8/8/8/8/5PPP/R5K1 b - - 0 1")
+        table = MoveScoreTable(board)
+        table.update([{"uci": "g8f8", "evaluation": {"type": "cp", "value": 900}},
+                      {"uci": "h7h6", "evaluation": {"type": "cp", "value": 500}},
+                      {"uci": "g7g6", "evaluation": {"type": "mate", "value": 3}}])
+        self.assertEqual(table.best(), "h7h6")
+        board = chess.Board("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+        table = MoveScoreTable(board)
+        table.update([{"uci": "a1a8", "evaluation": {"type": "mate", "value": 0}},
+                      {"uci": "a1a7", "evaluation": {"type": "mate", "value": 4}}])
+        self.assertEqual(table.best(), "a1a8")
+        self.assertEqual(table.get("a1a8"), {"type": "mate", "value": 0})
+
+    def test_relative_strengths_match_the_best_moves_rule(self):
+        """La force relative est calculée par rapport au coup de référence (100 pour un coup aussi bon)."""
+        lines = [{"uci": "e2e4", "evaluation": {"type": "cp", "value": 40}},
+                 {"uci": "d2d4", "evaluation": {"type": "cp", "value": -60}},
+                 {"uci": "g1f3", "evaluation": {"type": "mate", "value": 5}}]
+        table = MoveScoreTable(chess.Board())
+        table.update(lines)
+        self.assertEqual(table.relative_strengths(["e2e4", "d2d4", "g1f3", "a2a3"], base="e2e4"),
+                         [100, 50, 100, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
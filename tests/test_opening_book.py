@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+import chess.polyglot
+from app.utils import opening_book
+from app.utils.analysis_index import AnalysisIndex
+from app.utils.opening_book import OpeningBook, OpeningBookWriter
+from app.services.analysis_service import analyse_position
+from app.utils.engine_utils import evaluate_played_move, get_best_moves_from_fen
+from app.utils.eval_cache import get_evaluation_cache
+from build_opening_book import build_opening_book
+
+PGN = """[Event "Test"]
+[White "A"]
+[Black "B"]
+[Result "*"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O *
+
+[Event "Test"]
+[White "C"]
+[Black "D"]
+[Result "*"]
+
+1. e4 c5 2. Nf3 d6 *
+"""
+
+
+class TestOpeningBook(unittest.TestCase):
+
+    def setUp(self):
+        get_evaluation_cache().clear()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.book_path = os.path.join(self.tmp_dir.name, "book.bin")
+        self.env_patcher = patch.dict(os.environ, {"OPENING_BOOK_PATH": self.book_path})
+        self.env_patcher.start()
+        opening_book.reset_opening_book()
+
+    def tearDown(self):
+        opening_book.reset_opening_book()
+        self.env_patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_written_book_is_read_by_chess_polyglot(self):
+        """Coups (roque compris), poids et évaluations sont relus par `chess.polyglot`."""
+        board = chess.Board("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+        writer = OpeningBookWriter()
+        writer.add(board, chess.Move.from_uci("e1g1"), weight=3, evaluation={"type": "cp", "value": -42}, depth=14)
+        writer.add(board, chess.Move.from_uci("e1c1"), evaluation={"type": "mate", "value": 7}, depth=20)
+        writer.add(board, chess.Move.from_uci("a1a8"), weight=0, evaluation={"type": "cp", "value": 10}, depth=12)
+        writer.add(board, chess.Move.from_uci("e1g1"), weight=2)
+        writer.save(self.book_path)
+
+        with chess.polyglot.open_reader(self.book_path) as reader:
+            self.assertEqual([(entry.move.uci(), entry.weight) for entry in reader.find_all(board)],
+                             [("e1g1", 5), ("e1c1", 1)])
+        book = OpeningBook(self.book_path)
+        self.assertEqual(book.lookup(board), [
+            {"uci": "e1g1", "weight": 5, "evaluation": {"type": "cp", "value": -42}, "depth": 14},
+            {"uci": "e1c1", "weight": 1, "evaluation": {"type": "mate", "value": 7}, "depth": 20},
+            {"uci": "a1a8", "weight": 0, "evaluation": {"type": "cp", "value": 10}, "depth": 12},
+        ])
+        self.assertEqual(book.book_moves(board), {"e1g1", "e1c1"})
+        self.assertEqual([line["uci"] for line in book.best_lines(board, 3)], ["e1c1", "a1a8", "e1g1"])
+        self.assertIsNone(book.best_lines(board, 4))
+        self.assertEqual(book.lookup(chess.Board()), [])
+        self.assertEqual(OpeningBook(os.path.join(self.tmp_dir.name, "absent.bin")).lookup(board), [])
+
+    def test_opening_positions_are_served_from_the_book(self):
+        """Le livre construit à partir des parties et de l'index sert l'ouverture sans moteur, coups étiquetés."""
+        pgn_dir = os.path.join(self.tmp_dir.name, "pgn")
+        os.mkdir(pgn_dir)
+        with open(os.path.join(pgn_dir, "test.pgn"), "w") as f:
+            f.write(PGN)
+        index_path = os.path.join(self.tmp_dir.name, "index.json")
+        index = AnalysisIndex(depth=15, num_top_moves=3)
+        index.add(chess.Board(), [
+            {"uci": "e2e4", "evaluation": {"type": "cp", "value": 35}},
+            {"uci": "d2d4", "evaluation": {"type": "cp", "value": 30}},
+            {"uci": "g1f3", "evaluation": {"type": "cp", "value": 25}},
+        ], [])
+        index.save(index_path)
+        build_opening_book(pgn_dir, plies=4, index_path=index_path)
+
+        with patch('app.services.analysis_service.analyse_board') as mock_analyse_board:
+            analysis = analyse_position(chess.Board(), moves=["e2e4"])
+        mock_analyse_board.assert_not_called()
+        self.assertEqual([(move["uci"], move.get("book", False)) for move in analysis.best_moves],
+                         [("e2e4", True), ("d2d4", False), ("g1f3", False)])
+        self.assertEqual(analysis.depth, 15)
+
+        with patch('app.utils.engine_utils.analyse_board') as mock_analyse_board:
+            best_moves = get_best_moves_from_fen(chess.STARTING_FEN)
+        mock_analyse_board.assert_not_called()
+        self.assertEqual(best_moves[0]["uci"], "e2e4")
+        self.assertTrue(best_moves[0]["book"])
+
+        evaluation = evaluate_played_move(chess.Board(), "e2e4", analysis=analysis)
+        self.assertEqual(evaluation["value"], 35)
+        self.assertTrue(evaluation["book"])
+        # Sans évaluation dans le livre, la position suivante reste analysée par le moteur
+        board = chess.Board()
+        board.push_uci("e2e4")
+        self.assertEqual(opening_book.get_opening_book().book_moves(board), {"e7e5", "c7c5"})
+        self.assertIsNone(opening_book.get_opening_book().best_lines(board, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils import pgn_utils
+from app.utils.pgn_utils import get_cached_pgn_game, get_pgn_games, read_pgn_game, resolve_pgn_file, scan_pgn_headers
+
+TWO_GAMES = """[Event "Premier tournoi"]
+[White "Blanc A"]
+[Black "Noir A"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 {Développement} Nc6 1-0
+
+[Event "Second tournoi"]
+[White "Blanc B"]
+[Black "Noir B"]
+[Result "0-1"]
+
+1. d4 d5 2. c4 e6 0-1
+"""
+
+ONE_GAME = """[Event "Partie seule"]
+[White "Blanc C"]
+[Black "Noir C"]
+[Result "1/2-1/2"]
+
+1. c4 c5 1/2-1/2
+"""
+
+
+class TestPgnCatalogue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.write("a.pgn", TWO_GAMES)
+        self.write("b.pgn", ONE_GAME)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w", encoding="utf-8") as pgn:
+            pgn.write(content)
+        return path
+
+    def test_scan_lists_every_game_with_its_offset(self):
+        """Toutes les parties d'un fichier sont listées, avec la position de leur début."""
+        path = os.path.join(self.tmpdir.name, "a.pgn")
+        entries = scan_pgn_headers(path)
+        self.assertEqual([entry["event"] for entry in entries], ["Premier tournoi", "Second tournoi"])
+        self.assertEqual(entries[0]["offset"], 0)
+
+        game = read_pgn_game(path, 1)
+        self.assertEqual(game.headers["White"], "Blanc B")
+        self.assertEqual(game.board().san(next(iter(game.mainline_moves()))), "d4")
+        self.assertIsNone(read_pgn_game(path, 2))
+
+    def test_index_is_saved_next_to_the_file_and_reused(self):
+        """L'index des positions est enregistré à côté du fichier et relu tant que celui-ci ne change pas."""
+        path = os.path.join(self.tmpdir.name, "a.pgn")
+        entries = pgn_utils.get_pgn_headers(path)
+        self.assertTrue(os.path.exists(path + ".idx"))
+
+        pgn_utils._headers_cache.pop(path)
+        with patch('app.utils.pgn_utils.scan_pgn_headers') as mock_scan:
+            self.assertEqual(pgn_utils.get_pgn_headers(path), entries)
+            mock_scan.assert_not_called()
+
+        # Fichier modifié : l'index enregistré n'est plus valable
+        self.write("a.pgn", ONE_GAME)
+        pgn_utils._headers_cache.pop(path)
+        self.assertEqual(len(pgn_utils.get_pgn_headers(path)), 1)
+
+    def test_scan_ignores_brackets_inside_comments(self):
+        """Une ligne de commentaire commençant par « [ » ne crée pas de nouvelle partie."""
+        path = self.write("c.pgn", TWO_GAMES.replace("{Développement}", "{Développement\n[%clk 0:01:00] suite}"))
+        self.assertEqual(len(scan_pgn_headers(path)), 2)
+        self.assertEqual(read_pgn_game(path, 0).variations[0].variations[0].variations[0].comment,
+                         "Développement\n[%clk 0:01:00] suite")
+
+    def test_catalogue_only_rescans_modified_files(self):
+        """Le catalogue est gardé en mémoire et seuls les fichiers modifiés sont relus."""
+        with patch('app.utils.pgn_utils.scan_pgn_headers', wraps=scan_pgn_headers) as mock_scan:
+            games = get_pgn_games(self.tmpdir.name, refresh_interval=0)
+            self.assertEqual([(game["file"], game["index"]) for game in games], [("a.pgn", 0), ("a.pgn", 1), ("b.pgn", 0)])
+            self.assertEqual(mock_scan.call_count, 2)
+
+            # Rien n'a changé : même liste, aucun fichier relu
+            self.assertIs(get_pgn_games(self.tmpdir.name, refresh_interval=0), games)
+            self.assertEqual(mock_scan.call_count, 2)
+
+            path = self.write("b.pgn", ONE_GAME + "\n" + ONE_GAME.replace("Blanc C", "Blanc D"))
+            os.utime(path, (0, os.path.getmtime(path) + 10))
+            games = get_pgn_games(self.tmpdir.name, refresh_interval=0)
+            self.assertEqual(mock_scan.call_count, 3)
+            self.assertEqual(games[-1]["white"], "Blanc D")
+
+    def test_catalogue_is_not_rechecked_within_interval(self):
+        """Entre deux vérifications, le catalogue est servi sans accéder au dossier."""
+        get_pgn_games(self.tmpdir.name, refresh_interval=60)
+        with patch('app.utils.pgn_utils.os.listdir') as mock_listdir:
+            get_pgn_games(self.tmpdir.name, refresh_interval=60)
+            mock_listdir.assert_not_called()
+
+    def test_only_pgn_files_of_the_folder_are_resolved(self):
+        """Un nom reçu du client ne peut désigner qu'un fichier `.pgn` du dossier (ni `../`, ni chemin absolu)."""
+        folder = os.path.join(self.tmpdir.name, "pgn")
+        os.mkdir(folder)
+        inside = self.write(os.path.join("pgn", "c.pgn"), ONE_GAME)
+        self.assertEqual(resolve_pgn_file("c.pgn", folder), os.path.realpath(inside))
+        for name in ("../a.pgn", os.path.join(self.tmpdir.name, "a.pgn"), "absent.pgn", "c.pgn.idx", "", None):
+            self.assertIsNone(resolve_pgn_file(name, folder))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "a.pgn.idx")))
+
+    def test_game_cache_is_bounded_and_skips_missing_games(self):
+        """Le cache des parties est une LRU bornée ; un rang inexistant n'y entre pas."""
+        path = os.path.join(self.tmpdir.name, "a.pgn")
+        with patch.object(pgn_utils, "_game_cache", pgn_utils.OrderedDict()) as cache, \
+                patch.object(pgn_utils, "GAME_CACHE_SIZE", 1):
+            self.assertIsNone(get_cached_pgn_game(path, 99))
+            self.assertEqual(len(cache), 0)
+            first = get_cached_pgn_game(path, 0)
+            self.assertIs(get_cached_pgn_game(path, 0), first)
+            get_cached_pgn_game(path, 1)
+            self.assertEqual(list(cache), [(path, 1)])
+
+    def test_repository_collection_is_catalogued(self):
+        """Chaque partie du dossier PGN de l'application figure au catalogue et se relit à l'identique."""
+        games = get_pgn_games(pgn_utils.PGN_DIR, refresh_interval=0)
+        files = sorted(file for file in os.listdir(pgn_utils.PGN_DIR) if file.endswith(".pgn"))
+        self.assertEqual(sorted({game["file"] for game in games}), files)
+        for game in games:
+            pgn_game = read_pgn_game(os.path.join(pgn_utils.PGN_DIR, game["file"]), game["index"])
+            self.assertEqual((pgn_game.headers["Event"], pgn_game.headers["White"]), (game["event"], game["white"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.models.game_modelNormal import ChessGameNormal
+from app.models.game_model_30sec import ChessGame30sec
+from app.services.analysis_service import PositionAnalysis
+from app.services.session_store import (
+    MemorySessionStore, SQLiteSessionStore, approximate_size, deserialize_game, serialize_game,
+)
+from app.utils.engine_utils import format_move_info
+from app.utils.pgn_utils import PGN_DIR, get_cached_pgn_game
+
+PGN_FILE = "test.pgn"
+
+
+def fake_analysis(board):
+    """Analyse factice de la position : tous les coups légaux évalués à 0."""
+    return PositionAnalysis(board.fen(), [format_move_info(board, move, {"type": "cp", "value": 0}) for move in list(board.legal_moves)[:3]])
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.pgn_game = get_cached_pgn_game(os.path.join(PGN_DIR, PGN_FILE))
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "sessions.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def play(self, game, moves):
+        """Avance la partie comme `submit_move` après des coups corrects (sans moteur)."""
+        for _ in range(moves):
+            ply = 2 * game.current_move_index + (0 if game.user_side == "white" else 1)
+            game.board.push(game.all_moves[ply])
+            game.board.push(game.all_moves[ply + 1])
+            game.current_move_index += 1
+        game.analysis = fake_analysis(game.board)
+        game.best_moves = game.analysis.best_moves
+
+    def test_round_trip_restores_state_without_engine(self):
+        """Une partie sérialisée est reconstruite à l'identique, sans nouvelle analyse."""
+        game = ChessGameNormal(self.pgn_game, "white", game_id="g1", analyse=False)
+        self.play(game, 3)
+        game.score, game.attempts, game.last_submitted_move = 42, 2, "a2a3"
+
+        with patch('app.models.game_template.analyse_position') as mock_analyse_position:
+            restored = deserialize_game(serialize_game(game, PGN_FILE), "g1")
+            mock_analyse_position.assert_not_called()
+
+        self.assertIsInstance(restored, ChessGameNormal)
+        self.assertEqual(restored.board.fen(), game.board.fen())
+        self.assertEqual((restored.score, restored.attempts, restored.last_submitted_move), (42, 2, "a2a3"))
+        self.assertEqual(restored.best_moves, game.best_moves)
+        self.assertEqual(restored.get_game_state(), game.get_game_state())
+
+    def test_stale_analysis_is_not_serialized(self):
+        """Une analyse différée pas encore terminée n'est pas enregistrée avec la nouvelle position."""
+        game = ChessGame30sec(self.pgn_game, "black", game_id="g2", analyse=False)
+        self.play(game, 1)
+        # Coup suivant joué, analyse de la nouvelle position encore en cours
+        game.board.push(game.all_moves[game.ply])
+        game.board.push(game.all_moves[game.ply + 1])
+        game.current_move_index += 1
+        self.assertNotIn("an", serialize_game(game, PGN_FILE))
+
+    def test_sqlite_store_is_shared_between_workers(self):
+        """Une partie enregistrée par un worker est retrouvée, à jour, par un autre."""
+        worker_a, worker_b = SQLiteSessionStore(self.db_path), SQLiteSessionStore(self.db_path)
+        game = ChessGameNormal(self.pgn_game, "white", game_id="g3", analyse=False)
+        self.play(game, 0)
+        worker_a.add("g3", game, PGN_FILE)
+
+        self.assertIn("g3", worker_b)
+        restored = worker_b.get("g3")
+        self.assertEqual(restored.board.fen(), game.board.fen())
+        # Même version : la partie déjà reconstruite est réutilisée
+        self.assertIs(worker_b.get("g3"), restored)
+
+        self.play(game, 2)
+        game.score = 30
+        worker_a.save("g3", game)
+        updated = worker_b.get("g3")
+        self.assertIsNot(updated, restored)
+        self.assertEqual((updated.current_move_index, updated.score), (2, 30))
+
+        worker_b.delete("g3")
+        self.assertIsNone(worker_a.get("g3"))
+        self.assertEqual(len(worker_a), 0)
+
+    def test_deferred_analysis_is_refused_with_shared_store(self):
+        """Avec un magasin partagé, l'analyse différée est refusée (demande explicite) ou ignorée (variable)."""
+        from app.routes.game_routes import is_async_requested
+        self.assertFalse(MemorySessionStore().shared)
+        self.assertTrue(SQLiteSessionStore(self.db_path).shared)
+        self.assertTrue(is_async_requested("1"))
+        with self.assertRaises(ValueError):
+            is_async_requested("1", shared_store=True)
+        self.assertFalse(is_async_requested("0", shared_store=True))
+        with patch.dict(os.environ, {"ASYNC_MOVE_ANALYSIS": "1"}):
+            self.assertTrue(is_async_requested(None))
+            self.assertFalse(is_async_requested(None, shared_store=True))
+
+    @patch('app.services.session_store.release_session')
+    @patch('app.services.session_store.time.time')
+    def test_memory_store_evicts_idle_and_least_recent(self, mock_time, mock_release):
+        """Les parties inactives expirent, et au-delà du plafond les moins récemment jouées sont supprimées."""
+        mock_time.return_value = 1000.0
+        store = MemorySessionStore(max_sessions=2, idle_timeout=60)
+        store.add("a", object(), PGN_FILE)
+        store.add("b", object(), PGN_FILE)
+        mock_time.return_value = 1010.0
+        store.save("a", store.get("a"))  # "a" redevient la plus récente
+        store.add("c", object(), PGN_FILE)
+        self.assertNotIn("b", store)
+        self.assertEqual(store.evicted, {"idle": 0, "lru": 1})
+
+        mock_time.return_value = 1100.0
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.sweep(), 1)
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.evicted, {"idle": 2, "lru": 1})
+        self.assertEqual(sorted(call.args[0] for call in mock_release.call_args_list), ["a", "b", "c"])
+
+    @patch('app.services.session_store.release_session')
+    def test_sqlite_store_evicts_idle_and_least_recent(self, mock_release):
+        """Le magasin SQLite applique les mêmes limites, base et cache local compris."""
+        store = SQLiteSessionStore(self.db_path, max_sessions=2, idle_timeout=60)
+        for index, game_id in enumerate(["a", "b", "c"]):
+            game = ChessGameNormal(self.pgn_game, "white", game_id=game_id, analyse=False)
+            with patch('app.services.session_store.time.time', return_value=1000.0 + index):
+                store.add(game_id, game, PGN_FILE)
+        self.assertEqual(store.evicted["lru"], 1)
+        # L'inactivité se mesure par rapport à l'horloge réelle : tout a expiré
+        self.assertEqual(store.sweep(), 2)
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.stats()["cached_sessions"], 0)
+
+    def test_approximate_size_counts_shared_objects_once(self):
+        """Un objet partagé par deux parties n'est compté qu'une fois."""
+        shared = list(range(1000))
+        self.assertEqual(approximate_size([[shared], [shared]]) - approximate_size([[shared]]),
+                         sys.getsizeof([shared]))
+        game = ChessGameNormal(self.pgn_game, "white", game_id="g4", analyse=False)
+        self.assertGreater(approximate_size([game]), approximate_size([game.board]))
+
+
+if __name__ == '__main__':
+    unittest.main()
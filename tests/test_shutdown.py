@@ -0,0 +1,46 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import subprocess
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils import shutdown
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Processus qui ouvre les moteurs du pool puis se termine sans les fermer lui-même
+OPEN_ENGINES = """
+import chess
+from app.utils.engine_utils import evaluate_position
+print(evaluate_position(chess.Board(), 5)["type"])
+"""
+
+
+class TestShutdown(unittest.TestCase):
+
+    def test_hooks_run_once_in_reverse_order(self):
+        """Les fonctions de fermeture s'exécutent une fois, la dernière enregistrée d'abord, même si l'une échoue."""
+        calls = []
+
+        def failing():
+            calls.append("échec")
+            raise RuntimeError("moteur déjà fermé")
+
+        with patch.object(shutdown, "_hooks", []), patch.object(shutdown, "_watcher", object()):
+            shutdown.on_shutdown(lambda: calls.append("pool"))
+            shutdown.on_shutdown(failing)
+            shutdown.on_shutdown(lambda: calls.append("planificateur"))
+            shutdown.run_shutdown_hooks()
+            shutdown.run_shutdown_hooks()
+        self.assertEqual(calls, ["planificateur", "échec", "pool"])
+
+    def test_process_exits_with_open_engines(self):
+        """Le processus se termine sans attendre les threads des moteurs restés ouverts."""
+        completed = subprocess.run([sys.executable, "-c", OPEN_ENGINES], cwd=ROOT, capture_output=True,
+                                   text=True, timeout=30)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertIn("cp", completed.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
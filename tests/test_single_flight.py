@@ -0,0 +1,81 @@
+import unittest
+import os
+import sys
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.single_flight import SingleFlight
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition non atteinte")
+        time.sleep(0.005)
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def run_concurrently(self, flights, key, function, callers):
+        """Lance `callers` appels de la même clé ; les suivants arrivent pendant le premier calcul."""
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flights.do(key, function))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        threads[0].start()
+        wait_until(lambda: flights.inflight() == 1)
+        for thread in threads[1:]:
+            thread.start()
+        wait_until(lambda: flights.stats()['shared'] == callers - 1)
+        return threads, results, errors
+
+    def test_concurrent_calls_share_one_computation(self):
+        """Les appels simultanés d'une même clé attendent le calcul en cours au lieu de le relancer."""
+        flights = SingleFlight("test")
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return {"lines": ["e2e4"]}
+
+        threads, results, errors = self.run_concurrently(flights, ("fen", 15), compute, callers=4)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, [])
+        self.assertEqual(results, [{"lines": ["e2e4"]}] * 4)
+        self.assertEqual(flights.stats(), {'inflight': 0, 'leaders': 1, 'shared': 3})
+        # Une fois le calcul terminé, un nouvel appel recalcule
+        flights.do(("fen", 15), compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_errors_are_shared_and_keys_are_distinct(self):
+        """L'exception du calcul est levée chez tous les appelants ; une autre clé n'attend pas."""
+        flights = SingleFlight("test")
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise RuntimeError("moteur planté")
+
+        threads, results, errors = self.run_concurrently(flights, ("fen", 15), fail, callers=3)
+        self.assertEqual(flights.do(("fen", 12), lambda: "autre profondeur"), "autre profondeur")
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, [])
+        self.assertEqual([str(e) for e in errors], ["moteur planté"] * 3)
+        self.assertEqual(flights.inflight(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
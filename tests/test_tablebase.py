@@ -0,0 +1,110 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chess
+from app.utils import tablebase
+from app.utils.tablebase import TABLEBASE_WIN, SyzygyTablebase, tablebase_evaluation
+from app.services.analysis_service import analyse_position
+from app.utils.engine_utils import evaluate_move_strength, evaluate_played_move, get_best_moves_from_fen
+from app.utils.eval_cache import get_evaluation_cache
+
+# Finale roi et dame contre roi, blancs au trait : Db8 mate
+ENDGAME_FEN = "7k/8/6K1/8/8/8/8/1Q6 w - - 0 1"
+
+
+class FakeTables:
+    """Tables Syzygy KQvK simulées : toute position est perdue pour les noirs (DTZ 5), sauf le pat."""
+
+    wdl = {"KQvK": None}
+
+    def probe_wdl(self, board):
+        if board.is_stalemate():
+            return 0
+        return -2 if board.turn == chess.BLACK else 2
+
+    def probe_dtz(self, board):
+        if board.is_stalemate():
+            return 0
+        return -5 if board.turn == chess.BLACK else 5
+
+    def close(self):
+        pass
+
+
+def fake_tablebase():
+    tables = SyzygyTablebase()
+    tables._tablebase = FakeTables()
+    tables.max_pieces = 3
+    return tables
+
+
+class TestTablebase(unittest.TestCase):
+
+    def setUp(self):
+        get_evaluation_cache().clear()
+        tablebase.reset_tablebase()
+
+    def tearDown(self):
+        tablebase.reset_tablebase()
+
+    def test_probe_results_become_white_evaluations(self):
+        """Gain, nulle et perte du camp au trait sont convertis en évaluations du point de vue des blancs."""
+        self.assertEqual(tablebase_evaluation(2, 7, chess.WHITE),
+                         {"type": "cp", "value": TABLEBASE_WIN - 7, "wdl": 2, "dtz": 7})
+        self.assertEqual(tablebase_evaluation(2, 3, chess.BLACK),
+                         {"type": "cp", "value": -(TABLEBASE_WIN - 3), "wdl": -2, "dtz": -3})
+        # Gain annulé par la règle des 50 coups
+        self.assertEqual(tablebase_evaluation(1, 120, chess.WHITE)["value"], 0)
+
+        tables = fake_tablebase()
+        board = chess.Board(ENDGAME_FEN)
+        self.assertTrue(tables.can_probe(board))
+        self.assertFalse(tables.can_probe(chess.Board()))
+        lines = tables.evaluate_moves(board)
+        self.assertEqual(len(lines), board.legal_moves.count())
+        self.assertEqual(lines[0]["uci"], "b1b8")
+        self.assertEqual(lines[0]["evaluation"], {"type": "mate", "value": 0})
+        self.assertEqual(tables.evaluate_move(board, chess.Move.from_uci("b1b2")),
+                         {"type": "cp", "value": TABLEBASE_WIN - 5, "wdl": 2, "dtz": 5})
+
+    def test_endgames_are_evaluated_without_engine(self):
+        """Avec des tables, les finales sont évaluées et classées sans moteur."""
+        board = chess.Board(ENDGAME_FEN)
+        with patch.object(tablebase, "_tablebase", fake_tablebase()), \
+                patch('app.services.analysis_service.analyse_board') as mock_service_search, \
+                patch('app.utils.engine_utils.analyse_board') as mock_engine_search:
+            analysis = analyse_position(board, moves=["g6f6"])
+            best_moves = get_best_moves_from_fen(board)
+            strength = evaluate_move_strength(board, chess.Move.from_uci("b1b2"))
+            evaluation = evaluate_played_move(board, "b1b2", analysis=analysis)
+        mock_service_search.assert_not_called()
+        mock_engine_search.assert_not_called()
+        self.assertTrue(analysis.table.is_complete)
+        self.assertEqual(analysis.best_moves[0]["evaluation"]["type"], "mate")
+        self.assertEqual(best_moves[0]["evaluation"]["type"], "mate")
+        self.assertEqual(strength["value"], TABLEBASE_WIN - 5)
+        self.assertTrue(evaluation["tablebase"])
+        self.assertEqual((evaluation["wdl"], evaluation["dtz"]), (2, 5))
+
+    def test_missing_tables_fall_back_to_the_engine(self):
+        """Sans tables (variable absente, dossier vide ou introuvable), le moteur est utilisé."""
+        with tempfile.TemporaryDirectory() as empty_dir:
+            missing_dir = os.path.join(empty_dir, "absent")
+            with patch.dict(os.environ, {"SYZYGY_PATH": os.pathsep.join([empty_dir, missing_dir])}):
+                tables = tablebase.get_tablebase()
+                self.assertEqual(len(tables), 0)
+                board = chess.Board(ENDGAME_FEN)
+                self.assertIsNone(tables.probe(board))
+                self.assertIsNone(tables.evaluate_moves(board))
+                best_moves = get_best_moves_from_fen(board)
+        self.assertTrue(best_moves)
+        self.assertNotIn("wdl", best_moves[0]["evaluation"])
+        evaluation = evaluate_played_move(board, best_moves[0]["uci"])
+        self.assertNotIn("tablebase", evaluation)
+
+
+if __name__ == '__main__':
+    unittest.main()